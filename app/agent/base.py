@@ -8,16 +8,20 @@
 所有具体的智能体类都应该继承自 BaseAgent 并实现 step() 方法。
 """
 
+import asyncio
 from abc import ABC, abstractmethod
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
 
+from app.checkpoint import CheckpointState, CheckpointWriter, load_checkpoint
 from app.llm import LLM
+from app.llm_router import LLMRouter
 from app.logger import logger
 from app.sandbox.client import SANDBOX_CLIENT
 from app.schema import ROLE_TYPE, AgentState, Memory, Message
+from app.tracing import span
 
 
 class BaseAgent(BaseModel, ABC):
@@ -52,9 +56,9 @@ class BaseAgent(BaseModel, ABC):
     )
 
     # ========== 依赖组件 ==========
-    llm: LLM = Field(
+    llm: Union[LLM, LLMRouter] = Field(
         default_factory=LLM,
-        description="语言模型实例，用于与 LLM API 交互，生成文本和工具调用",
+        description="语言模型实例（或在多个 LLM 配置间路由的 LLMRouter），用于生成文本和工具调用",
     )
     memory: Memory = Field(
         default_factory=Memory, description="智能体的记忆存储，保存所有对话消息历史"
@@ -73,6 +77,14 @@ class BaseAgent(BaseModel, ABC):
     # 卡住检测阈值：当智能体连续返回相同内容达到此次数时，认为智能体卡住了
     duplicate_threshold: int = 2
 
+    # ========== 检查点 ==========
+    checkpoint_path: Optional[str] = Field(
+        None, description="检查点文件路径，设置后每步结束时增量写入检查点（见 app/checkpoint.py）"
+    )
+    _checkpoint: Optional[CheckpointWriter] = PrivateAttr(default=None)
+    # 创建时的下一步提示词（卡住处理会修改 next_step_prompt，reset 时恢复）
+    _initial_next_step_prompt: Optional[str] = PrivateAttr(default=None)
+
     class Config:
         """
         Pydantic 配置类
@@ -101,11 +113,12 @@ class BaseAgent(BaseModel, ABC):
         """
         # 如果 LLM 未提供或类型不正确，创建默认实例
         # 使用智能体名称（小写）作为配置名称，这样可以支持多个 LLM 配置
-        if self.llm is None or not isinstance(self.llm, LLM):
+        if self.llm is None or not isinstance(self.llm, (LLM, LLMRouter)):
             self.llm = LLM(config_name=self.name.lower())
         # 如果记忆未提供，创建默认实例
         if not isinstance(self.memory, Memory):
             self.memory = Memory()
+        self._initial_next_step_prompt = self.next_step_prompt
         return self
 
     @asynccontextmanager
@@ -261,41 +274,157 @@ class BaseAgent(BaseModel, ABC):
         if request:
             self.update_memory("user", request)
 
-        # 存储每步的执行结果
-        results: List[str] = []
-        # 使用状态上下文管理器，确保状态正确转换和恢复
-        async with self.state_context(AgentState.RUNNING):
-            # 执行循环：直到达到最大步数或状态变为 FINISHED
-            while (
-                self.current_step < self.max_steps and self.state != AgentState.FINISHED
-            ):
-                # 增加步数计数
-                self.current_step += 1
-                logger.info(f"执行步骤 {self.current_step}/{self.max_steps}")
-
-                # 执行一步（由子类实现具体逻辑）
-                step_result = await self.step()
-
-                # 检查是否卡住（重复相同内容）
-                if self.is_stuck():
-                    # 处理卡住状态：添加提示词引导智能体改变策略
-                    self.handle_stuck_state()
-
-                # 记录这一步的结果
-                results.append(f"步骤 {self.current_step}: {step_result}")
-
-            # 如果达到最大步数，重置并记录终止原因
-            if self.current_step >= self.max_steps:
-                self.current_step = 0
-                self.state = AgentState.IDLE
-                results.append(f"已终止：达到最大步数 ({self.max_steps})")
-
-        # 清理沙箱客户端资源（如浏览器、终端等）
-        await SANDBOX_CLIENT.cleanup()
+        # 设置了检查点路径时开始写入新的检查点（resume 之后继续写入原文件）
+        if self.checkpoint_path and self._checkpoint is None:
+            self._checkpoint = CheckpointWriter(self.checkpoint_path)
+
+        # 整次运行是一条追踪的根 span（未启用追踪时为空操作）
+        with span("agent.run", agent=self.name) as run_span:
+            # 存储每步的执行结果
+            results: List[str] = []
+            # 使用状态上下文管理器，确保状态正确转换和恢复
+            async with self.state_context(AgentState.RUNNING):
+                # 执行循环：直到达到最大步数或状态变为 FINISHED
+                while (
+                    self.current_step < self.max_steps and self.state != AgentState.FINISHED
+                ):
+                    # 增加步数计数
+                    self.current_step += 1
+                    logger.info(f"执行步骤 {self.current_step}/{self.max_steps}")
+
+                    # 执行一步（由子类实现具体逻辑）
+                    with span("agent.step", step=self.current_step):
+                        step_result = await self.step()
+
+                    # 检查是否卡住（重复相同内容）
+                    if self.is_stuck():
+                        # 处理卡住状态：添加提示词引导智能体改变策略
+                        self.handle_stuck_state()
+
+                    # 记录这一步的结果
+                    results.append(f"步骤 {self.current_step}: {step_result}")
+
+                    # 增量写入检查点（未设置 checkpoint_path 时跳过）
+                    if self._checkpoint is not None:
+                        await self._write_checkpoint()
+
+                # 如果达到最大步数，重置并记录终止原因
+                if self.current_step >= self.max_steps:
+                    self.current_step = 0
+                    self.state = AgentState.IDLE
+                    results.append(f"已终止：达到最大步数 ({self.max_steps})")
+
+            # 清理沙箱客户端资源（如浏览器、终端等）
+            await SANDBOX_CLIENT.cleanup()
+            run_span.set(steps=len(results), state=self.state.value)
 
         # 返回所有步骤的结果摘要
         return "\n".join(results) if results else "未执行任何步骤"
 
+    async def reset(self) -> None:
+        """
+        重置为可以处理新请求的初始状态
+
+        清空记忆、步数、状态和检查点，恢复初始的下一步提示词；
+        LLM 客户端、工具和连接等初始化开销大的资源保留（见 app/agent_pool.py）。
+        """
+        self.memory.clear()
+        self.current_step = 0
+        self.state = AgentState.IDLE
+        self.next_step_prompt = self._initial_next_step_prompt
+        self.checkpoint_path = None
+        self._checkpoint = None
+
+    async def cleanup(self) -> None:
+        """释放智能体持有的资源（工具、连接等），默认没有需要释放的资源"""
+
+    async def health_check(self) -> bool:
+        """
+        检查智能体持有的连接是否仍然可用（智能体池在租出空闲智能体前调用）
+
+        Returns:
+            bool: 可用时返回 True，默认总是可用
+        """
+        return True
+
+    def checkpoint_tools(self) -> Dict[str, Any]:
+        """
+        获取需要写入检查点的工具
+
+        子类有工具时覆盖此方法，工具通过 checkpoint_state / restore_state 保存和恢复状态。
+
+        Returns:
+            Dict[str, Any]: 工具名称到工具实例的映射
+        """
+        return {}
+
+    async def _write_checkpoint(self) -> None:
+        """将当前步骤追加写入检查点"""
+        llm = getattr(self.llm, "primary", self.llm)
+        await self._checkpoint.write_step(
+            step=self.current_step,
+            state=self.state,
+            next_step_prompt=self.next_step_prompt,
+            messages=self.memory.messages,
+            input_tokens=llm.total_input_tokens,
+            completion_tokens=llm.total_completion_tokens,
+            tool_states={
+                name: tool.checkpoint_state()
+                for name, tool in self.checkpoint_tools().items()
+            },
+        )
+
+    async def resume(self, path: Optional[str] = None) -> Optional[CheckpointState]:
+        """
+        从检查点恢复到最后一个完整的步骤
+
+        恢复消息历史、步数、下一步提示词、token 用量和工具状态，
+        之后调用 run()（不传请求）从下一步继续，新的步骤继续追加到同一个检查点文件。
+
+        Args:
+            path: 检查点文件路径，默认使用 checkpoint_path
+
+        Returns:
+            Optional[CheckpointState]: 恢复出的检查点，没有可恢复的步骤时返回 None
+                （此时 run() 会从头开始并写入新的检查点）
+
+        Raises:
+            ValueError: 没有指定检查点路径
+
+        使用示例：
+            agent = await Manus.create(checkpoint_path="checkpoints/run.jsonl")
+            checkpoint = await agent.resume()
+            if checkpoint is None or checkpoint.state != AgentState.FINISHED:
+                await agent.run(None if checkpoint else prompt)
+        """
+        path = path or self.checkpoint_path
+        if not path:
+            raise ValueError("没有指定检查点文件路径")
+        self.checkpoint_path = path
+
+        checkpoint = await asyncio.to_thread(load_checkpoint, path)
+        if checkpoint is None:
+            logger.warning(f"检查点 {path} 中没有完整的步骤，将从头开始")
+            return None
+
+        self.memory.messages = [Message(**message) for message in checkpoint.messages]
+        self.current_step = checkpoint.step
+        self.next_step_prompt = checkpoint.next_step_prompt
+        llm = getattr(self.llm, "primary", self.llm)
+        llm.total_input_tokens = checkpoint.input_tokens
+        llm.total_completion_tokens = checkpoint.completion_tokens
+        tools = self.checkpoint_tools()
+        for name, state in checkpoint.tools.items():
+            if name in tools:
+                tools[name].restore_state(state)
+
+        self._checkpoint = CheckpointWriter(path, resume_from=checkpoint)
+        self._checkpoint.mark_written(self.memory.messages, checkpoint.tools)
+        logger.info(
+            f"已从检查点 {path} 恢复到第 {checkpoint.step} 步（{len(checkpoint.messages)} 条消息）"
+        )
+        return checkpoint
+
     @abstractmethod
     async def step(self) -> str:
         """
@@ -343,42 +472,20 @@ class BaseAgent(BaseModel, ABC):
         """
         检查智能体是否卡住（陷入循环）
 
-        通过检测智能体是否连续返回相同的内容来判断是否卡住。
-        如果最后一条助手消息的内容与之前的助手消息内容相同，
-        且重复次数达到阈值，则认为智能体卡住了。
-
-        检测逻辑：
-        1. 检查消息数量是否足够（至少 2 条）
-        2. 检查最后一条消息是否有内容
-        3. 从后往前遍历消息，统计相同内容的助手消息数量
-        4. 如果重复次数 >= duplicate_threshold，返回 True
+        Memory 在添加消息时增量维护最近一条助手消息的指纹及其连续重复次数，
+        这里只需常数时间查询。只统计连续的重复：交替调用不同工具（如
+        scroll_down 与 extract_content 轮流出现）是在推进任务，不视为卡住。
+        指纹对文本做了规范化，并且对工具调用只比较工具名称和参数，
+        因此思考文本略有不同、但反复发起同一调用的情况也能被发现。
 
         Returns:
-            bool: True 表示智能体卡住了，False 表示正常
+            bool: True 表示最近一条助手消息的连续重复次数达到 duplicate_threshold
 
         示例：
-            如果智能体连续 3 次返回 "我需要更多信息"，
+            如果智能体连续 3 次以相同参数调用同一个工具，
             且 duplicate_threshold=2，则返回 True
         """
-        # 消息数量不足，无法判断
-        if len(self.memory.messages) < 2:
-            return False
-
-        # 获取最后一条消息
-        last_message = self.memory.messages[-1]
-        # 如果最后一条消息没有内容，无法判断
-        if not last_message.content:
-            return False
-
-        # 从后往前遍历消息（排除最后一条），统计相同内容的助手消息数量
-        duplicate_count = sum(
-            1
-            for msg in reversed(self.memory.messages[:-1])
-            if msg.role == "assistant" and msg.content == last_message.content
-        )
-
-        # 如果重复次数达到阈值，认为卡住了
-        return duplicate_count >= self.duplicate_threshold
+        return self.memory.repeat_count() >= self.duplicate_threshold
 
     @property
     def messages(self) -> List[Message]:
@@ -283,6 +283,21 @@ class Manus(ToolCallAgent):
         # 3. 添加仍然连接的 MCP 服务器的工具
         self.available_tools.add_tools(*self.mcp_clients.tools)
 
+    async def health_check(self) -> bool:
+        """
+        检查所有 MCP 连接是否仍然可用（向每个服务器发送 ping）
+
+        Returns:
+            bool: 所有连接都响应时返回 True
+        """
+        for server_id, session in list(self.mcp_clients.sessions.items()):
+            try:
+                await session.send_ping()
+            except Exception as e:
+                logger.warning(f"MCP 服务器 {server_id} 健康检查失败: {e}")
+                return False
+        return True
+
     async def cleanup(self):
         if self.browser_context_helper:
             await self.browser_context_helper.cleanup_browser()
@@ -20,6 +20,7 @@ import json
 
 from app.agent.toolcall import ToolCallAgent
 from app.logger import logger
+from app.schema import Message
 from app.tool import ToolCollection, DatabaseTool
 from app.flow.planning import PlanningFlow, PlanStepStatus
 
@@ -57,6 +58,8 @@ class ProjectHunterAgent(ToolCallAgent):
     planning_flow: Optional[PlanningFlow] = None
     current_workflow_step: str = "idle"  # idle, collecting, storing, evaluating
     collected_opportunities: List[Dict] = Field(default_factory=list)
+    evaluations: List[Dict] = Field(default_factory=list)
+    evaluation_concurrency: int = 8  # 并发评分的最大请求数
     
     def __init__(self, **kwargs):
         """初始化ProjectHunterAgent"""
@@ -269,18 +272,57 @@ class ProjectHunterAgent(ToolCallAgent):
         """
         第三步：评估职位
         
-        对每个职位进行逻辑推理和评分
+        对每个职位进行逻辑推理和评分。各职位的评分互相独立，
+        通过 llm.ask_many 并发请求，整批耗时约为一次往返时间。
         """
         try:
             if not self.collected_opportunities:
                 return "✓ 没有职位需要评估"
             
-            # 使用Manus的run方法来执行评估任务
-            prompt = f"""
+            requests = [
+                {"messages": [Message.user_message(self._evaluation_prompt(opportunity))]}
+                for opportunity in self.collected_opportunities
+            ]
+            batch = await self.llm.ask_many(
+                requests, max_concurrency=self.evaluation_concurrency
+            )
+            
+            self.evaluations = []
+            for opportunity, text, error in zip(
+                self.collected_opportunities, batch.results, batch.errors
+            ):
+                if error is not None:
+                    logger.warning(f"评估职位失败 {opportunity.get('title')}: {error}")
+                    continue
+                evaluation = self._parse_evaluation(text)
+                if evaluation:
+                    self.evaluations.append(evaluation)
+            
+            return (
+                f"✓ 成功评估 {len(self.evaluations)}/{len(self.collected_opportunities)} 个职位"
+                f"（tokens: 输入 {batch.input_tokens}，输出 {batch.completion_tokens}）"
+            )
+            
+        except Exception as e:
+            logger.error(f"评估职位失败: {str(e)}")
+            return f"✗ 评估职位失败: {str(e)}"
+    
+    @staticmethod
+    def _evaluation_prompt(opportunity: Dict) -> str:
+        """
+        生成单个职位的评分提示词
+        
+        Args:
+            opportunity: 职位信息
+            
+        Returns:
+            str: 评分提示词
+        """
+        return f"""
             请对以下职位进行逻辑推理和评分：
             
-            职位列表：
-            {self.collected_opportunities}
+            职位信息：
+            {json.dumps(opportunity, ensure_ascii=False)}
             
             评估标准：
             1. 技能匹配度（0-10分）
@@ -288,30 +330,41 @@ class ProjectHunterAgent(ToolCallAgent):
             3. 项目复杂度（0-10分）
             4. 时间投入评估（0-10分）
             
-            请返回每个职位的评分结果，格式如下：
+            只返回 JSON，格式如下：
             {{
-                "evaluations": [
-                    {{
-                        "title": "职位标题",
-                        "scores": {{
-                            "skill_match": 8,
-                            "budget_reasonableness": 7,
-                            "complexity": 6,
-                            "time_investment": 5
-                        }},
-                        "total_score": 26,
-                        "recommendation": "建议接单"
-                    }}
-                ]
+                "title": "职位标题",
+                "scores": {{
+                    "skill_match": 8,
+                    "budget_reasonableness": 7,
+                    "complexity": 6,
+                    "time_investment": 5
+                }},
+                "total_score": 26,
+                "recommendation": "建议接单"
             }}
             """
-                  # 执行评估任务
-            result = await self.run(prompt)       
-            return f"✓ 成功评估 {len(self.collected_opportunities)} 个职位"
+    
+    @staticmethod
+    def _parse_evaluation(result: str) -> Optional[Dict]:
+        """
+        解析单个职位的评分结果
+        
+        Args:
+            result: LLM 返回的文本
             
-        except Exception as e:
-            logger.error(f"评估职位失败: {str(e)}")
-            return f"✗ 评估职位失败: {str(e)}"
+        Returns:
+            Optional[Dict]: 评分结果，解析失败时返回 None
+        """
+        import re
+        
+        json_match = re.search(r'\{.*\}', result or "", re.DOTALL)
+        if not json_match:
+            return None
+        try:
+            return json.loads(json_match.group())
+        except json.JSONDecodeError as e:
+            logger.warning(f"解析评分结果失败: {str(e)}")
+            return None
     
     def _parse_opportunities(self, result: str) -> List[Dict]:
         """
@@ -9,20 +9,37 @@
 
 import asyncio
 import json
-from typing import Any, List, Optional, Union
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from app.agent.react import ReActAgent
+from app.blob_store import get_blob_store
+from app.checkpoint import CheckpointState
+from app.compaction import get_compactor
 from app.exceptions import TokenLimitExceeded
 from app.logger import logger
 from app.prompt.toolcall import NEXT_STEP_PROMPT, SYSTEM_PROMPT
-from app.schema import TOOL_CHOICE_TYPE, AgentState, Message, ToolCall, ToolChoice
+from app.schema import (
+    TOOL_CHOICE_TYPE,
+    AgentState,
+    Message,
+    Role,
+    ToolCall,
+    ToolChoice,
+)
 from app.tool import CreateChatCompletion, Terminate, ToolCollection
+from app.tool.blob_reader import BlobReader
+from app.tracing import span
 
 # 常量定义：当工具调用模式为 REQUIRED 但未提供工具调用时的错误消息
 TOOL_CALL_REQUIRED = "Tool calls required but none provided"
 
+# 当前工具调用返回的 base64 图片（并发执行时每个调用在各自的任务上下文中记录）
+_tool_image: ContextVar[Optional[str]] = ContextVar("tool_image", default=None)
+
 
 class ToolCallAgent(ReActAgent):
     """
@@ -70,6 +87,27 @@ class ToolCallAgent(ReActAgent):
         None  # 当前工具返回的 base64 编码图片（用于视觉工具）
     )
 
+    # 流式工具调用：开启后边生成边执行，第一个工具的参数完整时立即开始执行，
+    # 不必等待模型输出完所有工具调用（与 act() 中的调用遵守同样的并发上限和互斥规则）
+    stream_tool_calls: bool = False
+    # 本步已调度的工具任务（tool_call_id -> 任务），以及它们共享的并发上限和互斥锁
+    _tool_tasks: Dict[str, asyncio.Task] = PrivateAttr(default_factory=dict)
+    _tool_semaphore: Optional[asyncio.Semaphore] = PrivateAttr(default=None)
+    _tool_locks: Dict[str, asyncio.Lock] = PrivateAttr(default_factory=dict)
+
+    # 并发执行：同一步的多个工具调用最多同时执行 max_parallel_tools 个（1 表示依次执行），
+    # 互斥键相同的调用（见 BaseTool.concurrency_key）仍按原始顺序依次执行
+    max_parallel_tools: int = 4
+    # 每步工具执行的总时间预算（秒），超时未完成的调用会被取消；None 表示不限制
+    tool_step_timeout: Optional[float] = None
+
+    # run() 结束后是否调用 cleanup() 释放工具资源；智能体池中的智能体设为 False，
+    # 在请求之间保留 MCP 连接和浏览器进程，归还时改为调用 reset()
+    cleanup_after_run: bool = True
+
+    # 系统消息缓存：(生成时的 system_prompt, 系统消息列表)
+    _system_msgs_cache: Optional[Tuple[str, List[Message]]] = PrivateAttr(default=None)
+
     # 执行限制
     max_steps: int = 30  # 最大执行步数，防止无限循环
     max_observe: Optional[Union[int, bool]] = (
@@ -99,34 +137,45 @@ class ToolCallAgent(ReActAgent):
         # 这用于引导智能体继续思考下一步该做什么
         if self.next_step_prompt:
             user_msg = Message.user_message(self.next_step_prompt)
-            self.messages += [user_msg]
+            # 通过 add_message 追加，保留 Memory 的增量 token 计数
+            self.memory.add_message(user_msg)
 
         try:
+            # 历史接近上下文窗口时先压缩较早的对话（[compaction] 未启用时跳过）
+            tools = self.available_tools.to_params()
+            compactor = get_compactor()
+            if compactor is not None:
+                await compactor.maybe_compact(
+                    self.memory, self.llm, self._system_messages(), tools
+                )
+
             # 调用 LLM，请求它分析任务并选择工具
             # ask_tool 方法会返回 LLM 的响应，包括：
             # - content: 文本内容（智能体的思考过程）
             # - tool_calls: 要调用的工具列表
-            response = await self.llm.ask_tool(
-                messages=self.messages,  # 当前对话历史
-                system_msgs=(
-                    [Message.system_message(self.system_prompt)]
-                    if self.system_prompt
-                    else None
-                ),  # 系统提示词，定义智能体角色
-                tools=self.available_tools.to_params(),  # 可用工具列表
+            request = dict(
+                messages=self.memory,  # 当前对话历史（传入 Memory 以增量计算 token）
+                system_msgs=self._system_messages(),  # 系统提示词，定义智能体角色
+                tools=tools,  # 可用工具列表
                 tool_choice=self.tool_choices,  # 工具选择模式
             )
+            if self.stream_tool_calls and self.tool_choices != ToolChoice.NONE:
+                # 流式模式：工具调用完整后立即开始执行
+                response = await self._ask_tool_with_dispatch(**request)
+            else:
+                response = await self.llm.ask_tool(**request)
         except ValueError:
             # ValueError 直接向上抛出，由调用者处理
             raise
         except Exception as e:
-            # 检查是否是 TokenLimitExceeded 错误（可能被包装在 RetryError 中）
+            # 检查是否是 TokenLimitExceeded 错误（不会被重试，直接抛出；
+            # 也兼容被包装在其他异常中的情况）
             # 这种情况通常发生在对话历史过长，超过了模型的 token 限制
-            if hasattr(e, "__cause__") and isinstance(e.__cause__, TokenLimitExceeded):
-                token_limit_error = e.__cause__
-                logger.error(
-                    f"🚨 Token limit error (from RetryError): {token_limit_error}"
-                )
+            token_limit_error = (
+                e if isinstance(e, TokenLimitExceeded) else e.__cause__
+            )
+            if isinstance(token_limit_error, TokenLimitExceeded):
+                logger.error(f"🚨 Token limit error: {token_limit_error}")
                 # 将错误信息记录到内存中
                 self.memory.add_message(
                     Message.assistant_message(
@@ -207,13 +256,100 @@ class ToolCallAgent(ReActAgent):
             )
             return False
 
+    def _system_messages(self) -> Optional[List[Message]]:
+        """
+        获取系统消息列表（system_prompt 不变时复用同一个 Message 对象）
+
+        复用同一个对象可以保留其 token 计数缓存，也保证每一步请求的前缀完全一致。
+
+        Returns:
+            Optional[List[Message]]: 系统消息列表，没有系统提示词时返回 None
+        """
+        if not self.system_prompt:
+            return None
+        if (
+            self._system_msgs_cache is None
+            or self._system_msgs_cache[0] != self.system_prompt
+        ):
+            self._system_msgs_cache = (
+                self.system_prompt,
+                [Message.system_message(self.system_prompt)],
+            )
+        return self._system_msgs_cache[1]
+
+    async def _ask_tool_with_dispatch(self, **request) -> Any:
+        """
+        流式请求 LLM，并在每个工具调用完整时立即调度执行
+
+        工具调用通过 _schedule_tool 调度，与 act() 中其余的调用共享并发上限和互斥锁，
+        执行结果由 act() 等待并按原始顺序写入记忆。
+
+        Args:
+            **request: 传递给 llm.ask_tool_stream 的参数
+
+        Returns:
+            组装完成的响应消息（与 ask_tool 的返回值相同）
+        """
+        # 上一步遗留的调度任务（如思考阶段出错未进入 act）直接取消
+        self._cancel_scheduled_tools()
+
+        stream = await self.llm.ask_tool_stream(**request)
+        try:
+            async for tool_call in stream:
+                logger.info(f"Dispatching tool early: '{tool_call.function.name}'")
+                self._schedule_tool(tool_call)
+        except BaseException:
+            self._cancel_scheduled_tools()
+            raise
+        return stream.message
+
+    def _schedule_tool(self, command: ToolCall) -> asyncio.Task:
+        """
+        调度一个工具调用在后台执行
+
+        同一步的调用共享 max_parallel_tools 的并发上限；互斥键相同的调用按调度顺序获得锁，
+        因此提前调度的调用与 act() 中其余的调用之间同样按原始顺序依次执行。
+
+        Args:
+            command: 工具调用
+
+        Returns:
+            asyncio.Task: 执行任务，结果为 (结果, base64 图片)
+        """
+        if self._tool_semaphore is None:
+            self._tool_semaphore = asyncio.Semaphore(max(1, self.max_parallel_tools))
+        semaphore = self._tool_semaphore
+        key = self._concurrency_key(command)
+        lock = self._tool_locks.setdefault(key, asyncio.Lock()) if key else nullcontext()
+
+        async def run() -> Tuple[str, Optional[str]]:
+            async with lock:
+                async with semaphore:
+                    return await self._run_tool(command)
+
+        task = asyncio.create_task(run())
+        self._tool_tasks[command.id] = task
+        return task
+
+    def _take_scheduled_tools(self) -> Dict[str, asyncio.Task]:
+        """取出本步已调度的任务，下一步重新开始计算并发上限和互斥锁"""
+        tasks, self._tool_tasks = self._tool_tasks, {}
+        self._tool_semaphore = None
+        self._tool_locks = {}
+        return tasks
+
+    def _cancel_scheduled_tools(self) -> None:
+        """取消本步已调度但尚未被 act() 取走的任务"""
+        for task in self._take_scheduled_tools().values():
+            task.cancel()
+
     async def act(self) -> str:
         """
         行动阶段：执行工具调用并处理结果
 
         这是 ReAct 模式中的"行动"步骤，智能体会：
         1. 检查是否有工具需要执行
-        2. 依次执行每个工具调用
+        2. 并发执行工具调用（见 _execute_tools），结果按原始顺序处理
         3. 将工具执行结果保存到内存
         4. 返回所有工具的执行结果
 
@@ -232,16 +368,17 @@ class ToolCallAgent(ReActAgent):
             # 返回最后一条消息的内容，或者默认消息
             return self.messages[-1].content or "No content or commands to execute"
 
+        # 并发执行所有工具调用（流式模式下部分调用已在思考阶段开始执行），结果与调用一一对应
+        outcomes = iter(await self._execute_tools(self.tool_calls))
+
         # 存储所有工具的执行结果
         results = []
-        # 依次执行每个工具调用
+        # 按原始顺序处理每个工具调用的结果
         for command in self.tool_calls:
-            # 每次执行新工具前，重置 base64_image
-            # 这样每个工具的结果是独立的
-            self._current_base64_image = None
+            result, self._current_base64_image = next(outcomes)
 
-            # 执行工具并获取结果
-            result = await self.execute_tool(command)
+            # 过长的结果存入 blob 存储，记忆中只保留首尾预览和引用
+            result = await self._spill_observation(result)
 
             # 如果设置了最大观察长度，截断结果
             # 这可以防止过长的工具返回结果占用太多 token
@@ -271,6 +408,133 @@ class ToolCallAgent(ReActAgent):
         # 返回所有工具执行结果，用双换行符分隔
         return "\n\n".join(results)
 
+    async def _spill_observation(self, result: str) -> str:
+        """
+        将过长的工具返回结果存入 blob 存储
+
+        记忆中的结果替换为开头和结尾的预览及 blob id，完整内容可以通过 read_blob 工具
+        按需读取；第一次存入时把 read_blob 加入可用工具。
+        [blob_store] 未启用或写入失败时原样返回，由 max_observe 截断。
+
+        Args:
+            result: 工具返回结果
+
+        Returns:
+            str: 记忆中保存的结果
+        """
+        store = get_blob_store()
+        if store is None or len(result) <= store.settings.spill_threshold:
+            return result
+        try:
+            blob_id = await asyncio.to_thread(store.put, result)
+        except OSError as e:
+            logger.warning(f"Failed to store long tool output, truncating instead: {e}")
+            return result
+        self._enable_blob_reader()
+        return store.preview(result, blob_id)
+
+    def _enable_blob_reader(self) -> None:
+        """将 read_blob 加入可用工具（已存在时跳过）"""
+        reader = BlobReader()
+        if reader.name not in self.available_tools.tool_map:
+            self.available_tools.add_tool(reader)
+
+    def _concurrency_key(self, command: ToolCall) -> Optional[str]:
+        """
+        获取工具调用的并发互斥键
+
+        Args:
+            command: 工具调用
+
+        Returns:
+            Optional[str]: 互斥键，None 表示可以与任何调用并发执行
+                （未知工具和参数无法解析的调用会直接返回错误，无需互斥）
+        """
+        tool = self.available_tools.get_tool(command.function.name)
+        if tool is None:
+            return None
+        try:
+            args = json.loads(command.function.arguments or "{}")
+        except json.JSONDecodeError:
+            return None
+        return tool.concurrency_key(**args) if isinstance(args, dict) else None
+
+    async def _run_tool(self, command: ToolCall) -> Tuple[str, Optional[str]]:
+        """
+        执行单个工具调用
+
+        Args:
+            command: 工具调用
+
+        Returns:
+            Tuple[str, Optional[str]]: (结果, 工具返回的 base64 图片)
+        """
+        _tool_image.set(None)
+        with span(f"tool.{command.function.name}", call_id=command.id) as tool_span:
+            result = await self.execute_tool(command)
+            image = _tool_image.get()
+            tool_span.set(result_chars=len(result), image=image is not None)
+        return result, image
+
+    async def _execute_tools(
+        self, commands: List[ToolCall]
+    ) -> List[Tuple[str, Optional[str]]]:
+        """
+        并发执行一步中的多个工具调用
+
+        最多同时执行 max_parallel_tools 个；互斥键相同的调用按原始顺序依次执行；
+        自 act() 开始等待起超过 tool_step_timeout 仍未完成的调用（包括流式模式下
+        提前调度的调用）会被取消并返回错误结果。
+
+        Args:
+            commands: 工具调用列表
+
+        Returns:
+            List[Tuple[str, Optional[str]]]: 与 commands 一一对应的 (结果, base64 图片)
+        """
+        # 已提前调度的调用直接使用其任务，其余的按原始顺序调度（同一互斥键按调度顺序获得锁）
+        tasks = [
+            self._tool_tasks.get(command.id) or self._schedule_tool(command)
+            for command in commands
+        ]
+        unclaimed = set(self._take_scheduled_tools().values()) - set(tasks)
+        for task in unclaimed:
+            task.cancel()
+        if not tasks:
+            return []
+
+        try:
+            _, stragglers = await asyncio.wait(tasks, timeout=self.tool_step_timeout)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        if stragglers:
+            await asyncio.gather(*stragglers, return_exceptions=True)
+            logger.warning(
+                f"{len(stragglers)} tool call(s) cancelled after exceeding the "
+                f"{self.tool_step_timeout}s step budget"
+            )
+
+        outcomes = []
+        for command, task in zip(commands, tasks):
+            name = command.function.name
+            if task.cancelled():
+                outcomes.append(
+                    (
+                        f"Error: Tool '{name}' was cancelled: step time budget of "
+                        f"{self.tool_step_timeout}s exceeded",
+                        None,
+                    )
+                )
+            elif task.exception() is not None:
+                outcomes.append(
+                    (f"Error: Tool '{name}' encountered a problem: {task.exception()}", None)
+                )
+            else:
+                outcomes.append(task.result())
+        return outcomes
+
     async def execute_tool(self, command: ToolCall) -> str:
         """
         执行单个工具调用
@@ -318,7 +582,7 @@ class ToolCallAgent(ReActAgent):
             # 某些工具（如截图工具）会返回图片数据
             if hasattr(result, "base64_image") and result.base64_image:
                 # 保存图片数据，稍后在创建 tool_message 时使用
-                self._current_base64_image = result.base64_image
+                _tool_image.set(result.base64_image)
 
             # 格式化返回结果
             # 标准格式：Observed output of cmd `工具名` executed:\n结果
@@ -395,6 +659,29 @@ class ToolCallAgent(ReActAgent):
         # 使用小写比较，避免大小写敏感问题
         return name.lower() in [n.lower() for n in self.special_tool_names]
 
+    async def reset(self) -> None:
+        """重置智能体状态，并清除各工具中上一个请求留下的状态"""
+        await super().reset()
+        self.tool_calls = []
+        self._cancel_scheduled_tools()
+        for tool_instance in self.available_tools.tool_map.values():
+            await tool_instance.reset()
+
+    async def resume(self, path: Optional[str] = None) -> Optional[CheckpointState]:
+        """从检查点恢复；恢复的记忆中引用了 blob 时同时启用 read_blob"""
+        checkpoint = await super().resume(path)
+        if checkpoint is not None and get_blob_store() is not None:
+            if any(
+                m.role == Role.TOOL and "read_blob" in (m.content or "")
+                for m in self.memory.messages
+            ):
+                self._enable_blob_reader()
+        return checkpoint
+
+    def checkpoint_tools(self) -> Dict[str, Any]:
+        """可用工具均参与检查点（无状态的工具 checkpoint_state 返回 None）"""
+        return dict(self.available_tools.tool_map)
+
     async def cleanup(self):
         """
         清理智能体使用的资源
@@ -443,5 +730,6 @@ class ToolCallAgent(ReActAgent):
             # 父类会处理 ReAct 循环：think -> act -> observe -> think -> ...
             return await super().run(request)
         finally:
-            # 无论成功还是失败，都要清理资源
-            await self.cleanup()
+            # 无论成功还是失败，都要清理资源（池中的智能体由池负责重置和清理）
+            if self.cleanup_after_run:
+                await self.cleanup()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+智能体池模块
+
+Manus.create() 每次都要连接所有配置的 MCP 服务器、构造浏览器和 Python 执行等工具，
+按请求创建智能体时这些开销全部计入请求延迟。智能体池预先创建若干个已初始化的智能体：
+- 租用：请求到来时取出一个空闲智能体；全部租出时临时新建一个，请求不必排队，
+  归还时超出 size 的智能体被销毁
+- 归还：在后台重置记忆、状态和工具中的用户数据（BaseAgent.reset），放回池中；
+  MCP 连接和浏览器进程保留
+- 健康检查：空闲超过 health_check_interval 的智能体在租出前先检查连接（BaseAgent.health_check），
+  失败则销毁
+- 回收：存活超过 max_lifetime、租用次数达到 max_leases、请求中抛出异常或重置失败的智能体
+  在归还时销毁，并在后台补充新的智能体
+
+池中的智能体应设置 cleanup_after_run=False，否则每次 run() 结束都会断开 MCP 连接。
+配置来自 config.toml 的 [agent_pool]。
+
+使用示例：
+    pool = AgentPool(lambda: Manus.create(cleanup_after_run=False))
+    async with pool.lease() as agent:
+        result = await agent.run(prompt)
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Deque,
+    Dict,
+    Optional,
+    Set,
+)
+
+from app.agent.base import BaseAgent
+from app.config import AgentPoolSettings, config
+from app.logger import logger
+
+
+class _PooledAgent:
+    """池中的一个智能体及其使用记录"""
+
+    def __init__(self, agent: BaseAgent):
+        self.agent = agent
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.leases = 0
+
+
+class AgentPool:
+    """
+    预先初始化的智能体池
+
+    所有方法都应在同一个事件循环中调用（智能体持有的 MCP 连接绑定在创建时的事件循环上），
+    第一次租用时才开始在后台填充，因此可以在服务器的事件循环启动前构造。
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Awaitable[BaseAgent]],
+        settings: Optional[AgentPoolSettings] = None,
+    ):
+        """
+        初始化智能体池
+
+        Args:
+            factory: 创建并完整初始化一个智能体的异步工厂函数
+            settings: 池配置，默认使用 config.agent_pool
+        """
+        self.factory = factory
+        self.settings = settings or config.agent_pool or AgentPoolSettings()
+        self._idle: Deque[_PooledAgent] = deque()
+        self._live = 0  # 已创建且未销毁的智能体数量（包括租出的）
+        self._creating = 0
+        self._started = False
+        self._closed = False
+        self._tasks: Set[asyncio.Task] = set()
+        self.created = 0
+        self.recycled = 0
+        self.cold_leases = 0
+
+    def _spawn(self, coro: Coroutine) -> asyncio.Task:
+        """
+        在后台运行协程
+
+        使用空白的上下文：池中的智能体不属于任何会话，
+        否则在某个请求的会话中创建的 MCP 连接会在该会话结束时被断开。
+        """
+        task = asyncio.get_running_loop().create_task(
+            coro, context=contextvars.Context()
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _create(self) -> _PooledAgent:
+        """创建一个新的智能体"""
+        agent = await self.factory()
+        self.created += 1
+        self._live += 1
+        return _PooledAgent(agent)
+
+    def _replenish(self) -> None:
+        """在后台补充智能体，直到池中（包括租出的）达到 size 个"""
+        if self._closed:
+            return
+        while self._live + self._creating < self.settings.size:
+            self._creating += 1
+            self._spawn(self._fill_one())
+
+    async def _fill_one(self) -> None:
+        """创建一个智能体放入空闲队列"""
+        try:
+            entry = await self._create()
+        except Exception as e:
+            logger.error(f"智能体池创建智能体失败: {e}")
+            return
+        finally:
+            self._creating -= 1
+        if self._closed:
+            self._discard(entry)
+        else:
+            self._idle.append(entry)
+
+    def _expired(self, entry: _PooledAgent) -> bool:
+        """智能体是否已超过最长存活时间或最多租用次数"""
+        if time.monotonic() - entry.created_at > self.settings.max_lifetime:
+            return True
+        max_leases = self.settings.max_leases
+        return max_leases is not None and entry.leases >= max_leases
+
+    async def _healthy(self, entry: _PooledAgent) -> bool:
+        """空闲较久的智能体检查连接是否可用"""
+        if time.monotonic() - entry.last_used < self.settings.health_check_interval:
+            return True
+        try:
+            return await asyncio.wait_for(
+                entry.agent.health_check(), self.settings.health_check_timeout
+            )
+        except Exception as e:
+            logger.warning(f"智能体健康检查失败: {e}")
+            return False
+
+    def _discard(self, entry: _PooledAgent) -> None:
+        """将智能体移出池，在后台释放它持有的资源"""
+        self.recycled += 1
+        self._live -= 1
+        self._spawn(self._cleanup(entry.agent))
+
+    @staticmethod
+    async def _cleanup(agent: BaseAgent) -> None:
+        """释放智能体持有的资源（断开 MCP 连接、关闭浏览器等）"""
+        try:
+            await agent.cleanup()
+        except Exception as e:
+            logger.warning(f"智能体池清理智能体失败: {e}")
+
+    async def _acquire(self) -> _PooledAgent:
+        """取出一个可用的空闲智能体，没有时新建"""
+        if not self._started:
+            self._started = True
+            self._replenish()
+
+        while self._idle:
+            entry = self._idle.popleft()
+            if self._expired(entry) or not await self._healthy(entry):
+                self._discard(entry)
+                self._replenish()
+                continue
+            return entry
+
+        # 所有智能体都已租出：临时新建一个（归还时超出 size 的部分会被销毁）
+        self.cold_leases += 1
+        task = self._spawn(self._create())
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # 请求被取消时，新建的智能体照常交给池处理
+            task.add_done_callback(self._adopt)
+            raise
+
+    def _adopt(self, task: asyncio.Task) -> None:
+        """将租用方已放弃等待的新建智能体归还给池"""
+        if not task.cancelled() and task.exception() is None:
+            self._spawn(self._return(task.result(), True))
+
+    async def _return(self, entry: _PooledAgent, ok: bool) -> None:
+        """重置智能体并放回空闲队列，无法复用时销毁"""
+        entry.leases += 1
+        keep = (
+            ok
+            and not self._closed
+            and not self._expired(entry)
+            and self._live <= self.settings.size
+        )
+        if keep:
+            try:
+                await entry.agent.reset()
+            except Exception as e:
+                logger.warning(f"智能体重置失败，将重新创建: {e}")
+                keep = False
+        if not keep:
+            self._discard(entry)
+            self._replenish()
+            return
+        entry.last_used = time.monotonic()
+        self._idle.append(entry)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[BaseAgent]:
+        """
+        租用一个智能体
+
+        退出上下文时智能体在后台被重置并归还；上下文中抛出异常时智能体被销毁。
+
+        Yields:
+            BaseAgent: 已初始化、处于 IDLE 状态的智能体
+        """
+        if self._closed:
+            raise RuntimeError("智能体池已关闭")
+        entry = await self._acquire()
+        ok = False
+        try:
+            yield entry.agent
+            ok = True
+        finally:
+            self._spawn(self._return(entry, ok))
+
+    async def close(self) -> None:
+        """关闭智能体池，等待后台任务结束并释放所有空闲智能体"""
+        self._closed = True
+        while self._idle or self._tasks:
+            while self._idle:
+                self._discard(self._idle.popleft())
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取池的统计信息
+
+        Returns:
+            Dict[str, Any]: 包含 live、idle、creating、created、recycled、cold_leases 的字典
+        """
+        return {
+            "live": self._live,
+            "idle": len(self._idle),
+            "creating": self._creating,
+            "created": self.created,
+            "recycled": self.recycled,
+            "cold_leases": self.cold_leases,
+        }
@@ -1,16 +1,66 @@
+import asyncio
 import json
 import sys
+import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Literal, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Literal, Optional
 
 import boto3
+from botocore.config import Config as BotoConfig
 
+from app.stream_sink import StreamSink, current_stream_sink, get_stream_sink
 
-# Global variables to track the current tool use ID across function calls
-# Tmp solution
-CURRENT_TOOLUSE_ID = None
+
+# boto3 is synchronous: every Bedrock call and event-stream read runs on this
+# pool so the event loop stays free while a generation is in flight.
+# The botocore connection pool is sized to match.
+MAX_WORKERS = 32
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="bedrock")
+
+
+async def _run_in_executor(fn, *args, **kwargs) -> Any:
+    # Run a blocking boto3 call on the Bedrock thread pool
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, lambda: fn(*args, **kwargs))
+
+
+async def _iterate_in_executor(events: Iterable[dict]) -> AsyncIterator[dict]:
+    # Read a blocking boto3 event stream on the thread pool and hand each event
+    # to the event loop through a queue
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stopped = threading.Event()
+    done = object()
+
+    def pump() -> None:
+        try:
+            for event in events:
+                if stopped.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    # The reader is not awaited: after an early stop it may still be blocked
+    # waiting for the next event, and it exits on its own once that arrives
+    loop.run_in_executor(_executor, pump)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Consumer stopped early (error or cancellation): the reader exits at
+        # the next event instead of draining the whole stream
+        stopped.set()
 
 
 # Class to handle OpenAI-style response formatting
@@ -39,7 +89,10 @@ class BedrockClient:
     def __init__(self):
         # Initialize Bedrock client, you need to configure AWS env first
         try:
-            self.client = boto3.client("bedrock-runtime")
+            self.client = boto3.client(
+                "bedrock-runtime",
+                config=BotoConfig(max_pool_connections=MAX_WORKERS),
+            )
             self.chat = Chat(self.client)
         except Exception as e:
             print(f"Error initializing Bedrock client: {e}")
@@ -83,50 +136,70 @@ class ChatCompletions:
                 bedrock_tools.append(bedrock_tool)
         return bedrock_tools
 
+    @staticmethod
+    def _text_blocks(content) -> List[dict]:
+        # Convert OpenAI message content (string or list of parts) to Bedrock text blocks
+        if not content:
+            return []
+        if isinstance(content, str):
+            return [{"text": content}]
+        blocks = []
+        for item in content:
+            if isinstance(item, str):
+                blocks.append({"text": item})
+            elif isinstance(item, dict) and item.get("text"):
+                blocks.append({"text": item["text"]})
+        return blocks
+
     def _convert_openai_messages_to_bedrock_format(self, messages):
-        # Convert OpenAI message format to Bedrock message format
+        # Convert OpenAI message format to Bedrock message format.
+        # Tool results reference their own tool_call_id, and consecutive tool
+        # results are merged into one user turn as Bedrock requires.
         bedrock_messages = []
         system_prompt = []
+
+        def append(role: str, content: List[dict]) -> None:
+            if not content:
+                return
+            # Bedrock requires alternating roles: merge consecutive same-role turns
+            if bedrock_messages and bedrock_messages[-1]["role"] == role:
+                bedrock_messages[-1]["content"].extend(content)
+            else:
+                bedrock_messages.append({"role": role, "content": content})
+
         for message in messages:
             if message.get("role") == "system":
-                system_prompt = [{"text": message.get("content")}]
+                system_prompt.extend(self._text_blocks(message.get("content")))
             elif message.get("role") == "user":
-                bedrock_message = {
-                    "role": message.get("role", "user"),
-                    "content": [{"text": message.get("content")}],
-                }
-                bedrock_messages.append(bedrock_message)
+                append("user", self._text_blocks(message.get("content")))
             elif message.get("role") == "assistant":
-                bedrock_message = {
-                    "role": "assistant",
-                    "content": [{"text": message.get("content")}],
-                }
-                openai_tool_calls = message.get("tool_calls", [])
-                if openai_tool_calls:
-                    bedrock_tool_use = {
-                        "toolUseId": openai_tool_calls[0]["id"],
-                        "name": openai_tool_calls[0]["function"]["name"],
-                        "input": json.loads(
-                            openai_tool_calls[0]["function"]["arguments"]
-                        ),
-                    }
-                    bedrock_message["content"].append({"toolUse": bedrock_tool_use})
-                    global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = openai_tool_calls[0]["id"]
-                bedrock_messages.append(bedrock_message)
+                content = self._text_blocks(message.get("content"))
+                for tool_call in message.get("tool_calls") or []:
+                    content.append(
+                        {
+                            "toolUse": {
+                                "toolUseId": tool_call["id"],
+                                "name": tool_call["function"]["name"],
+                                "input": json.loads(
+                                    tool_call["function"]["arguments"] or "{}"
+                                ),
+                            }
+                        }
+                    )
+                append("assistant", content)
             elif message.get("role") == "tool":
-                bedrock_message = {
-                    "role": "user",
-                    "content": [
+                append(
+                    "user",
+                    [
                         {
                             "toolResult": {
-                                "toolUseId": CURRENT_TOOLUSE_ID,
-                                "content": [{"text": message.get("content")}],
+                                "toolUseId": message.get("tool_call_id"),
+                                "content": self._text_blocks(message.get("content"))
+                                or [{"text": ""}],
                             }
                         }
                     ],
-                }
-                bedrock_messages.append(bedrock_message)
+                )
             else:
                 raise ValueError(f"Invalid role: {message.get('role')}")
         return system_prompt, bedrock_messages
@@ -146,10 +219,8 @@ class ChatCompletions:
             for content_item in bedrock_response["output"]["message"]["content"]:
                 if content_item.get("toolUse"):
                     bedrock_tool_use = content_item["toolUse"]
-                    global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = bedrock_tool_use["toolUseId"]
                     openai_tool_call = {
-                        "id": CURRENT_TOOLUSE_ID,
+                        "id": bedrock_tool_use["toolUseId"],
                         "type": "function",
                         "function": {
                             "name": bedrock_tool_use["name"],
@@ -192,28 +263,42 @@ class ChatCompletions:
         }
         return OpenAIResponse(openai_format)
 
-    async def _invoke_bedrock(
+    def _converse_params(
         self,
         model: str,
         messages: List[Dict[str, str]],
         max_tokens: int,
         temperature: float,
         tools: Optional[List[dict]] = None,
-        tool_choice: Literal["none", "auto", "required"] = "auto",
-        **kwargs,
-    ) -> OpenAIResponse:
-        # Non-streaming invocation of Bedrock model
+    ) -> Dict[str, Any]:
+        # Build converse/converse_stream arguments (boto3 rejects None values)
         (
             system_prompt,
             bedrock_messages,
         ) = self._convert_openai_messages_to_bedrock_format(messages)
-        response = self.client.converse(
-            modelId=model,
-            system=system_prompt,
-            messages=bedrock_messages,
-            inferenceConfig={"temperature": temperature, "maxTokens": max_tokens},
-            toolConfig={"tools": tools} if tools else None,
-        )
+        params = {
+            "modelId": model,
+            "system": system_prompt,
+            "messages": bedrock_messages,
+            "inferenceConfig": {"temperature": temperature, "maxTokens": max_tokens},
+        }
+        if tools:
+            params["toolConfig"] = {"tools": tools}
+        return params
+
+    async def _invoke_bedrock(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        tools: Optional[List[dict]] = None,
+        tool_choice: Literal["none", "auto", "required"] = "auto",
+        **kwargs,
+    ) -> OpenAIResponse:
+        # Non-streaming invocation of Bedrock model (runs on the thread pool)
+        params = self._converse_params(model, messages, max_tokens, temperature, tools)
+        response = await _run_in_executor(self.client.converse, **params)
         openai_response = self._convert_bedrock_response_to_openai_format(response)
         return openai_response
 
@@ -225,20 +310,12 @@ class ChatCompletions:
         temperature: float,
         tools: Optional[List[dict]] = None,
         tool_choice: Literal["none", "auto", "required"] = "auto",
+        sink: Optional[StreamSink] = None,
         **kwargs,
     ) -> OpenAIResponse:
-        # Streaming invocation of Bedrock model
-        (
-            system_prompt,
-            bedrock_messages,
-        ) = self._convert_openai_messages_to_bedrock_format(messages)
-        response = self.client.converse_stream(
-            modelId=model,
-            system=system_prompt,
-            messages=bedrock_messages,
-            inferenceConfig={"temperature": temperature, "maxTokens": max_tokens},
-            toolConfig={"tools": tools} if tools else None,
-        )
+        # Streaming invocation of Bedrock model (events are read on the thread pool)
+        params = self._converse_params(model, messages, max_tokens, temperature, tools)
+        response = await _run_in_executor(self.client.converse_stream, **params)
 
         # Initialize response structure
         bedrock_response = {
@@ -247,51 +324,74 @@ class ChatCompletions:
             "usage": {},
             "metrics": {},
         }
-        bedrock_response_text = ""
-        bedrock_response_tool_input = ""
+        # Content blocks by contentBlockIndex: text parts or a toolUse with input parts
+        blocks: Dict[int, dict] = {}
+        # A sink passed in (or installed on the context) belongs to the caller;
+        # only the default sink resolved here is closed here
+        owned = sink is None and current_stream_sink() is None
+        sink = get_stream_sink(sink)
+        sent = False
+
+        # The sink is reset if the stream fails after sending deltas, and an owned
+        # sink is closed even if the caller is cancelled
+        try:
+            # Process streaming response
+            stream = response.get("stream")
+            if stream:
+                async for event in _iterate_in_executor(stream):
+                    if event.get("messageStart", {}).get("role"):
+                        bedrock_response["output"]["message"]["role"] = event[
+                            "messageStart"
+                        ]["role"]
+                    if "contentBlockStart" in event:
+                        start = event["contentBlockStart"]
+                        tool_use = start.get("start", {}).get("toolUse")
+                        if tool_use:
+                            blocks[start["contentBlockIndex"]] = {
+                                "toolUse": {
+                                    "toolUseId": tool_use["toolUseId"],
+                                    "name": tool_use["name"],
+                                },
+                                "parts": [],
+                            }
+                    if "contentBlockDelta" in event:
+                        index = event["contentBlockDelta"]["contentBlockIndex"]
+                        delta = event["contentBlockDelta"].get("delta", {})
+                        block = blocks.setdefault(index, {"parts": []})
+                        if delta.get("text"):
+                            block["parts"].append(delta["text"])
+                            sent = True
+                            await sink.send(delta["text"])
+                        if delta.get("toolUse"):
+                            tool_input = delta["toolUse"].get("input", "")
+                            block["parts"].append(tool_input)
+                            sent = True
+                            await sink.send(tool_input)
+                    if event.get("messageStop", {}).get("stopReason"):
+                        bedrock_response["stopReason"] = event["messageStop"][
+                            "stopReason"
+                        ]
+                    if event.get("metadata", {}).get("usage"):
+                        bedrock_response["usage"] = event["metadata"]["usage"]
+        except BaseException:
+            if sent:
+                await sink.reset()
+            raise
+        finally:
+            if owned:
+                await sink.close()
+
+        # Assemble content blocks in order; each toolUse keeps its own id and input
+        content = bedrock_response["output"]["message"]["content"]
+        for index in sorted(blocks):
+            block = blocks[index]
+            joined = "".join(block["parts"])
+            if "toolUse" in block:
+                block["toolUse"]["input"] = json.loads(joined) if joined else {}
+                content.append({"toolUse": block["toolUse"]})
+            else:
+                content.append({"text": joined})
 
-        # Process streaming response
-        stream = response.get("stream")
-        if stream:
-            for event in stream:
-                if event.get("messageStart", {}).get("role"):
-                    bedrock_response["output"]["message"]["role"] = event[
-                        "messageStart"
-                    ]["role"]
-                if event.get("contentBlockDelta", {}).get("delta", {}).get("text"):
-                    bedrock_response_text += event["contentBlockDelta"]["delta"]["text"]
-                    print(
-                        event["contentBlockDelta"]["delta"]["text"], end="", flush=True
-                    )
-                if event.get("contentBlockStop", {}).get("contentBlockIndex") == 0:
-                    bedrock_response["output"]["message"]["content"].append(
-                        {"text": bedrock_response_text}
-                    )
-                if event.get("contentBlockStart", {}).get("start", {}).get("toolUse"):
-                    bedrock_tool_use = event["contentBlockStart"]["start"]["toolUse"]
-                    tool_use = {
-                        "toolUseId": bedrock_tool_use["toolUseId"],
-                        "name": bedrock_tool_use["name"],
-                    }
-                    bedrock_response["output"]["message"]["content"].append(
-                        {"toolUse": tool_use}
-                    )
-                    global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = bedrock_tool_use["toolUseId"]
-                if event.get("contentBlockDelta", {}).get("delta", {}).get("toolUse"):
-                    bedrock_response_tool_input += event["contentBlockDelta"]["delta"][
-                        "toolUse"
-                    ]["input"]
-                    print(
-                        event["contentBlockDelta"]["delta"]["toolUse"]["input"],
-                        end="",
-                        flush=True,
-                    )
-                if event.get("contentBlockStop", {}).get("contentBlockIndex") == 1:
-                    bedrock_response["output"]["message"]["content"][1]["toolUse"][
-                        "input"
-                    ] = json.loads(bedrock_response_tool_input)
-        print()
         openai_response = self._convert_bedrock_response_to_openai_format(
             bedrock_response
         )
@@ -306,9 +406,10 @@ class ChatCompletions:
         stream: Optional[bool] = True,
         tools: Optional[List[dict]] = None,
         tool_choice: Literal["none", "auto", "required"] = "auto",
+        sink: Optional[StreamSink] = None,
         **kwargs,
     ) -> OpenAIResponse:
-        # Main entry point for chat completion
+        # Main entry point for chat completion; streamed deltas go to sink
         bedrock_tools = []
         if tools is not None:
             bedrock_tools = self._convert_openai_tools_to_bedrock_format(tools)
@@ -320,6 +421,7 @@ class ChatCompletions:
                 temperature,
                 bedrock_tools,
                 tool_choice,
+                sink=sink,
                 **kwargs,
             )
         else:
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大型观察结果存储模块
+
+网页正文、命令输出、查询结果等工具返回结果经常有几万字符。直接按 max_observe 截断会丢掉
+结尾的内容，而保留下来的上万字符又会进入之后每一步的请求。本模块把过长的结果移出记忆：
+- 内容寻址：按内容的 SHA-256 哈希保存为工作区下的文件，相同的结果只保存一次
+- 预览：记忆中只保留开头和结尾的片段以及引用（blob id）
+- 按需读取：智能体通过 read_blob 工具（app/tool/blob_reader.py）读取任意片段或在其中搜索
+
+文件保存在工作区中，检查点恢复后引用仍然有效。写入和读取都会刷新文件的修改时间，
+超过 ttl_seconds 未被访问的 blob 会被删除，总大小超过 max_size_mb 时删除最久未访问的 blob。
+配置来自 config.toml 的 [blob_store]（默认关闭）。
+
+使用示例：
+    store = get_blob_store()
+    blob_id = store.put(text)
+    observation = store.preview(text, blob_id)
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from app.config import BlobStoreSettings, config
+from app.exceptions import ToolError
+
+
+class BlobStore:
+    """
+    内容寻址的文本存储
+
+    所有方法都是同步的文件操作，在事件循环中应通过 asyncio.to_thread 调用。
+    """
+
+    def __init__(self, root: Path, settings: BlobStoreSettings):
+        """
+        初始化存储
+
+        Args:
+            root: 存储目录
+            settings: 存储配置
+        """
+        self.root = Path(root)
+        self.settings = settings
+        self.evictions = 0
+
+    @staticmethod
+    def make_id(text: str) -> str:
+        """
+        计算文本的引用（SHA-256 哈希的前 16 位）
+
+        Args:
+            text: 文本内容
+
+        Returns:
+            str: blob id
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def _path(self, blob_id: str) -> Path:
+        """blob 文件的路径（拒绝不是十六进制哈希的 id，避免路径穿越）"""
+        if not re.fullmatch(r"[0-9a-f]{16}", blob_id):
+            raise ToolError(f"Invalid blob id: {blob_id!r}")
+        return self.root / f"{blob_id}.txt"
+
+    def put(self, text: str) -> str:
+        """
+        保存文本
+
+        先写入临时文件再重命名，并发保存同一内容或中途崩溃都不会留下不完整的文件。
+
+        Args:
+            text: 文本内容
+
+        Returns:
+            str: blob id
+        """
+        blob_id = self.make_id(text)
+        path = self._path(blob_id)
+        if self._touch(path):
+            return blob_id
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict(keep=blob_id)
+        return blob_id
+
+    @staticmethod
+    def _touch(path: Path) -> bool:
+        """刷新文件的修改时间（用作最近访问时间），文件不存在时返回 False"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        删除过期的 blob 和超出大小上限的最久未访问的 blob
+
+        Args:
+            keep: 不删除的 blob id（如刚写入的 blob）
+
+        Returns:
+            int: 删除的 blob 数量
+        """
+        ttl = self.settings.ttl_seconds
+        max_bytes = self.settings.max_size_mb * 1024 * 1024
+        if not ttl and not max_bytes:
+            return 0
+        entries = []
+        for path in self.root.glob("*.txt"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            expired = bool(ttl) and mtime < now - ttl
+            if not expired and not (max_bytes and total > max_bytes):
+                # 按访问时间排序，之后的 blob 都更新，也不会过期
+                break
+            if path.stem == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        self.evictions += removed
+        return removed
+
+    def get(self, blob_id: str) -> str:
+        """
+        读取完整文本
+
+        Args:
+            blob_id: blob id
+
+        Returns:
+            str: 文本内容
+
+        Raises:
+            ToolError: blob 不存在时
+        """
+        path = self._path(blob_id)
+        try:
+            with open(path, encoding="utf-8", newline="") as f:
+                text = f.read()
+        except FileNotFoundError:
+            raise ToolError(f"Blob {blob_id} not found (it may have expired)")
+        self._touch(path)
+        return text
+
+    def preview(self, text: str, blob_id: str) -> str:
+        """
+        生成记忆中保留的预览：开头、省略说明和结尾
+
+        Args:
+            text: 完整文本
+            blob_id: 该文本的 blob id
+
+        Returns:
+            str: 预览文本
+        """
+        head = text[: self.settings.head_chars]
+        tail = (
+            text[len(text) - self.settings.tail_chars :]
+            if self.settings.tail_chars
+            else ""
+        )
+        omitted = len(text) - len(head) - len(tail)
+        return (
+            f"{head}\n\n"
+            f"[... {omitted} of {len(text)} characters omitted. The full output is stored as "
+            f'blob "{blob_id}"; use the read_blob tool to read a range or grep it ...]\n\n'
+            f"{tail}"
+        )
+
+    def read(self, blob_id: str, offset: int = 0, length: Optional[int] = None) -> str:
+        """
+        读取一段文本
+
+        Args:
+            blob_id: blob id
+            offset: 起始字符位置（负数表示从结尾倒数）
+            length: 读取的字符数，默认且最多为 max_read_chars
+
+        Returns:
+            str: 带位置说明的文本片段
+        """
+        text = self.get(blob_id)
+        limit = self.settings.max_read_chars
+        length = limit if length is None else max(0, min(length, limit))
+        start = max(0, len(text) + offset if offset < 0 else offset)
+        end = min(len(text), start + length)
+        return f"[characters {start}-{end} of {len(text)}]\n{text[start:end]}"
+
+    def grep(
+        self, blob_id: str, pattern: str, context: int = 0, max_matches: int = 50
+    ) -> str:
+        """
+        按正则表达式搜索文本中的行
+
+        Args:
+            blob_id: blob id
+            pattern: 正则表达式
+            context: 每个匹配前后附带的行数
+            max_matches: 最多返回的匹配数
+
+        Returns:
+            str: 匹配的行，每行带行号和字符位置（可用于 read 的 offset）
+        """
+        try:
+            regex = re.compile(pattern)
+        except re.error as e:
+            raise ToolError(f"Invalid pattern {pattern!r}: {e}")
+        text = self.get(blob_id)
+        lines = text.splitlines(keepends=True)
+        offsets: List[int] = []
+        position = 0
+        for line in lines:
+            offsets.append(position)
+            position += len(line)
+
+        matches = [i for i, line in enumerate(lines) if regex.search(line)]
+        if not matches:
+            return f"No matches for {pattern!r} in blob {blob_id}"
+        shown = set()
+        output = []
+        for i in matches[:max_matches]:
+            for j in range(max(0, i - context), min(len(lines), i + context + 1)):
+                if j not in shown:
+                    shown.add(j)
+                    marker = ":" if j == i else "-"
+                    output.append(
+                        f"{j + 1}{marker}@{offsets[j]}{marker} {lines[j].rstrip()}"
+                    )
+        limit = self.settings.max_read_chars
+        result = "\n".join(output)
+        if len(result) > limit:
+            result = result[:limit] + "\n[... output truncated ...]"
+        header = f"{len(matches)} matching line(s) in blob {blob_id}"
+        if len(matches) > max_matches:
+            header += f", showing the first {max_matches}"
+        return f"{header} (line:@offset: text)\n{result}"
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> Optional[BlobStore]:
+    """
+    获取进程级的存储（位于工作区下）
+
+    Returns:
+        Optional[BlobStore]: 存储，[blob_store] 未启用时返回 None
+    """
+    global _blob_store
+    settings = config.blob_store or BlobStoreSettings()
+    if not settings.enabled:
+        return None
+    if _blob_store is None:
+        _blob_store = BlobStore(config.workspace_root / settings.directory, settings)
+    return _blob_store
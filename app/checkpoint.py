@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+智能体检查点模块
+
+长时间运行的智能体在第 17 步崩溃后，不必从头再付一遍前 17 次 LLM 调用的费用：
+启用检查点后，BaseAgent.run 在每一步结束时把状态追加写入本地 JSONL 文件，
+之后可以用 BaseAgent.resume 从最后一个完整的步骤继续。
+
+文件只追加、每步增量写入：
+- messages 记录：自上一步以来新增的消息（以及从头部裁剪掉的消息数）；
+  历史被整体替换（如压缩）时写入完整的消息列表
+- step 记录：步数、状态、下一步提示词、token 用量，以及自上一步以来有变化的工具状态
+  （如 StrReplaceEditor 的编辑历史、PlanningTool 的计划）
+
+只有后面跟着 step 记录的 messages 记录才会被恢复，因此写到一半崩溃的步骤会被丢弃。
+图片只保存图片存储中的引用。图片存储只在进程内存中：在同一进程中恢复时图片仍然可用，
+在新进程中恢复时所有图片都显示为占位文本（并记录一条警告）。
+"""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.logger import logger
+from app.schema import AgentState, Message
+
+
+class CheckpointState(BaseModel):
+    """从检查点文件中恢复出的最后一个完整步骤"""
+
+    step: int = Field(0, description="已完成的步数")
+    state: AgentState = Field(AgentState.IDLE, description="该步结束时的智能体状态")
+    next_step_prompt: Optional[str] = Field(None, description="该步结束时的下一步提示词")
+    messages: List[Dict[str, Any]] = Field(default_factory=list, description="消息历史")
+    input_tokens: int = Field(0, description="累计输入 token 数")
+    completion_tokens: int = Field(0, description="累计输出 token 数")
+    tools: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict, description="按工具名称保存的工具状态"
+    )
+    offset: int = Field(0, description="最后一个完整步骤在文件中的结束位置（字节）")
+
+
+class CheckpointWriter:
+    """
+    检查点文件的增量写入器
+
+    记住上一步写入时的消息列表，每步只序列化之后新增的消息；
+    文件写入在线程池中进行，不阻塞事件循环。
+    """
+
+    def __init__(self, path: str, resume_from: Optional[CheckpointState] = None):
+        """
+        初始化写入器
+
+        Args:
+            path: 检查点文件路径
+            resume_from: 从该检查点恢复时继续追加（截掉最后一个完整步骤之后的内容），
+                否则清空已有文件
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume_from is None:
+            self.path.write_text("", encoding="utf-8")
+        else:
+            # 崩溃时写了一半的记录必须截掉，否则之后追加的记录会接在残行后面
+            with self.path.open("r+b") as f:
+                f.truncate(resume_from.offset)
+        self._previous: List[Message] = []
+        self._tool_states: Dict[str, str] = {}
+
+    def mark_written(
+        self, messages: List[Message], tool_states: Dict[str, Dict[str, Any]]
+    ) -> None:
+        """
+        将当前消息和工具状态标记为已写入（从检查点恢复后调用）
+
+        Args:
+            messages: 恢复出的消息历史
+            tool_states: 恢复出的工具状态
+        """
+        self._previous = list(messages)
+        self._tool_states = {
+            name: self._dumps_state(state) for name, state in tool_states.items()
+        }
+
+    @staticmethod
+    def _dumps_state(state: Dict[str, Any]) -> str:
+        """序列化工具状态（键排序，用于判断状态是否变化）"""
+        return json.dumps(state, ensure_ascii=False, sort_keys=True)
+
+    def _messages_record(self, messages: List[Message]) -> Optional[Dict[str, Any]]:
+        """计算自上一步以来的消息变化，没有变化时返回 None"""
+        previous, self._previous = self._previous, list(messages)
+        if not previous:
+            start, dropped, reset = 0, 0, False
+        else:
+            # 上一步的最后一条消息通常就在末尾附近，从后往前找
+            index = next(
+                (
+                    i
+                    for i in range(len(messages) - 1, -1, -1)
+                    if messages[i] is previous[-1]
+                ),
+                None,
+            )
+            start = 0 if index is None else index + 1
+            dropped = len(previous) - start
+            # 保留的部分必须与上一步的末尾逐条相同，否则（如压缩替换了历史）写入完整列表
+            reset = (
+                index is None
+                or dropped < 0
+                or any(a is not b for a, b in zip(messages[:start], previous[dropped:]))
+            )
+
+        if reset:
+            return {"type": "messages", "reset": [m.to_dict() for m in messages]}
+        new = messages[start:]
+        if not new and not dropped:
+            return None
+        return {
+            "type": "messages",
+            "drop": dropped,
+            "append": [m.to_dict() for m in new],
+        }
+
+    async def write_step(
+        self,
+        step: int,
+        state: AgentState,
+        next_step_prompt: Optional[str],
+        messages: List[Message],
+        input_tokens: int,
+        completion_tokens: int,
+        tool_states: Dict[str, Optional[Dict[str, Any]]],
+    ) -> None:
+        """
+        追加一步的检查点
+
+        Args:
+            step: 已完成的步数
+            state: 智能体状态
+            next_step_prompt: 下一步提示词
+            messages: 当前消息历史
+            input_tokens: 累计输入 token 数
+            completion_tokens: 累计输出 token 数
+            tool_states: 按工具名称的工具状态（checkpoint_state 的返回值）
+        """
+        record = self._messages_record(messages)
+        step_record = {
+            "type": "step",
+            "step": step,
+            "state": state.value,
+            "next_step_prompt": next_step_prompt,
+            "input_tokens": input_tokens,
+            "completion_tokens": completion_tokens,
+        }
+        # 序列化（可能较大的工具状态）和写文件都放在线程池中；
+        # 调用方等待写入完成后才继续下一步，期间工具状态不会被修改
+        await asyncio.to_thread(self._append, record, step_record, tool_states)
+
+    def _append(
+        self,
+        record: Optional[Dict[str, Any]],
+        step_record: Dict[str, Any],
+        tool_states: Dict[str, Optional[Dict[str, Any]]],
+    ) -> None:
+        """在线程池中序列化并追加写入"""
+        changed = {}
+        for name, state in tool_states.items():
+            if state is None:
+                continue
+            text = self._dumps_state(state)
+            if self._tool_states.get(name) != text:
+                self._tool_states[name] = text
+                changed[name] = state
+        step_record["tools"] = changed
+
+        lines = [record] if record is not None else []
+        lines.append(step_record)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(
+                "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+            )
+
+
+def load_checkpoint(path: str) -> Optional[CheckpointState]:
+    """
+    读取检查点文件中最后一个完整的步骤
+
+    Args:
+        path: 检查点文件路径
+
+    Returns:
+        Optional[CheckpointState]: 恢复出的状态，文件不存在或没有完整的步骤时返回 None
+    """
+    target = Path(path)
+    if not target.exists():
+        return None
+
+    messages: List[Dict[str, Any]] = []
+    pending: List[Dict[str, Any]] = []
+    result: Optional[CheckpointState] = None
+    tools: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    with target.open("rb") as f:
+        for number, line in enumerate(f, 1):
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                # 最后一行可能是崩溃时写了一半的记录
+                logger.warning(f"检查点 {path} 第 {number} 行无法解析，已忽略")
+                break
+            if record.get("type") == "messages":
+                pending.append(record)
+                continue
+            if record.get("type") != "step":
+                continue
+
+            for change in pending:
+                if "reset" in change:
+                    messages = list(change["reset"])
+                else:
+                    del messages[: change.get("drop", 0)]
+                    messages.extend(change.get("append", []))
+            pending = []
+            tools.update(record.get("tools", {}))
+            result = CheckpointState(
+                step=record["step"],
+                state=record["state"],
+                next_step_prompt=record.get("next_step_prompt"),
+                input_tokens=record.get("input_tokens", 0),
+                completion_tokens=record.get("completion_tokens", 0),
+                offset=offset,
+            )
+
+    if result is None:
+        return None
+    result.messages = messages
+    result.tools = tools
+    return result
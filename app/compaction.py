@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上下文压缩模块
+
+当对话历史的 token 数接近上下文窗口时，本模块把较早的对话总结为一条摘要消息：
+- 固定保留：开头的系统消息和第一条用户消息（原始请求）
+- 原样保留：最近的 keep_recent 条消息
+- 成对一致：切分点不会落在 tool_calls 与其工具结果之间，
+  不会留下没有对应调用的工具结果
+- 摘要生成：使用较便宜的 LLM 配置（[compaction] 的 llm 项）
+
+压缩后 Memory 的 token 计数会自动重置，下次估算时重新累计。
+配置来自 config.toml 的 [compaction]，默认关闭。
+"""
+
+from typing import List, Optional, Tuple
+
+from app.config import CompactionSettings, config
+from app.logger import logger
+from app.schema import Memory, Message, Role
+
+SUMMARY_PREFIX = "[Summary of earlier conversation]"
+
+SUMMARY_PROMPT = """Summarize the earlier part of an agent's working session so the agent can continue the task without it.
+Keep: decisions made, facts and data discovered, files/URLs/identifiers touched, tool results that are still relevant, and what remains to be done.
+Drop: chit-chat, repeated attempts, and raw tool output that has already been acted upon.
+Write at most {max_tokens} tokens, as concise bullet points.
+
+Conversation to summarize:
+{transcript}"""
+
+
+class ContextCompactor:
+    """
+    上下文压缩器
+
+    使用示例：
+        compactor = ContextCompactor(config.compaction)
+        await compactor.maybe_compact(memory, llm, system_msgs, tools)
+    """
+
+    def __init__(self, settings: CompactionSettings):
+        """
+        初始化压缩器
+
+        Args:
+            settings: 上下文压缩配置
+        """
+        self.settings = settings
+        self.compactions = 0
+        self.tokens_saved = 0
+
+    def context_window(self, llm) -> Optional[int]:
+        """
+        获取上下文窗口大小
+
+        Args:
+            llm: 发送请求的 LLM 实例
+
+        Returns:
+            Optional[int]: 上下文窗口（token），未配置时返回 None
+        """
+        return self.settings.context_window or llm.max_input_tokens
+
+    def should_compact(self, tokens: int, llm) -> bool:
+        """
+        判断当前 token 数是否达到压缩阈值
+
+        Args:
+            tokens: 当前请求的输入 token 估算值
+            llm: 发送请求的 LLM 实例
+
+        Returns:
+            bool: 是否需要压缩
+        """
+        window = self.context_window(llm)
+        return bool(window) and tokens >= window * self.settings.trigger_ratio
+
+    def split(self, messages: List[Message]) -> Tuple[int, int]:
+        """
+        计算压缩区间 [start, end)
+
+        start 之前是固定保留的消息（开头的系统消息和第一条用户消息），
+        end 之后是原样保留的最近消息。end 会向前移动，保证最近消息
+        不以工具结果开头（工具结果与其 tool_calls 始终在同一侧）。
+
+        Args:
+            messages: 消息列表
+
+        Returns:
+            Tuple[int, int]: 压缩区间的起止下标，start >= end 表示无需压缩
+        """
+        start = 0
+        while start < len(messages) and messages[start].role == Role.SYSTEM:
+            start += 1
+        if start < len(messages) and messages[start].role == Role.USER:
+            start += 1
+
+        end = max(start, len(messages) - self.settings.keep_recent)
+        while start < end < len(messages) and messages[end].role == Role.TOOL:
+            end -= 1
+        return start, end
+
+    @staticmethod
+    def render_transcript(messages: List[Message], max_chars: int = 2000) -> str:
+        """
+        将消息渲染为摘要用的文本记录
+
+        Args:
+            messages: 待总结的消息
+            max_chars: 单条消息内容的最大字符数
+
+        Returns:
+            str: 文本记录
+        """
+        lines = []
+        for message in messages:
+            content = message.content or ""
+            if len(content) > max_chars:
+                content = content[:max_chars] + " ...(truncated)"
+            if message.tool_calls:
+                calls = ", ".join(
+                    f"{call.function.name}({call.function.arguments[:200]})"
+                    for call in message.tool_calls
+                )
+                content = f"{content}\n[tool calls] {calls}".strip()
+            role = message.role if message.role != Role.TOOL else f"tool:{message.name}"
+            lines.append(f"{role}: {content}")
+        return "\n\n".join(lines)
+
+    async def summarize(self, messages: List[Message]) -> str:
+        """
+        使用摘要 LLM 总结消息
+
+        Args:
+            messages: 待总结的消息
+
+        Returns:
+            str: 摘要文本
+        """
+        from app.llm import LLM
+
+        summary_llm = LLM(config_name=self.settings.llm)
+        prompt = SUMMARY_PROMPT.format(
+            max_tokens=self.settings.max_summary_tokens,
+            transcript=self.render_transcript(messages),
+        )
+        return await summary_llm.ask(
+            [Message.user_message(prompt)], stream=False, temperature=0
+        )
+
+    async def maybe_compact(
+        self,
+        memory: Memory,
+        llm,
+        system_msgs: Optional[List[Message]] = None,
+        tools: Optional[List[dict]] = None,
+    ) -> bool:
+        """
+        在接近上下文窗口时压缩记忆
+
+        token 数按 ask_tool 的方式估算（包括工具定义），与随后的请求共用 Memory 的增量计数。
+        摘要生成失败时只记录警告，不影响正常请求。
+
+        Args:
+            memory: 智能体的记忆
+            llm: 发送请求的 LLM 实例（用于估算 token 和确定窗口大小）
+            system_msgs: 请求中附带的系统消息
+            tools: 请求中附带的工具定义
+
+        Returns:
+            bool: 是否执行了压缩
+        """
+        tokens = llm.estimate_tool_request_tokens(memory, system_msgs, tools)
+        if not self.should_compact(tokens, llm):
+            return False
+
+        messages = memory.messages
+        start, end = self.split(messages)
+        if end - start < 2:
+            return False
+
+        try:
+            summary = await self.summarize(messages[start:end])
+        except Exception as e:
+            logger.warning(f"上下文压缩失败，保留原始历史: {e}")
+            return False
+
+        memory.messages = (
+            messages[:start]
+            + [Message.user_message(f"{SUMMARY_PREFIX}\n{summary}")]
+            + messages[end:]
+        )
+        compacted = llm.estimate_tool_request_tokens(memory, system_msgs, tools)
+        self.compactions += 1
+        self.tokens_saved += max(tokens - compacted, 0)
+        logger.info(
+            f"上下文已压缩：{end - start} 条消息 -> 1 条摘要，" f"输入 token {tokens} -> {compacted}"
+        )
+        return True
+
+
+_compactor: Optional[ContextCompactor] = None
+
+
+def get_compactor() -> Optional[ContextCompactor]:
+    """
+    获取进程级的上下文压缩器
+
+    Returns:
+        Optional[ContextCompactor]: 压缩器，[compaction] 未启用时返回 None
+    """
+    global _compactor
+    settings = config.compaction
+    if settings is None or not settings.enabled:
+        return None
+    if _compactor is None:
+        _compactor = ContextCompactor(settings)
+    return _compactor
@@ -61,6 +61,236 @@ class LLMSettings(BaseModel):
     temperature: float = Field(1.0, description="采样温度，控制回复的随机性（0-2）")
     api_type: str = Field(..., description="API 类型：'openai', 'azure', 'ollama' 等")
     api_version: str = Field(..., description="Azure OpenAI 的 API 版本（仅 Azure 需要）")
+    requests_per_minute: Optional[int] = Field(
+        None, description="本地限流：每分钟最大请求数（None 表示不限制）"
+    )
+    tokens_per_minute: Optional[int] = Field(
+        None, description="本地限流：每分钟最大输入 token 数（None 表示不限制）"
+    )
+    max_concurrency: Optional[int] = Field(
+        None, description="本地限流：同时进行中的最大请求数（None 表示不限制）"
+    )
+    stream_usage: bool = Field(
+        True,
+        description="流式请求时是否通过 stream_options.include_usage 获取服务端统计的 token 用量",
+    )
+    prompt_cache_control: bool = Field(
+        False,
+        description="是否在系统提示词和工具定义末尾添加 cache_control 标记"
+        "（Anthropic 风格的提示词缓存，需服务端支持）",
+    )
+
+
+class LLMCacheSettings(BaseModel):
+    """
+    LLM 响应缓存配置类
+
+    配置 LLM.ask / LLM.ask_tool 的本地磁盘响应缓存（默认关闭）。
+    相同的模型、消息、工具和参数会直接返回缓存的响应，不再请求 API。
+    """
+
+    enabled: bool = Field(False, description="是否启用响应缓存")
+    path: str = Field(
+        ".cache/llm_responses.sqlite3",
+        description="SQLite 缓存文件路径（相对路径基于项目根目录）",
+    )
+    ttl_seconds: Optional[int] = Field(
+        86400, description="缓存条目的有效期（秒），0 或不设置表示永不过期"
+    )
+    max_size_mb: float = Field(
+        256, description="缓存总大小上限（MB），超过后按最近访问时间淘汰，0 表示不限制"
+    )
+
+
+class HTTPPoolSettings(BaseModel):
+    """
+    HTTP 连接池配置类
+
+    配置所有 LLM 客户端共享的 HTTP 连接池（同一 API 源共用一个连接池）。
+    """
+
+    max_connections: int = Field(100, description="每个 API 源的最大连接数")
+    max_keepalive_connections: int = Field(
+        20, description="每个 API 源保持的最大空闲（keepalive）连接数"
+    )
+    keepalive_expiry: float = Field(30.0, description="空闲连接的保持时间（秒）")
+    http2: bool = Field(False, description="是否启用 HTTP/2（需要安装 h2 包）")
+    connect_timeout: float = Field(10.0, description="建立连接的超时时间（秒）")
+    read_timeout: float = Field(600.0, description="读取响应的超时时间（秒）")
+    write_timeout: float = Field(30.0, description="发送请求的超时时间（秒）")
+    pool_timeout: float = Field(
+        30.0, description="等待连接池空闲连接的超时时间（秒）"
+    )
+
+
+class RetrySettings(BaseModel):
+    """
+    LLM 重试策略配置类
+
+    只有可重试的错误（429、5xx、超时、连接中断）才会重试，
+    并受进程级重试预算约束，避免故障时把 LLM 负载放大数倍。
+    """
+
+    max_attempts: int = Field(6, description="单次调用的最大尝试次数（含首次）")
+    min_wait: float = Field(1.0, description="指数退避的最小等待时间（秒）")
+    max_wait: float = Field(60.0, description="指数退避的最大等待时间（秒）")
+    max_retry_after: float = Field(
+        120.0, description="服务端 Retry-After 的最大采纳值（秒），超过时按此值等待"
+    )
+    budget_ratio: float = Field(
+        0.2, description="重试预算：时间窗口内重试次数占请求次数的最大比例"
+    )
+    budget_min_retries: int = Field(
+        10, description="重试预算：时间窗口内始终允许的最少重试次数"
+    )
+    budget_window: float = Field(60.0, description="重试预算的统计时间窗口（秒）")
+
+
+class CompactionSettings(BaseModel):
+    """
+    上下文压缩配置类
+
+    对话历史的 token 数接近上下文窗口时，用较便宜的 LLM 配置把较早的对话
+    总结为一条摘要消息，使长时间运行的智能体保持有界的提示词大小。
+    """
+
+    enabled: bool = Field(False, description="是否启用自动上下文压缩")
+    context_window: Optional[int] = Field(
+        None,
+        description="上下文窗口大小（token），不设置时使用 LLM 的 max_input_tokens",
+    )
+    trigger_ratio: float = Field(
+        0.8, description="输入 token 数达到上下文窗口的该比例时触发压缩"
+    )
+    keep_recent: int = Field(10, description="压缩时原样保留的最近消息条数")
+    llm: str = Field(
+        "summary", description="生成摘要使用的 LLM 配置名称（不存在时使用 default）"
+    )
+    max_summary_tokens: int = Field(1024, description="摘要的目标最大长度（token）")
+
+
+class RouterSettings(BaseModel):
+    """
+    LLM 路由配置类
+
+    配置 LLMRouter 在多个 LLM 配置之间的对冲请求和故障切换。
+    """
+
+    endpoints: List[str] = Field(
+        default_factory=list,
+        description="参与路由的 LLM 配置名称（按优先级排列），如 ['default', 'backup']",
+    )
+    hedge: bool = Field(True, description="是否在主端点变慢时向次优端点发出对冲请求")
+    hedge_quantile: float = Field(
+        0.95, description="对冲延迟使用的主端点延迟分位数"
+    )
+    min_hedge_delay: float = Field(1.0, description="对冲延迟的下限（秒）")
+    default_hedge_delay: float = Field(
+        10.0, description="延迟样本不足时使用的对冲延迟（秒）"
+    )
+    window: int = Field(50, description="每个端点延迟和错误率的滚动窗口（调用次数）")
+    min_samples: int = Field(5, description="计算延迟分位数和错误率所需的最少样本数")
+    max_error_rate: float = Field(
+        0.5, description="错误率达到该值的端点视为降级，排到健康端点之后"
+    )
+
+
+class TelemetrySettings(BaseModel):
+    """
+    LLM 调用遥测配置类
+
+    每次 LLM 调用记录一条延迟 / token / 重试 / 缓存命中样本，保存在进程内的环形缓冲区中。
+    """
+
+    enabled: bool = Field(True, description="是否记录 LLM 调用遥测样本")
+    capacity: int = Field(2000, description="环形缓冲区最多保留的样本数")
+
+
+class ImageStoreSettings(BaseModel):
+    """
+    图片存储配置类
+
+    截图等图片按内容哈希存入进程级图片存储，消息中只保存引用；
+    图片在第一次发送前于线程池中缩放到服务端的处理尺寸以内，请求中只内联最近的若干张。
+    """
+
+    enabled: bool = Field(False, description="是否将消息中的图片存入图片存储（消息只保留哈希引用）")
+    max_long_side: int = Field(
+        1568, description="图片长边的最大像素，超过时入库前等比缩小"
+    )
+    max_short_side: int = Field(
+        768, description="图片短边的最大像素（OpenAI 高细节模式会把短边缩放到 768）"
+    )
+    jpeg_quality: int = Field(85, description="缩放后重新编码的 JPEG 质量（1-95）")
+    keep_last: Optional[int] = Field(
+        3,
+        description="请求中内联的最近图片数量，更早的图片替换为简短占位文本；不设置时全部内联",
+    )
+    max_entries: int = Field(
+        256,
+        description="图片存储最多保留的图片数量（超出时淘汰最久未使用的；仍被消息引用的图片不会被淘汰）",
+    )
+
+
+class BlobStoreSettings(BaseModel):
+    """
+    大型观察结果存储配置类
+
+    超过阈值的工具返回结果存入工作区下的内容寻址文件中，
+    记忆中只保留首尾预览和引用，完整内容可以通过 read_blob 工具按需读取。
+    """
+
+    enabled: bool = Field(
+        False, description="是否将过长的工具返回结果存入存储（关闭时按 max_observe 截断）"
+    )
+    spill_threshold: int = Field(4000, description="超过该长度（字符数）的工具返回结果存入存储")
+    head_chars: int = Field(1500, description="预览中保留的开头字符数")
+    tail_chars: int = Field(1000, description="预览中保留的结尾字符数")
+    directory: str = Field(".blobs", description="存储目录（相对于工作区）")
+    max_read_chars: int = Field(8000, description="read_blob 单次最多返回的字符数")
+    ttl_seconds: Optional[int] = Field(
+        7 * 86400, description="blob 自最后一次写入或读取起的保留时间（秒），0 或不设置表示永不过期"
+    )
+    max_size_mb: float = Field(
+        512, description="存储总大小上限（MB），超过后按最近访问时间淘汰，0 表示不限制"
+    )
+
+
+class AgentPoolSettings(BaseModel):
+    """
+    智能体池配置类
+
+    预先创建并初始化（连接 MCP 服务器、构造工具）若干智能体，请求到来时直接租用，
+    用完后重置记忆和状态放回池中。
+    """
+
+    size: int = Field(4, description="池中保持的已初始化智能体数量")
+    max_lifetime: float = Field(
+        3600.0, description="智能体的最长存活时间（秒），超过后归还时销毁并重新创建"
+    )
+    max_leases: Optional[int] = Field(
+        None, description="每个智能体最多被租用的次数，超过后重新创建；不设置时不限制"
+    )
+    health_check_interval: float = Field(
+        60.0, description="空闲超过该时间（秒）的智能体在租用前检查 MCP 连接是否可用"
+    )
+    health_check_timeout: float = Field(5.0, description="健康检查的超时时间（秒）")
+
+
+class TracingSettings(BaseModel):
+    """
+    追踪配置类
+
+    记录智能体运行、步骤、LLM 调用、工具执行及其子操作的嵌套 span，
+    每次运行结束时导出为 JSONL 和 Chrome trace-event 文件。
+    """
+
+    enabled: bool = Field(False, description="是否启用追踪（关闭时几乎没有开销）")
+    output_dir: str = Field("logs/traces", description="追踪文件的输出目录")
+    jsonl: bool = Field(True, description="是否导出 JSONL 文件（每行一个 span）")
+    chrome: bool = Field(
+        True, description="是否导出 Chrome trace-event 文件（可在 chrome://tracing 或 Perfetto 中查看）"
+    )
 
 
 class ProxySettings(BaseModel):
@@ -265,6 +495,36 @@ class AppConfig(BaseModel):
     """
 
     llm: Dict[str, LLMSettings] = Field(..., description="LLM 配置字典，支持多个 LLM 配置（键为配置名称）")
+    llm_cache: Optional[LLMCacheSettings] = Field(
+        None, description="LLM 响应缓存配置"
+    )
+    http_pool: Optional[HTTPPoolSettings] = Field(
+        None, description="共享 HTTP 连接池配置"
+    )
+    llm_retry: Optional[RetrySettings] = Field(
+        None, description="LLM 重试策略配置"
+    )
+    compaction: Optional[CompactionSettings] = Field(
+        None, description="上下文压缩配置"
+    )
+    llm_router: Optional[RouterSettings] = Field(
+        None, description="LLM 路由配置"
+    )
+    llm_telemetry: Optional[TelemetrySettings] = Field(
+        None, description="LLM 调用遥测配置"
+    )
+    image_store: Optional[ImageStoreSettings] = Field(
+        None, description="图片存储配置"
+    )
+    blob_store: Optional[BlobStoreSettings] = Field(
+        None, description="大型观察结果存储配置"
+    )
+    agent_pool: Optional[AgentPoolSettings] = Field(
+        None, description="智能体池配置"
+    )
+    tracing: Optional[TracingSettings] = Field(
+        None, description="追踪配置"
+    )
     sandbox: Optional[SandboxSettings] = Field(
         None, description="沙箱环境配置"
     )
@@ -379,6 +639,11 @@ class Config:
             "temperature": base_llm.get("temperature", 1.0),
             "api_type": base_llm.get("api_type", ""),
             "api_version": base_llm.get("api_version", ""),
+            "requests_per_minute": base_llm.get("requests_per_minute"),
+            "tokens_per_minute": base_llm.get("tokens_per_minute"),
+            "max_concurrency": base_llm.get("max_concurrency"),
+            "prompt_cache_control": base_llm.get("prompt_cache_control", False),
+            "stream_usage": base_llm.get("stream_usage", True),
         }
 
         # handle browser config.
@@ -438,6 +703,66 @@ class Config:
         else:
             mcp_settings = MCPSettings(servers=MCPSettings.load_server_config())
 
+        llm_cache_config = raw_config.get("llm_cache", {})
+        if llm_cache_config:
+            llm_cache_settings = LLMCacheSettings(**llm_cache_config)
+        else:
+            llm_cache_settings = LLMCacheSettings()
+
+        http_pool_config = raw_config.get("http_pool", {})
+        if http_pool_config:
+            http_pool_settings = HTTPPoolSettings(**http_pool_config)
+        else:
+            http_pool_settings = HTTPPoolSettings()
+
+        llm_retry_config = raw_config.get("llm_retry", {})
+        if llm_retry_config:
+            llm_retry_settings = RetrySettings(**llm_retry_config)
+        else:
+            llm_retry_settings = RetrySettings()
+
+        compaction_config = raw_config.get("compaction", {})
+        if compaction_config:
+            compaction_settings = CompactionSettings(**compaction_config)
+        else:
+            compaction_settings = CompactionSettings()
+
+        llm_router_config = raw_config.get("llm_router", {})
+        if llm_router_config:
+            llm_router_settings = RouterSettings(**llm_router_config)
+        else:
+            llm_router_settings = RouterSettings()
+
+        llm_telemetry_config = raw_config.get("llm_telemetry", {})
+        if llm_telemetry_config:
+            llm_telemetry_settings = TelemetrySettings(**llm_telemetry_config)
+        else:
+            llm_telemetry_settings = TelemetrySettings()
+
+        image_store_config = raw_config.get("image_store", {})
+        if image_store_config:
+            image_store_settings = ImageStoreSettings(**image_store_config)
+        else:
+            image_store_settings = ImageStoreSettings()
+
+        blob_store_config = raw_config.get("blob_store", {})
+        if blob_store_config:
+            blob_store_settings = BlobStoreSettings(**blob_store_config)
+        else:
+            blob_store_settings = BlobStoreSettings()
+
+        agent_pool_config = raw_config.get("agent_pool", {})
+        if agent_pool_config:
+            agent_pool_settings = AgentPoolSettings(**agent_pool_config)
+        else:
+            agent_pool_settings = AgentPoolSettings()
+
+        tracing_config = raw_config.get("tracing", {})
+        if tracing_config:
+            tracing_settings = TracingSettings(**tracing_config)
+        else:
+            tracing_settings = TracingSettings()
+
         run_flow_config = raw_config.get("runflow")
         if run_flow_config:
             run_flow_settings = RunflowSettings(**run_flow_config)
@@ -451,6 +776,16 @@ class Config:
                     for name, override_config in llm_overrides.items()
                 },
             },
+            "llm_cache": llm_cache_settings,
+            "http_pool": http_pool_settings,
+            "llm_retry": llm_retry_settings,
+            "compaction": compaction_settings,
+            "llm_router": llm_router_settings,
+            "llm_telemetry": llm_telemetry_settings,
+            "image_store": image_store_settings,
+            "blob_store": blob_store_settings,
+            "agent_pool": agent_pool_settings,
+            "tracing": tracing_settings,
             "sandbox": sandbox_settings,
             "browser_config": browser_settings,
             "search_config": search_settings,
@@ -471,6 +806,106 @@ class Config:
         """
         return self._config.llm
 
+    @property
+    def llm_cache(self) -> LLMCacheSettings:
+        """
+        获取 LLM 响应缓存配置
+
+        Returns:
+            LLMCacheSettings: 响应缓存配置对象
+        """
+        return self._config.llm_cache
+
+    @property
+    def http_pool(self) -> HTTPPoolSettings:
+        """
+        获取共享 HTTP 连接池配置
+
+        Returns:
+            HTTPPoolSettings: 连接池配置对象
+        """
+        return self._config.http_pool
+
+    @property
+    def llm_retry(self) -> RetrySettings:
+        """
+        获取 LLM 重试策略配置
+
+        Returns:
+            RetrySettings: 重试策略配置对象
+        """
+        return self._config.llm_retry
+
+    @property
+    def compaction(self) -> CompactionSettings:
+        """
+        获取上下文压缩配置
+
+        Returns:
+            CompactionSettings: 上下文压缩配置对象
+        """
+        return self._config.compaction
+
+    @property
+    def llm_router(self) -> RouterSettings:
+        """
+        获取 LLM 路由配置
+
+        Returns:
+            RouterSettings: LLM 路由配置对象
+        """
+        return self._config.llm_router
+
+    @property
+    def llm_telemetry(self) -> TelemetrySettings:
+        """
+        获取 LLM 调用遥测配置
+
+        Returns:
+            TelemetrySettings: LLM 调用遥测配置对象
+        """
+        return self._config.llm_telemetry
+
+    @property
+    def image_store(self) -> ImageStoreSettings:
+        """
+        获取图片存储配置
+
+        Returns:
+            ImageStoreSettings: 图片存储配置对象
+        """
+        return self._config.image_store
+
+    @property
+    def blob_store(self) -> BlobStoreSettings:
+        """
+        获取大型观察结果存储配置
+
+        Returns:
+            BlobStoreSettings: 存储配置对象
+        """
+        return self._config.blob_store
+
+    @property
+    def agent_pool(self) -> AgentPoolSettings:
+        """
+        获取智能体池配置
+
+        Returns:
+            AgentPoolSettings: 智能体池配置对象
+        """
+        return self._config.agent_pool
+
+    @property
+    def tracing(self) -> TracingSettings:
+        """
+        获取追踪配置
+
+        Returns:
+            TracingSettings: 追踪配置对象
+        """
+        return self._config.tracing
+
     @property
     def sandbox(self) -> SandboxSettings:
         """
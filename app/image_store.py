@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片存储模块
+
+浏览器截图、视觉工具返回的图片通常有几百 KB 到数 MB 的 base64 数据。
+本模块把它们从消息中移出，集中存放在进程级的图片存储中：
+- 内容寻址：按 base64 数据的 SHA-256 哈希去重，消息中只保存哈希引用
+- 延迟缩放：入库时只计算哈希；图片第一次被内联到请求中之前，在线程池中缩放一次，
+  长边和短边都不超过服务端实际处理的尺寸（服务端本来也会缩小，超出部分只会增加请求体积），
+  见 downscale。需要安装 Pillow，未安装时原样保存
+- 有界容量：超过 max_entries 时淘汰最久未使用的图片；仍被消息引用的图片被固定，
+  不会被淘汰（消息对象被回收时自动解除固定，见 Message._store_image）
+
+格式化请求时只内联最近的 keep_last 张图片，更早的图片替换为简短的占位文本，
+见 LLM.format_messages。配置来自 config.toml 的 [image_store]。
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from app.config import ImageStoreSettings, config
+from app.logger import logger
+
+
+class ImageStore:
+    """
+    内容寻址的图片存储
+
+    使用示例：
+        store = ImageStore(config.image_store)
+        ref = store.put(screenshot_base64)
+        data = store.get(ref)
+    """
+
+    def __init__(self, settings: ImageStoreSettings):
+        """
+        初始化图片存储
+
+        Args:
+            settings: 图片存储配置
+        """
+        self.settings = settings
+        self._images: "OrderedDict[str, str]" = OrderedDict()
+        # 引用计数：被消息引用的图片不会被淘汰
+        self._pins: Dict[str, int] = {}
+        # 已经缩放过的图片
+        self._scaled: Set[str] = set()
+        # 已经警告过缺失的引用（每个引用只警告一次）
+        self._missing: Set[str] = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stored = 0
+        self.bytes_in = 0
+        self.bytes_stored = 0
+
+    @staticmethod
+    def make_ref(base64_image: str) -> str:
+        """
+        计算图片的引用（base64 数据的 SHA-256 哈希）
+
+        Args:
+            base64_image: base64 编码的图片
+
+        Returns:
+            str: 十六进制哈希字符串
+        """
+        return hashlib.sha256(base64_image.encode("ascii", "ignore")).hexdigest()
+
+    def put(self, base64_image: str, pin: bool = False) -> str:
+        """
+        存入图片
+
+        只计算哈希并保存原始数据，不做缩放（可以在事件循环中直接调用）；
+        相同的图片只存储一次。
+
+        Args:
+            base64_image: base64 编码的图片
+            pin: 是否同时固定该图片（之后需要调用 unpin 解除）
+
+        Returns:
+            str: 图片引用
+        """
+        ref = self.make_ref(base64_image)
+        with self._lock:
+            if ref in self._images:
+                self._images.move_to_end(ref)
+                self.hits += 1
+            else:
+                self._images[ref] = base64_image
+                self.stored += 1
+                self.bytes_in += len(base64_image)
+                self.bytes_stored += len(base64_image)
+            if pin:
+                self._pins[ref] = self._pins.get(ref, 0) + 1
+            self._missing.discard(ref)
+            self._evict()
+        return ref
+
+    def pin(self, ref: str) -> None:
+        """
+        固定图片，使其不会被淘汰（引用计数加一）
+
+        Args:
+            ref: 图片引用
+        """
+        with self._lock:
+            self._pins[ref] = self._pins.get(ref, 0) + 1
+
+    def unpin(self, ref: str) -> None:
+        """
+        解除一次固定（引用计数减一），计数归零后图片可以被淘汰
+
+        Args:
+            ref: 图片引用
+        """
+        with self._lock:
+            count = self._pins.get(ref, 0) - 1
+            if count > 0:
+                self._pins[ref] = count
+            else:
+                self._pins.pop(ref, None)
+            self._evict()
+
+    def _evict(self) -> None:
+        """超出容量时按最久未使用的顺序淘汰未被固定的图片（调用方需持有锁）"""
+        excess = len(self._images) - self.settings.max_entries
+        if excess <= 0:
+            return
+        for ref in [ref for ref in self._images if ref not in self._pins][:excess]:
+            del self._images[ref]
+            self._scaled.discard(ref)
+
+    async def downscale(self, refs: Iterable[str]) -> None:
+        """
+        在线程池中缩放尚未缩放的图片（格式化请求前对将要内联的图片调用）
+
+        Args:
+            refs: 图片引用
+        """
+        for ref in refs:
+            with self._lock:
+                image = self._images.get(ref)
+                if image is None or ref in self._scaled:
+                    continue
+            # 解码、缩放和重新编码都在线程池中进行，不阻塞事件循环
+            stored = await asyncio.to_thread(self._downscale, image)
+            with self._lock:
+                if self._images.get(ref) is image:
+                    self._images[ref] = stored
+                    self._scaled.add(ref)
+                    self.bytes_stored += len(stored) - len(image)
+
+    def get(self, ref: str) -> Optional[str]:
+        """
+        读取图片
+
+        Args:
+            ref: 图片引用
+
+        Returns:
+            Optional[str]: base64 编码的图片，已被淘汰或不存在时返回 None
+        """
+        with self._lock:
+            image = self._images.get(ref)
+            if image is not None:
+                self._images.move_to_end(ref)
+                return image
+            if ref in self._missing:
+                return None
+            self._missing.add(ref)
+        # 通常是从其他进程的检查点恢复的消息（图片存储只在进程内存中）
+        logger.warning(f"图片 {ref[:12]} 不在图片存储中，以占位文本代替")
+        return None
+
+    def _downscale(self, base64_image: str) -> str:
+        """
+        将图片缩放到配置的尺寸以内
+
+        无需缩放、未安装 Pillow 或数据无法解码时返回原始数据。
+
+        Args:
+            base64_image: base64 编码的图片
+
+        Returns:
+            str: 缩放后重新编码为 JPEG 的 base64 数据
+        """
+        try:
+            from PIL import Image
+        except ImportError:
+            return base64_image
+
+        try:
+            image = Image.open(io.BytesIO(base64.b64decode(base64_image)))
+            width, height = image.size
+            scale = min(
+                1.0,
+                self.settings.max_long_side / max(width, height),
+                self.settings.max_short_side / min(width, height),
+            )
+            if scale >= 1.0:
+                return base64_image
+
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            resized = image.convert("RGB").resize(size, Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, format="JPEG", quality=self.settings.jpeg_quality)
+            return base64.b64encode(buffer.getvalue()).decode("ascii")
+        except (OSError, ValueError, binascii.Error) as e:
+            logger.warning(f"图片缩放失败，按原样保存: {e}")
+            return base64_image
+
+    @staticmethod
+    def placeholder(ref: Optional[str]) -> str:
+        """
+        生成替代较早图片的占位文本
+
+        Args:
+            ref: 图片引用
+
+        Returns:
+            str: 占位文本
+        """
+        return f"[image {(ref or '')[:12]} omitted: only the most recent images are included]"
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取存储统计信息
+
+        Returns:
+            Dict[str, Any]: 包含 images、pinned、hits、stored、bytes_in、bytes_stored 的字典
+        """
+        with self._lock:
+            return {
+                "images": len(self._images),
+                "pinned": len(self._pins),
+                "hits": self.hits,
+                "stored": self.stored,
+                "bytes_in": self.bytes_in,
+                "bytes_stored": self.bytes_stored,
+            }
+
+
+_image_store: Optional[ImageStore] = None
+
+
+def get_image_store() -> Optional[ImageStore]:
+    """
+    获取进程级的图片存储
+
+    Returns:
+        Optional[ImageStore]: 图片存储，[image_store] 未启用时返回 None
+    """
+    global _image_store
+    settings = config.image_store
+    if settings is None or not settings.enabled:
+        return None
+    if _image_store is None:
+        _image_store = ImageStore(settings)
+    return _image_store
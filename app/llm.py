@@ -16,8 +16,23 @@ LLM（大语言模型）接口模块
 - LLM: LLM 客户端，封装了与各种 LLM API 的交互
 """
 
+import asyncio
+import json
 import math
-from typing import Dict, List, Optional, Union
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import tiktoken
 from openai import (
@@ -25,28 +40,38 @@ from openai import (
     AsyncAzureOpenAI,
     AsyncOpenAI,
     AuthenticationError,
+    BadRequestError,
     OpenAIError,
     RateLimitError,
 )
-from openai.types.chat import ChatCompletion, ChatCompletionMessage
-from tenacity import (
-    retry,
-    retry_if_exception_type,
-    stop_after_attempt,
-    wait_random_exponential,
+from openai.types.chat import (
+    ChatCompletion,
+    ChatCompletionChunk,
+    ChatCompletionMessage,
+    ChatCompletionMessageToolCall,
 )
+from pydantic import BaseModel, Field
 
 from app.bedrock import BedrockClient
 from app.config import LLMSettings, config
 from app.exceptions import TokenLimitExceeded
+from app.image_store import ImageStore, get_image_store
+from app.llm_cache import ResponseCache, get_response_cache
+from app.llm_limiter import RateLimiter, get_rate_limiter
+from app.llm_retry import llm_retry
+from app.llm_telemetry import current_call, track_llm_call
+from app.llm_transport import get_http_client
 from app.logger import logger
 from app.schema import (
     ROLE_VALUES,
     TOOL_CHOICE_TYPE,
     TOOL_CHOICE_VALUES,
+    Memory,
     Message,
     ToolChoice,
 )
+from app.session import TokenUsage, current_session
+from app.stream_sink import StreamSink, current_stream_sink, get_stream_sink
 
 
 # 推理模型列表：这些模型使用特殊的参数（如 max_completion_tokens）
@@ -244,6 +269,39 @@ class TokenCounter:
                 token_count += self.count_text(function.get("arguments", ""))
         return token_count
 
+    def count_message(self, message: dict) -> int:
+        """
+        计算单条消息的 token 数量
+
+        包括每条消息的基础 token，以及角色、内容、工具调用、name、tool_call_id
+        等字段的 token。
+
+        Args:
+            message: 已格式化的消息字典
+
+        Returns:
+            int: 该消息的 token 数量
+        """
+        # 每条消息的基础 token
+        tokens = self.BASE_MESSAGE_TOKENS
+
+        # 添加角色 token
+        tokens += self.count_text(message.get("role", ""))
+
+        # 添加内容 token
+        if "content" in message:
+            tokens += self.count_content(message["content"])
+
+        # 添加工具调用 token
+        if "tool_calls" in message:
+            tokens += self.count_tool_calls(message["tool_calls"])
+
+        # 添加 name 和 tool_call_id token（用于工具消息）
+        tokens += self.count_text(message.get("name", ""))
+        tokens += self.count_text(message.get("tool_call_id", ""))
+
+        return tokens
+
     def count_message_tokens(self, messages: List[dict]) -> int:
         """
         计算消息列表的总 token 数量
@@ -264,32 +322,244 @@ class TokenCounter:
             messages = [{"role": "user", "content": "Hello"}]
             tokens = counter.count_message_tokens(messages)
         """
-        # 消息列表的基础格式 token
-        total_tokens = self.FORMAT_TOKENS
+        # 消息列表的基础格式 token + 每条消息的 token
+        return self.FORMAT_TOKENS + sum(
+            self.count_message(message) for message in messages
+        )
 
-        # 遍历每条消息
-        for message in messages:
-            # 每条消息的基础 token
-            tokens = self.BASE_MESSAGE_TOKENS
 
-            # 添加角色 token
-            tokens += self.count_text(message.get("role", ""))
+class ToolCallStream:
+    """
+    流式工具调用组装器
+
+    消费 chat.completions 的流式响应，按 index 增量拼接 tool_calls 的增量片段，
+    每当一个工具调用的参数 JSON 完整时立即产出该调用，调用方可以在模型
+    继续输出后续工具调用的同时开始执行前面的工具。
+
+    判断工具调用完整的条件：
+    - 出现了下一个 index 的工具调用增量
+    - 或者当前参数已是完整的 JSON（以 "}" 结尾且可以解析）
+    - 或者流结束
+
+    迭代结束后，message 属性为组装好的完整 ChatCompletionMessage。
+
+    使用示例：
+        stream = await llm.ask_tool_stream(messages, tools=tools)
+        async for tool_call in stream:
+            ...  # 立即开始执行 tool_call
+        message = stream.message
+    """
+
+    def __init__(
+        self,
+        chunks: Optional[AsyncIterator[ChatCompletionChunk]] = None,
+        on_complete: Optional[Callable[["ToolCallStream"], Awaitable[None]]] = None,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        """
+        初始化组装器
+
+        Args:
+            chunks: 流式响应的 chunk 异步迭代器，None 表示由 from_message 构造
+            on_complete: 流结束、message 组装完成后调用的回调（如更新 token 计数）
+            on_close: 流读取结束（包括出错、提前退出、调用 close() 或未读取就被丢弃）时
+                调用的同步回调（如释放限流槽位）
+        """
+        self._chunks = chunks
+        self._on_complete = on_complete
+        self._on_close = on_close
+        self._started_at = time.perf_counter()
+        self._content: List[str] = []
+        # index -> {"id", "name", "arguments": List[str]}
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._completed: Dict[int, ChatCompletionMessageToolCall] = {}
+        self.message: Optional[ChatCompletionMessage] = None
+        self.usage: Optional[Any] = None
+        self.time_to_first_token: Optional[float] = None
+        self.total_time: Optional[float] = None
+
+    @classmethod
+    def from_message(cls, message: ChatCompletionMessage) -> "ToolCallStream":
+        """
+        从已完成的消息构造组装器（用于缓存命中或不支持流式的后端）
+
+        Args:
+            message: 完整的响应消息
+
+        Returns:
+            ToolCallStream: 迭代时依次产出消息中的工具调用
+        """
+        stream = cls()
+        stream.message = message
+        stream.time_to_first_token = 0.0
+        stream.total_time = 0.0
+        return stream
+
+    def _release(self) -> None:
+        """执行 on_close 回调（只执行一次）"""
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+
+    async def close(self) -> None:
+        """
+        不再读取时关闭流：执行 on_close（如释放限流槽位）并关闭底层响应
 
-            # 添加内容 token
-            if "content" in message:
-                tokens += self.count_content(message["content"])
+        读完或迭代出错时会自动关闭，可以重复调用。
+        """
+        self._release()
+        # openai 的 AsyncStream 提供 close()，普通异步生成器提供 aclose()
+        close = getattr(self._chunks, "close", None) or getattr(
+            self._chunks, "aclose", None
+        )
+        if close is not None:
+            await close()
+
+    def __del__(self) -> None:
+        # 既没有迭代也没有关闭就被丢弃的流同样归还限流槽位（on_close 是同步回调）
+        self._release()
+
+    def _finalize(self, index: int) -> Optional[ChatCompletionMessageToolCall]:
+        """将指定 index 的工具调用标记为完成并返回"""
+        pending = self._pending.pop(index, None)
+        if pending is None:
+            return None
+        tool_call = ChatCompletionMessageToolCall(
+            id=pending["id"] or f"call_{index}",
+            type="function",
+            function={
+                "name": pending["name"],
+                "arguments": "".join(pending["arguments"]),
+            },
+        )
+        self._completed[index] = tool_call
+        return tool_call
 
-            # 添加工具调用 token
-            if "tool_calls" in message:
-                tokens += self.count_tool_calls(message["tool_calls"])
+    @staticmethod
+    def _arguments_complete(arguments: List[str]) -> bool:
+        """检查参数片段拼接后是否已是完整的 JSON 对象"""
+        if not arguments or not arguments[-1].rstrip().endswith("}"):
+            return False
+        try:
+            json.loads("".join(arguments))
+        except json.JSONDecodeError:
+            return False
+        return True
 
-            # 添加 name 和 tool_call_id token（用于工具消息）
-            tokens += self.count_text(message.get("name", ""))
-            tokens += self.count_text(message.get("tool_call_id", ""))
+    async def __aiter__(self) -> AsyncIterator[ChatCompletionMessageToolCall]:
+        """
+        异步迭代：按完成顺序产出工具调用
 
-            total_tokens += tokens
+        Yields:
+            ChatCompletionMessageToolCall: 参数已完整的工具调用
+        """
+        if self._chunks is None:
+            for tool_call in (self.message.tool_calls if self.message else None) or []:
+                yield tool_call
+            return
 
-        return total_tokens
+        try:
+            async for chunk in self._chunks:
+                if getattr(chunk, "usage", None):
+                    self.usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if self.time_to_first_token is None and (
+                    delta.content or delta.tool_calls
+                ):
+                    self.time_to_first_token = time.perf_counter() - self._started_at
+                if delta.content:
+                    self._content.append(delta.content)
+                for tool_delta in delta.tool_calls or []:
+                    index = tool_delta.index
+                    # 新 index 出现，之前未完成的工具调用都已完整
+                    for earlier in sorted(i for i in self._pending if i < index):
+                        completed = self._finalize(earlier)
+                        if completed:
+                            yield completed
+                    if index in self._completed:
+                        continue
+                    pending = self._pending.setdefault(
+                        index, {"id": None, "name": "", "arguments": []}
+                    )
+                    if tool_delta.id:
+                        pending["id"] = tool_delta.id
+                    if tool_delta.function:
+                        if tool_delta.function.name:
+                            pending["name"] += tool_delta.function.name
+                        if tool_delta.function.arguments:
+                            pending["arguments"].append(tool_delta.function.arguments)
+                    if pending["name"] and self._arguments_complete(
+                        pending["arguments"]
+                    ):
+                        completed = self._finalize(index)
+                        if completed:
+                            yield completed
+
+            # 流结束：剩余的工具调用全部完成
+            for index in sorted(self._pending):
+                completed = self._finalize(index)
+                if completed:
+                    yield completed
+        finally:
+            # 流已读完或被提前关闭
+            self._release()
+
+        self.total_time = time.perf_counter() - self._started_at
+        tool_calls = [self._completed[i] for i in sorted(self._completed)]
+        self.message = ChatCompletionMessage(
+            role="assistant",
+            content="".join(self._content) or None,
+            tool_calls=tool_calls or None,
+        )
+        if self._on_complete is not None:
+            await self._on_complete(self)
+
+
+# 当前批量调用的 token 用量累加器（由 ask_many / ask_tool_many 设置，
+# 并发子任务继承同一个字典，因此能准确统计整批用量而不受其他调用影响）
+_batch_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar(
+    "llm_batch_usage", default=None
+)
+
+
+def _record_batch_usage(input_tokens: int, completion_tokens: int) -> None:
+    """将 token 用量累加到当前批量调用（不在批量调用中时忽略）"""
+    usage = _batch_usage.get()
+    if usage is not None:
+        usage["input_tokens"] += input_tokens
+        usage["completion_tokens"] += completion_tokens
+
+
+class BatchResult(BaseModel):
+    """
+    批量调用结果
+
+    results 与 errors 按请求顺序一一对应：成功的请求 results[i] 为返回值、
+    errors[i] 为 None；失败的请求 results[i] 为 None、errors[i] 为异常对象。
+    """
+
+    results: List[Any] = Field(default_factory=list, description="按请求顺序排列的返回值")
+    errors: List[Optional[BaseException]] = Field(
+        default_factory=list, description="按请求顺序排列的异常（成功为 None）"
+    )
+    input_tokens: int = Field(0, description="整批请求的输入 token 总数")
+    completion_tokens: int = Field(0, description="整批请求的输出 token 总数")
+    elapsed: float = Field(0.0, description="整批请求的耗时（秒）")
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def ok(self) -> bool:
+        """是否所有请求都成功"""
+        return all(error is None for error in self.errors)
+
+    @property
+    def failed(self) -> int:
+        """失败的请求数量"""
+        return sum(1 for error in self.errors if error is not None)
 
 
 class LLM:
@@ -306,12 +576,15 @@ class LLM:
 
     设计模式：
     - 单例模式：每个配置名称只有一个实例，避免重复创建客户端
-    - 重试机制：使用 tenacity 库自动重试失败的请求
+    - 会话隔离：token 用量和 max_input_tokens 限额按当前会话隔离（见 app/session.py），
+      客户端、tokenizer 和限流器由所有会话共享
+    - 重试机制：按错误类型重试瞬时错误（见 app/llm_retry.py）
 
     主要方法：
     - ask(): 发送文本消息，获取 LLM 回复
     - ask_with_images(): 发送带图片的消息
     - ask_tool(): 发送消息并支持工具调用
+    - ask_many() / ask_tool_many(): 并发发送多个独立请求
     """
 
     # 单例字典：存储不同配置名称的 LLM 实例
@@ -346,6 +619,7 @@ class LLM:
         if not hasattr(self, "client"):  # Only initialize if not already initialized
             llm_config = llm_config or config.llm
             llm_config = llm_config.get(config_name, llm_config["default"])
+            self.config_name = config_name
             self.model = llm_config.model
             self.max_tokens = llm_config.max_tokens
             self.temperature = llm_config.temperature
@@ -353,11 +627,14 @@ class LLM:
             self.api_key = llm_config.api_key
             self.api_version = llm_config.api_version
             self.base_url = llm_config.base_url
+            self.prompt_cache_control = llm_config.prompt_cache_control
+            # 流式响应是否请求服务端在最后一个 chunk 中返回 usage（Bedrock 不支持）
+            self.stream_usage = llm_config.stream_usage and self.api_type != "aws"
 
             # Add token counting related attributes
-            self.total_input_tokens = 0
-            self.total_completion_tokens = 0
-            self.max_input_tokens = (
+            # （在会话中时改用会话自己的计数和限额，见 total_input_tokens 等属性）
+            self._process_usage = TokenUsage()
+            self._max_input_tokens = (
                 llm_config.max_input_tokens
                 if hasattr(llm_config, "max_input_tokens")
                 else None
@@ -370,19 +647,148 @@ class LLM:
                 # If the model is not in tiktoken's presets, use cl100k_base as default
                 self.tokenizer = tiktoken.get_encoding("cl100k_base")
 
+            # OpenAI / Azure 客户端使用按 API 源共享的 HTTP 连接池，复用已建立的连接
             if self.api_type == "azure":
                 self.client = AsyncAzureOpenAI(
                     base_url=self.base_url,
                     api_key=self.api_key,
                     api_version=self.api_version,
+                    http_client=get_http_client(self.base_url),
                 )
             elif self.api_type == "aws":
                 self.client = BedrockClient()
             else:
-                self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+                self.client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    http_client=get_http_client(self.base_url),
+                )
 
             self.token_counter = TokenCounter(self.tokenizer)
 
+            # 本地响应缓存（默认关闭，由 [llm_cache] 配置开启，所有实例共享）
+            self.response_cache: Optional[ResponseCache] = get_response_cache(
+                config.llm_cache
+            )
+
+            # 本地限流（RPM / TPM / 并发数，按配置名称共享，未配置时为 None）
+            self.rate_limiter: Optional[RateLimiter] = get_rate_limiter(
+                config_name, llm_config
+            )
+
+    def _usage(self) -> TokenUsage:
+        """当前会话中本配置的用量计数，不在会话中时为进程级计数"""
+        session = current_session()
+        if session is None:
+            return self._process_usage
+        return session.usage_for(self.config_name)
+
+    @property
+    def total_input_tokens(self) -> int:
+        """累计输入 token 数（按当前会话隔离）"""
+        return self._usage().input_tokens
+
+    @total_input_tokens.setter
+    def total_input_tokens(self, value: int) -> None:
+        self._usage().input_tokens = value
+
+    @property
+    def total_completion_tokens(self) -> int:
+        """累计输出 token 数（按当前会话隔离）"""
+        return self._usage().completion_tokens
+
+    @total_completion_tokens.setter
+    def total_completion_tokens(self, value: int) -> None:
+        self._usage().completion_tokens = value
+
+    @property
+    def max_input_tokens(self) -> Optional[int]:
+        """累计输入 token 上限，当前会话设置了上限时以会话为准"""
+        session = current_session()
+        if session is not None and session.max_input_tokens is not None:
+            return session.max_input_tokens
+        return self._max_input_tokens
+
+    @max_input_tokens.setter
+    def max_input_tokens(self, value: Optional[int]) -> None:
+        self._max_input_tokens = value
+
+    @asynccontextmanager
+    async def _limit(self, input_tokens: int) -> AsyncIterator[None]:
+        """
+        获取本次请求的限流上下文（排队时间计入当前调用的遥测样本）
+
+        Args:
+            input_tokens: 输入 token 估算值（计入每分钟 token 限额）
+
+        Yields:
+            None: 未配置限流时直接进入
+        """
+        if self.rate_limiter is None:
+            yield
+            return
+        start = time.perf_counter()
+        async with self.rate_limiter.limit(input_tokens):
+            call = current_call()
+            if call is not None:
+                call.add_queue_wait(time.perf_counter() - start)
+            yield
+
+    async def _create_stream(self, params: Dict[str, Any]) -> Any:
+        """
+        发起流式 chat.completions 请求
+
+        支持时附带 stream_options.include_usage，让服务端在最后一个 chunk 中返回
+        token 用量；服务端拒绝该参数时记录警告，此后该实例不再请求。
+
+        Args:
+            params: 请求参数（不含 stream）
+
+        Returns:
+            流式响应的异步迭代器
+        """
+        if self.stream_usage:
+            try:
+                return await self.client.chat.completions.create(
+                    **params, stream=True, stream_options={"include_usage": True}
+                )
+            except BadRequestError as e:
+                if "stream_options" not in str(e):
+                    raise
+                logger.warning(
+                    "Provider rejected stream_options; falling back to local completion token counting"
+                )
+                self.stream_usage = False
+        return await self.client.chat.completions.create(**params, stream=True)
+
+    def _streamed_usage(
+        self,
+        usage: Optional[Any],
+        input_tokens: int,
+        counted_tokens: Optional[int],
+        completion_text: str,
+    ) -> Tuple[int, int]:
+        """
+        确定流式响应的 token 用量
+
+        优先使用服务端返回的 usage；否则使用逐 chunk 累加的计数；
+        都没有时才对完整回复编码一次。
+
+        Args:
+            usage: 服务端在最后一个 chunk 中返回的 usage
+            input_tokens: 本地估算的输入 token 数
+            counted_tokens: 逐 chunk 累加的输出 token 数（未累加时为 None）
+            completion_text: 完整的回复文本
+
+        Returns:
+            Tuple[int, int]: (输入 token 数, 输出 token 数)
+        """
+        if usage is not None:
+            return usage.prompt_tokens, usage.completion_tokens
+        if counted_tokens is not None:
+            return input_tokens, counted_tokens
+        return input_tokens, self.count_tokens(completion_text)
+
     def count_tokens(self, text: str) -> int:
         """
         计算文本的 token 数量
@@ -423,6 +829,163 @@ class LLM:
         """
         return self.token_counter.count_message_tokens(messages)
 
+    def count_message_cached(
+        self, message: Message, supports_images: bool = False
+    ) -> int:
+        """
+        计算单条 Message 的 token 数量（带缓存）
+
+        结果缓存在 Message 上（键为 tokenizer 名称 + 是否支持图片），
+        消息内容不变时不会重复调用 tokenizer 编码。
+
+        Args:
+            message: 消息对象
+            supports_images: 目标模型是否支持图片（影响图片 token 的计算）
+
+        Returns:
+            int: 该消息的 token 数量，会被 format_messages 丢弃的消息计为 0
+        """
+        key = (self.tokenizer.name, supports_images)
+        tokens = message.get_cached_tokens(key)
+        if tokens is None:
+            formatted = self.format_messages([message], supports_images)
+            tokens = self.token_counter.count_message(formatted[0]) if formatted else 0
+            message.set_cached_tokens(key, tokens)
+        return tokens
+
+    def count_tools_cached(self, tools: Optional[List[dict]]) -> int:
+        """
+        计算工具定义的 token 数量（带缓存）
+
+        ToolCollection.to_params() 返回的 ToolParamList 会缓存计数结果，
+        工具不变时每一步都不必重新序列化和编码全部工具定义。
+        普通列表则每次重新计算。
+
+        Args:
+            tools: 工具参数列表
+
+        Returns:
+            int: 工具定义的 token 数量
+        """
+        if not tools:
+            return 0
+        get_cached = getattr(tools, "get_cached_tokens", None)
+        key = self.tokenizer.name
+        if get_cached is not None:
+            tokens = get_cached(key)
+            if tokens is not None:
+                return tokens
+        tokens = sum(self.count_tokens(str(tool)) for tool in tools)
+        if get_cached is not None:
+            tools.set_cached_tokens(key, tokens)
+        return tokens
+
+    @staticmethod
+    def apply_cache_control(
+        messages: List[dict], tools: Optional[List[dict]] = None
+    ) -> Tuple[List[dict], Optional[List[dict]]]:
+        """
+        为请求中稳定的前缀添加提示词缓存标记（cache_control）
+
+        标记打在开头连续的最后一条系统消息和最后一个工具定义上，
+        支持提示词缓存的服务端可以跳过这部分前缀的重复处理。
+        原消息和工具列表不会被修改（它们可能被缓存复用），返回的是副本。
+
+        Args:
+            messages: 已格式化的消息列表
+            tools: 工具参数列表
+
+        Returns:
+            Tuple[List[dict], Optional[List[dict]]]: 添加标记后的消息列表和工具列表
+        """
+        marker = {"type": "ephemeral"}
+
+        last_system = None
+        for index, message in enumerate(messages):
+            if message.get("role") != "system":
+                break
+            last_system = index
+        if last_system is not None:
+            message = dict(messages[last_system])
+            content = message.get("content")
+            if isinstance(content, str):
+                message["content"] = [
+                    {"type": "text", "text": content, "cache_control": marker}
+                ]
+            elif isinstance(content, list) and content:
+                message["content"] = content[:-1] + [
+                    {**content[-1], "cache_control": marker}
+                ]
+            messages = messages[:last_system] + [message] + messages[last_system + 1 :]
+
+        if tools:
+            tools = list(tools[:-1]) + [{**tools[-1], "cache_control": marker}]
+        return messages, tools
+
+    def estimate_input_tokens(
+        self,
+        messages: Union[Memory, List[Union[dict, Message]]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        supports_images: bool = False,
+    ) -> int:
+        """
+        估算一次请求的输入 token 数量
+
+        与先格式化再调用 count_message_tokens 的结果一致，但：
+        - Message 对象的 token 数按消息缓存，只有新消息才会被编码
+        - 传入 Memory 时复用其累计总数，每步只计算新增的消息
+
+        Args:
+            messages: 对话消息列表，或直接传入 Memory
+            system_msgs: 可选的系统消息
+            supports_images: 目标模型是否支持图片
+
+        Returns:
+            int: 预计的输入 token 数量
+        """
+
+        def count(message: Union[dict, Message]) -> int:
+            if isinstance(message, Message):
+                return self.count_message_cached(message, supports_images)
+            # 字典消息无法缓存，复制一份再格式化，避免修改调用方的数据
+            formatted = self.format_messages([dict(message)], supports_images)
+            return self.token_counter.count_message(formatted[0]) if formatted else 0
+
+        total = TokenCounter.FORMAT_TOKENS
+        total += sum(count(message) for message in system_msgs or [])
+        if isinstance(messages, Memory):
+            total += messages.count_tokens(
+                count, cache_key=(self.tokenizer.name, supports_images)
+            )
+        else:
+            total += sum(count(message) for message in messages)
+        return total
+
+    def estimate_tool_request_tokens(
+        self,
+        messages: Union[Memory, List[Union[dict, Message]]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        tools: Optional[List[dict]] = None,
+    ) -> int:
+        """
+        估算一次 ask_tool 请求的输入 token 数量
+
+        与 ask_tool 的计数方式完全一致（相同的 supports_images，包含工具定义），
+        因此传入的 Memory 在两处共用同一个增量计数，不会来回重新计数。
+
+        Args:
+            messages: 对话消息列表，或直接传入 Memory
+            system_msgs: 可选的系统消息
+            tools: 请求中附带的工具定义
+
+        Returns:
+            int: 预计的输入 token 数量
+        """
+        supports_images = self.model in MULTIMODAL_MODELS
+        return self.estimate_input_tokens(
+            messages, system_msgs, supports_images
+        ) + self.count_tools_cached(tools)
+
     def update_token_count(self, input_tokens: int, completion_tokens: int = 0) -> None:
         """
         更新 token 计数
@@ -441,6 +1004,10 @@ class LLM:
         self.total_input_tokens += input_tokens
         # 累加输出 token
         self.total_completion_tokens += completion_tokens
+        _record_batch_usage(input_tokens, completion_tokens)
+        call = current_call()
+        if call is not None:
+            call.set_tokens(input_tokens, completion_tokens)
         # 记录日志，显示本次和累计的 token 使用情况
         logger.info(
             f"Token usage: Input={input_tokens}, Completion={completion_tokens}, "
@@ -497,6 +1064,26 @@ class LLM:
 
         return "Token 限制已超出"
 
+    def _cache_key(self, method: str, params: Dict[str, Any]) -> Optional[str]:
+        """
+        生成响应缓存键
+
+        只使用影响模型输出的参数（模型、消息、工具、tool_choice、温度、最大 token 等），
+        忽略 timeout、stream 等传输层参数。
+
+        Args:
+            method: 调用方法名（ask / ask_tool），不同方法的缓存互不共享
+            params: 请求参数
+
+        Returns:
+            Optional[str]: 缓存键，未启用缓存时返回 None
+        """
+        if self.response_cache is None:
+            return None
+        payload = {k: v for k, v in params.items() if k not in ("timeout", "stream")}
+        payload["method"] = method
+        return ResponseCache.make_key(payload)
+
     @staticmethod
     def format_messages(
         messages: List[Union[dict, Message]], supports_images: bool = False
@@ -511,6 +1098,10 @@ class LLM:
             messages: 消息列表，可以是 Message 对象或字典
             supports_images: 标志，表示目标模型是否支持图片输入
 
+        Message 对象的格式化结果缓存在消息上（消息被修改时失效），
+        每一步只有新追加的消息需要真正转换。返回的字典可能被之后的请求复用，
+        调用方不应修改它们。
+
         Returns:
             List[dict]: 格式化后的消息列表，符合 OpenAI 格式
 
@@ -527,60 +1118,50 @@ class LLM:
             formatted = LLM.format_messages(msgs)
         """
         formatted_messages = []
+        store = get_image_store()
+
+        # 只内联最近 keep_last 张图片，更早的图片替换为占位文本
+        inline_from = 0
+        keep_last = store.settings.keep_last if store is not None else None
+        if supports_images and keep_last is not None:
+            image_indices = [
+                index
+                for index, message in enumerate(messages)
+                if LLM._has_image(message)
+            ]
+            if len(image_indices) > keep_last:
+                inline_from = (
+                    image_indices[-keep_last] if keep_last > 0 else len(messages)
+                )
 
-        for message in messages:
-            # Convert Message objects to dictionaries
+        for index, message in enumerate(messages):
             if isinstance(message, Message):
-                message = message.to_dict()
-
-            if isinstance(message, dict):
+                # 格式化结果缓存在 Message 上，历史消息每一步只需查一次缓存
+                inline = supports_images and index >= inline_from
+                key = (supports_images, inline and LLM._has_image(message))
+                formatted = message.get_cached_format(key)
+                if formatted is None:
+                    formatted = LLM._format_message(
+                        message.to_dict(), supports_images, inline, store
+                    )
+                    # 内联了图片的结果不缓存，避免在消息上长期持有图片数据
+                    if not key[1]:
+                        message.set_cached_format(key, formatted)
+            elif isinstance(message, dict):
                 # If message is a dict, ensure it has required fields
                 if "role" not in message:
                     raise ValueError("Message dict must contain 'role' field")
-
-                # Process base64 images if present and model supports images
-                if supports_images and message.get("base64_image"):
-                    # Initialize or convert content to appropriate format
-                    if not message.get("content"):
-                        message["content"] = []
-                    elif isinstance(message["content"], str):
-                        message["content"] = [
-                            {"type": "text", "text": message["content"]}
-                        ]
-                    elif isinstance(message["content"], list):
-                        # Convert string items to proper text objects
-                        message["content"] = [
-                            (
-                                {"type": "text", "text": item}
-                                if isinstance(item, str)
-                                else item
-                            )
-                            for item in message["content"]
-                        ]
-
-                    # Add the image to content
-                    message["content"].append(
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{message['base64_image']}"
-                            },
-                        }
-                    )
-
-                    # Remove the base64_image field
-                    del message["base64_image"]
-                # If model doesn't support images but message has base64_image, handle gracefully
-                elif not supports_images and message.get("base64_image"):
-                    # Just remove the base64_image field and keep the text content
-                    del message["base64_image"]
-
-                if "content" in message or "tool_calls" in message:
-                    formatted_messages.append(message)
-                # else: do not include the message
+                inline = supports_images and index >= inline_from
+                formatted = LLM._format_message(
+                    dict(message), supports_images, inline, store
+                )
             else:
                 raise TypeError(f"Unsupported message type: {type(message)}")
 
+            if "content" in formatted or "tool_calls" in formatted:
+                formatted_messages.append(formatted)
+            # else: do not include the message
+
         # Validate all messages have required fields
         for msg in formatted_messages:
             if msg["role"] not in ROLE_VALUES:
@@ -588,19 +1169,158 @@ class LLM:
 
         return formatted_messages
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-        retry=retry_if_exception_type(
-            (OpenAIError, Exception, ValueError)
-        ),  # Don't retry TokenLimitExceeded
-    )
+    @staticmethod
+    async def _downscale_images(
+        messages: Union[Memory, List[Union[dict, Message]]], supports_images: bool
+    ) -> None:
+        """
+        在线程池中缩放本次请求将要内联的图片（只处理最近 keep_last 张，每张只缩放一次）
+
+        Args:
+            messages: 消息列表或 Memory
+            supports_images: 目标模型是否支持图片
+        """
+        store = get_image_store()
+        if store is None or not supports_images:
+            return
+        if isinstance(messages, Memory):
+            messages = messages.messages
+        refs = []
+        for message in messages:
+            if isinstance(message, Message):
+                ref = message.image_ref
+            else:
+                ref = message.get("image_ref") if isinstance(message, dict) else None
+            if ref:
+                refs.append(ref)
+        keep_last = store.settings.keep_last
+        if keep_last is not None:
+            refs = refs[len(refs) - keep_last :] if keep_last > 0 else []
+        await store.downscale(refs)
+
+    @staticmethod
+    def _has_image(message: Union[dict, Message]) -> bool:
+        """判断消息是否附带图片（内联数据或图片存储引用）"""
+        if isinstance(message, Message):
+            return bool(message.base64_image or message.image_ref)
+        return isinstance(message, dict) and bool(
+            message.get("base64_image") or message.get("image_ref")
+        )
+
+    @staticmethod
+    def _format_message(
+        message: dict,
+        supports_images: bool,
+        inline: bool,
+        store: Optional[ImageStore],
+    ) -> dict:
+        """
+        格式化单条消息字典
+
+        Args:
+            message: 消息字典（会被修改，调用方需传入副本）
+            supports_images: 目标模型是否支持图片
+            inline: 是否内联图片数据，否则替换为占位文本
+            store: 图片存储
+
+        Returns:
+            dict: 格式化后的消息
+        """
+        # Resolve the image from the inline data or the image store
+        image_ref = message.pop("image_ref", None)
+        image = message.pop("base64_image", None)
+        if not image and image_ref and store is not None:
+            image = store.get(image_ref)
+
+        # Process images if present and model supports images
+        if supports_images and (image or image_ref):
+            # Initialize or convert content to appropriate format
+            if not message.get("content"):
+                message["content"] = []
+            elif isinstance(message["content"], str):
+                message["content"] = [{"type": "text", "text": message["content"]}]
+            elif isinstance(message["content"], list):
+                # Convert string items to proper text objects
+                message["content"] = [
+                    ({"type": "text", "text": item} if isinstance(item, str) else item)
+                    for item in message["content"]
+                ]
+
+            if image and inline:
+                # Add the image to content
+                message["content"].append(
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": f"data:image/jpeg;base64,{image}"},
+                    }
+                )
+            else:
+                # Older (or evicted) images become a short placeholder
+                message["content"].append(
+                    {"type": "text", "text": ImageStore.placeholder(image_ref)}
+                )
+        # If model doesn't support images, the image is dropped and the text kept
+        return message
+
+    async def _stream_text(
+        self, params: Dict[str, Any], input_tokens: int, out: StreamSink
+    ) -> Tuple[str, Any, Optional[int]]:
+        """
+        发送流式文本请求，并把每段文本增量交给接收器
+
+        并发槽位一直占用到流读取结束。本次尝试中途出错或被取消时，如果已经发送过增量，
+        先调用 out.reset() 通知接收器这些增量作废（随后可能重试）。
+
+        Args:
+            params: 请求参数（不含 stream）
+            input_tokens: 输入 token 估算值（用于限流）
+            out: 接收器
+
+        Returns:
+            Tuple[str, Any, Optional[int]]: (完整文本, 服务端返回的 usage,
+                逐块计数的输出 token 数，服务端返回 usage 时为 None)
+        """
+        if self.api_type == "aws":
+            # Bedrock 客户端自行读取事件流，把增量交给 out 并返回组装好的完整响应
+            async with self._limit(input_tokens):
+                response = await self.client.chat.completions.create(
+                    **params, stream=True, sink=out
+                )
+            return response.choices[0].message.content or "", response.usage, None
+
+        collected: List[str] = []
+        usage = None
+        counted_tokens = None if self.stream_usage else 0
+        call = current_call()
+        try:
+            async with self._limit(input_tokens):
+                response = await self._create_stream(params)
+                async for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    chunk_message = chunk.choices[0].delta.content or ""
+                    if chunk_message:
+                        call.first_token()
+                        collected.append(chunk_message)
+                        if counted_tokens is not None:
+                            counted_tokens += self.count_tokens(chunk_message)
+                        await out.send(chunk_message)
+        except BaseException:
+            if collected:
+                await out.reset()
+            raise
+        return "".join(collected), usage, counted_tokens
+
     async def ask(
         self,
-        messages: List[Union[dict, Message]],
+        messages: Union[Memory, List[Union[dict, Message]]],
         system_msgs: Optional[List[Union[dict, Message]]] = None,
         stream: bool = True,
         temperature: Optional[float] = None,
+        use_cache: bool = True,
+        sink: Optional[StreamSink] = None,
     ) -> str:
         """
         向 LLM 发送提示并获取回复
@@ -609,10 +1329,16 @@ class LLM:
         支持流式和非流式响应，自动处理 token 计数和限制检查。
 
         Args:
-            messages: 对话消息列表
+            messages: 对话消息列表，也可以直接传入 Memory 以复用其增量 token 计数
             system_msgs: 可选的系统消息，会添加到消息列表的开头
             stream: 是否使用流式响应（默认 True，可以实时看到生成过程）
             temperature: 采样温度，控制回复的随机性（None 表示使用默认值）
+            use_cache: 是否使用响应缓存（仅在 [llm_cache] 启用时生效），
+                传入 False 可跳过本次调用的缓存读写
+            sink: 接收流式文本增量的接收器，默认使用当前上下文的接收器，
+                未设置时打印到标准输出（见 app/stream_sink.py）。传入的接收器和默认的
+                PrintSink 在所有尝试结束后（包括失败和取消）关闭一次，上下文接收器
+                由设置它的一方关闭；重试前已发送的增量通过 reset() 作废
 
         Returns:
             str: LLM 生成的回复文本
@@ -627,10 +1353,41 @@ class LLM:
             messages = [Message.user_message("你好")]
             response = await llm.ask(messages, stream=True)
         """
+        out = get_stream_sink(sink) if stream else None
+        # 只关闭为本次调用创建的接收器，上下文接收器还会被后续调用复用
+        owned = sink is not None or current_stream_sink() is None
+        try:
+            return await self._ask(
+                messages, system_msgs, stream, temperature, use_cache, out
+            )
+        finally:
+            if out is not None and owned:
+                await out.close()
+
+    @llm_retry()  # 只重试 429 / 5xx / 超时 / 连接错误，受进程级重试预算约束
+    @track_llm_call("ask")  # 每次尝试记录一条遥测样本
+    async def _ask(
+        self,
+        messages: Union[Memory, List[Union[dict, Message]]],
+        system_msgs: Optional[List[Union[dict, Message]]],
+        stream: bool,
+        temperature: Optional[float],
+        use_cache: bool,
+        out: Optional[StreamSink],
+    ) -> str:
+        """ask 的一次尝试（out 为已解析的接收器，由 ask 负责关闭）"""
         try:
             # Check if the model supports images
             supports_images = self.model in MULTIMODAL_MODELS
 
+            # Calculate input token count (cached per message, incremental for Memory)
+            input_tokens = self.estimate_input_tokens(
+                messages, system_msgs, supports_images
+            )
+            if isinstance(messages, Memory):
+                messages = messages.messages
+            await self._downscale_images(messages, supports_images)
+
             # Format system and user messages with image support check
             if system_msgs:
                 system_msgs = self.format_messages(system_msgs, supports_images)
@@ -638,15 +1395,15 @@ class LLM:
             else:
                 messages = self.format_messages(messages, supports_images)
 
-            # Calculate input token count
-            input_tokens = self.count_message_tokens(messages)
-
             # Check if token limits are exceeded
             if not self.check_token_limit(input_tokens):
                 error_message = self.get_limit_error_message(input_tokens)
                 # Raise a special exception that won't be retried
                 raise TokenLimitExceeded(error_message)
 
+            if self.prompt_cache_control:
+                messages, _ = self.apply_cache_control(messages)
+
             params = {
                 "model": self.model,
                 "messages": messages,
@@ -660,11 +1417,24 @@ class LLM:
                     temperature if temperature is not None else self.temperature
                 )
 
+            # Serve from the response cache when enabled
+            cache_key = self._cache_key("ask", params) if use_cache else None
+            if cache_key:
+                cached = await self.response_cache.get(cache_key)
+                if cached is not None:
+                    logger.info("LLM 响应缓存命中 (ask)")
+                    current_call().cache_hit()
+                    cached_text = json.loads(cached)
+                    if stream:
+                        await out.send(cached_text)
+                    return cached_text
+
             if not stream:
                 # Non-streaming request
-                response = await self.client.chat.completions.create(
-                    **params, stream=False
-                )
+                async with self._limit(input_tokens):
+                    response = await self.client.chat.completions.create(
+                        **params, stream=False
+                    )
 
                 if not response.choices or not response.choices[0].message.content:
                     raise ValueError("Empty or invalid response from LLM")
@@ -674,33 +1444,29 @@ class LLM:
                     response.usage.prompt_tokens, response.usage.completion_tokens
                 )
 
+                if cache_key:
+                    await self.response_cache.set(
+                        cache_key, json.dumps(response.choices[0].message.content)
+                    )
                 return response.choices[0].message.content
 
-            # Streaming request, For streaming, update estimated token count before making the request
-            self.update_token_count(input_tokens)
-
-            response = await self.client.chat.completions.create(**params, stream=True)
-
-            collected_messages = []
-            completion_text = ""
-            async for chunk in response:
-                chunk_message = chunk.choices[0].delta.content or ""
-                collected_messages.append(chunk_message)
-                completion_text += chunk_message
-                print(chunk_message, end="", flush=True)
-
-            print()  # Newline after streaming
-            full_response = "".join(collected_messages).strip()
+            # Streaming request: usage comes from the final chunk when the provider
+            # supports include_usage, otherwise completion tokens are counted per chunk
+            completion_text, usage, counted_tokens = await self._stream_text(
+                params, input_tokens, out
+            )
+            full_response = completion_text.strip()
             if not full_response:
                 raise ValueError("Empty response from streaming LLM")
 
-            # estimate completion tokens for streaming response
-            completion_tokens = self.count_tokens(completion_text)
-            logger.info(
-                f"Estimated completion tokens for streaming response: {completion_tokens}"
+            self.update_token_count(
+                *self._streamed_usage(
+                    usage, input_tokens, counted_tokens, completion_text
+                )
             )
-            self.total_completion_tokens += completion_tokens
 
+            if cache_key:
+                await self.response_cache.set(cache_key, json.dumps(full_response))
             return full_response
 
         except TokenLimitExceeded:
@@ -714,7 +1480,9 @@ class LLM:
             if isinstance(oe, AuthenticationError):
                 logger.error("Authentication failed. Check API key.")
             elif isinstance(oe, RateLimitError):
-                logger.error("Rate limit exceeded. Consider increasing retry attempts.")
+                logger.error(
+                    "Rate limit exceeded. Consider lowering requests_per_minute."
+                )
             elif isinstance(oe, APIError):
                 logger.error(f"API error: {oe}")
             raise
@@ -722,13 +1490,6 @@ class LLM:
             logger.exception(f"Unexpected error in ask")
             raise
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-        retry=retry_if_exception_type(
-            (OpenAIError, Exception, ValueError)
-        ),  # Don't retry TokenLimitExceeded
-    )
     async def ask_with_images(
         self,
         messages: List[Union[dict, Message]],
@@ -736,6 +1497,7 @@ class LLM:
         system_msgs: Optional[List[Union[dict, Message]]] = None,
         stream: bool = False,
         temperature: Optional[float] = None,
+        sink: Optional[StreamSink] = None,
     ) -> str:
         """
         向 LLM 发送带图片的提示并获取回复
@@ -749,6 +1511,7 @@ class LLM:
             system_msgs: 可选的系统消息，会添加到消息列表的开头
             stream: 是否使用流式响应（默认 False）
             temperature: 采样温度，控制回复的随机性
+            sink: 接收流式文本增量的接收器（同 ask）
 
         Returns:
             str: LLM 生成的回复文本
@@ -764,6 +1527,29 @@ class LLM:
             images = ["https://example.com/image.jpg"]
             response = await llm.ask_with_images(messages, images)
         """
+        out = get_stream_sink(sink) if stream else None
+        # 只关闭为本次调用创建的接收器，上下文接收器还会被后续调用复用
+        owned = sink is not None or current_stream_sink() is None
+        try:
+            return await self._ask_with_images(
+                messages, images, system_msgs, stream, temperature, out
+            )
+        finally:
+            if out is not None and owned:
+                await out.close()
+
+    @llm_retry()  # 只重试 429 / 5xx / 超时 / 连接错误，受进程级重试预算约束
+    @track_llm_call("ask_with_images")  # 每次尝试记录一条遥测样本
+    async def _ask_with_images(
+        self,
+        messages: List[Union[dict, Message]],
+        images: List[Union[str, dict]],
+        system_msgs: Optional[List[Union[dict, Message]]],
+        stream: bool,
+        temperature: Optional[float],
+        out: Optional[StreamSink],
+    ) -> str:
+        """ask_with_images 的一次尝试（out 为已解析的接收器，由 ask_with_images 负责关闭）"""
         try:
             # For ask_with_images, we always set supports_images to True because
             # this method should only be called with models that support images
@@ -773,6 +1559,7 @@ class LLM:
                 )
 
             # Format messages with image support
+            await self._downscale_images(messages, supports_images=True)
             formatted_messages = self.format_messages(messages, supports_images=True)
 
             # Ensure the last message is from the user to attach images
@@ -782,14 +1569,18 @@ class LLM:
                 )
 
             # Process the last user message to include images
-            last_message = formatted_messages[-1]
+            # (copied: the formatted dict may be cached on the Message)
+            last_message = dict(formatted_messages[-1])
+            formatted_messages[-1] = last_message
 
             # Convert content to multimodal format if needed
             content = last_message["content"]
             multimodal_content = (
                 [{"type": "text", "text": content}]
                 if isinstance(content, str)
-                else content if isinstance(content, list) else []
+                else list(content)
+                if isinstance(content, list)
+                else []
             )
 
             # Add images to content
@@ -840,26 +1631,28 @@ class LLM:
 
             # Handle non-streaming request
             if not stream:
-                response = await self.client.chat.completions.create(**params)
+                async with self._limit(input_tokens):
+                    response = await self.client.chat.completions.create(**params)
 
                 if not response.choices or not response.choices[0].message.content:
                     raise ValueError("Empty or invalid response from LLM")
 
-                self.update_token_count(response.usage.prompt_tokens)
+                self.update_token_count(
+                    response.usage.prompt_tokens, response.usage.completion_tokens
+                )
                 return response.choices[0].message.content
 
-            # Handle streaming request
-            self.update_token_count(input_tokens)
-            response = await self.client.chat.completions.create(**params)
-
-            collected_messages = []
-            async for chunk in response:
-                chunk_message = chunk.choices[0].delta.content or ""
-                collected_messages.append(chunk_message)
-                print(chunk_message, end="", flush=True)
-
-            print()  # Newline after streaming
-            full_response = "".join(collected_messages).strip()
+            # Handle streaming request (usage from the final chunk when available)
+            params.pop("stream")
+            completion_text, usage, counted_tokens = await self._stream_text(
+                params, input_tokens, out
+            )
+            full_response = completion_text.strip()
+            self.update_token_count(
+                *self._streamed_usage(
+                    usage, input_tokens, counted_tokens, completion_text
+                )
+            )
 
             if not full_response:
                 raise ValueError("Empty response from streaming LLM")
@@ -876,7 +1669,9 @@ class LLM:
             if isinstance(oe, AuthenticationError):
                 logger.error("Authentication failed. Check API key.")
             elif isinstance(oe, RateLimitError):
-                logger.error("Rate limit exceeded. Consider increasing retry attempts.")
+                logger.error(
+                    "Rate limit exceeded. Consider lowering requests_per_minute."
+                )
             elif isinstance(oe, APIError):
                 logger.error(f"API error: {oe}")
             raise
@@ -884,21 +1679,96 @@ class LLM:
             logger.error(f"Unexpected error in ask_with_images: {e}")
             raise
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-        retry=retry_if_exception_type(
-            (OpenAIError, Exception, ValueError)
-        ),  # Don't retry TokenLimitExceeded
-    )
+    def _prepare_tool_params(
+        self,
+        messages: Union[Memory, List[Union[dict, Message]]],
+        system_msgs: Optional[List[Union[dict, Message]]],
+        timeout: int,
+        tools: Optional[List[dict]],
+        tool_choice: TOOL_CHOICE_TYPE,  # type: ignore
+        temperature: Optional[float],
+        **kwargs,
+    ) -> Tuple[Dict[str, Any], int]:
+        """
+        校验并构建工具调用请求的参数（ask_tool 与 ask_tool_stream 共用）
+
+        包括校验 tool_choice 和工具格式、格式化消息、估算输入 token 并检查限制。
+
+        Returns:
+            Tuple[Dict[str, Any], int]: chat.completions.create 的请求参数（不含 stream）
+                和估算的输入 token 数
+
+        Raises:
+            TokenLimitExceeded: 如果超出 token 限制
+            ValueError: 如果工具或 tool_choice 无效
+        """
+        # Validate tool_choice
+        if tool_choice not in TOOL_CHOICE_VALUES:
+            raise ValueError(f"Invalid tool_choice: {tool_choice}")
+
+        # Check if the model supports images
+        supports_images = self.model in MULTIMODAL_MODELS
+
+        # Calculate input token count, including tool descriptions
+        # (cached per message, incremental for Memory; memoized on ToolParamList)
+        input_tokens = self.estimate_tool_request_tokens(messages, system_msgs, tools)
+        if isinstance(messages, Memory):
+            messages = messages.messages
+
+        # Format messages
+        if system_msgs:
+            system_msgs = self.format_messages(system_msgs, supports_images)
+            messages = system_msgs + self.format_messages(messages, supports_images)
+        else:
+            messages = self.format_messages(messages, supports_images)
+
+        # Check if token limits are exceeded
+        if not self.check_token_limit(input_tokens):
+            error_message = self.get_limit_error_message(input_tokens)
+            # Raise a special exception that won't be retried
+            raise TokenLimitExceeded(error_message)
+
+        # Validate tools if provided
+        if tools:
+            for tool in tools:
+                if not isinstance(tool, dict) or "type" not in tool:
+                    raise ValueError("Each tool must be a dict with 'type' field")
+
+        # 系统提示词 + 工具定义构成各步之间完全一致的前缀，按需添加缓存标记
+        if self.prompt_cache_control:
+            messages, tools = self.apply_cache_control(messages, tools)
+
+        # Set up the completion request
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "tools": tools,
+            "tool_choice": tool_choice,
+            "timeout": timeout,
+            **kwargs,
+        }
+
+        if self.model in REASONING_MODELS:
+            params["max_completion_tokens"] = self.max_tokens
+        else:
+            params["max_tokens"] = self.max_tokens
+            params["temperature"] = (
+                temperature if temperature is not None else self.temperature
+            )
+
+        return params, input_tokens
+
+    @llm_retry()  # 只重试 429 / 5xx / 超时 / 连接错误，受进程级重试预算约束
+    @track_llm_call("ask_tool")  # 每次尝试记录一条遥测样本
     async def ask_tool(
         self,
-        messages: List[Union[dict, Message]],
+        messages: Union[Memory, List[Union[dict, Message]]],
         system_msgs: Optional[List[Union[dict, Message]]] = None,
         timeout: int = 300,
         tools: Optional[List[dict]] = None,
         tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
         temperature: Optional[float] = None,
+        use_cache: bool = True,
         **kwargs,
     ) -> ChatCompletionMessage | None:
         """
@@ -908,7 +1778,7 @@ class LLM:
         这是实现智能体工具调用的核心方法。
 
         Args:
-            messages: 对话消息列表
+            messages: 对话消息列表，也可以直接传入 Memory 以复用其增量 token 计数
             system_msgs: 可选的系统消息，会添加到消息列表的开头
             timeout: 请求超时时间（秒），默认 300 秒
             tools: 可用工具列表，每个工具是字典格式（通过 tool.to_param() 生成）
@@ -917,6 +1787,8 @@ class LLM:
                 - REQUIRED: 必须使用工具
                 - NONE: 不使用工具
             temperature: 采样温度，控制回复的随机性
+            use_cache: 是否使用响应缓存（仅在 [llm_cache] 启用时生效），
+                传入 False 可跳过本次调用的缓存读写
             **kwargs: 其他额外的完成参数
 
         Returns:
@@ -938,67 +1810,60 @@ class LLM:
                 for tool_call in response.tool_calls:
                     ...
         """
-        try:
-            # Validate tool_choice
-            if tool_choice not in TOOL_CHOICE_VALUES:
-                raise ValueError(f"Invalid tool_choice: {tool_choice}")
-
-            # Check if the model supports images
-            supports_images = self.model in MULTIMODAL_MODELS
-
-            # Format messages
-            if system_msgs:
-                system_msgs = self.format_messages(system_msgs, supports_images)
-                messages = system_msgs + self.format_messages(messages, supports_images)
-            else:
-                messages = self.format_messages(messages, supports_images)
-
-            # Calculate input token count
-            input_tokens = self.count_message_tokens(messages)
-
-            # If there are tools, calculate token count for tool descriptions
-            tools_tokens = 0
-            if tools:
-                for tool in tools:
-                    tools_tokens += self.count_tokens(str(tool))
-
-            input_tokens += tools_tokens
-
-            # Check if token limits are exceeded
-            if not self.check_token_limit(input_tokens):
-                error_message = self.get_limit_error_message(input_tokens)
-                # Raise a special exception that won't be retried
-                raise TokenLimitExceeded(error_message)
+        return await self._ask_tool(
+            messages,
+            system_msgs=system_msgs,
+            timeout=timeout,
+            tools=tools,
+            tool_choice=tool_choice,
+            temperature=temperature,
+            use_cache=use_cache,
+            **kwargs,
+        )
 
-            # Validate tools if provided
-            if tools:
-                for tool in tools:
-                    if not isinstance(tool, dict) or "type" not in tool:
-                        raise ValueError("Each tool must be a dict with 'type' field")
+    async def _ask_tool(
+        self,
+        messages: Union[Memory, List[Union[dict, Message]]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        tools: Optional[List[dict]] = None,
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+        temperature: Optional[float] = None,
+        use_cache: bool = True,
+        **kwargs,
+    ) -> ChatCompletionMessage | None:
+        """
+        ask_tool 的单次尝试（不经过重试和遥测装饰器）
 
-            # Set up the completion request
-            params = {
-                "model": self.model,
-                "messages": messages,
-                "tools": tools,
-                "tool_choice": tool_choice,
-                "timeout": timeout,
+        ask_tool_stream 在不支持流式的后端上直接调用，避免重试嵌套和重复计入重试预算。
+        """
+        try:
+            await self._downscale_images(messages, self.model in MULTIMODAL_MODELS)
+            params, input_tokens = self._prepare_tool_params(
+                messages,
+                system_msgs,
+                timeout,
+                tools,
+                tool_choice,
+                temperature,
                 **kwargs,
-            }
+            )
+            params["stream"] = False  # Always use non-streaming for tool requests
 
-            if self.model in REASONING_MODELS:
-                params["max_completion_tokens"] = self.max_tokens
-            else:
-                params["max_tokens"] = self.max_tokens
-                params["temperature"] = (
-                    temperature if temperature is not None else self.temperature
+            # Serve from the response cache when enabled
+            cache_key = self._cache_key("ask_tool", params) if use_cache else None
+            if cache_key:
+                cached = await self.response_cache.get(cache_key)
+                if cached is not None:
+                    logger.info("LLM 响应缓存命中 (ask_tool)")
+                    current_call().cache_hit()
+                    return ChatCompletionMessage.model_validate_json(cached)
+
+            async with self._limit(input_tokens):
+                response: ChatCompletion = await self.client.chat.completions.create(
+                    **params
                 )
 
-            params["stream"] = False  # Always use non-streaming for tool requests
-            response: ChatCompletion = await self.client.chat.completions.create(
-                **params
-            )
-
             # Check if response is valid
             if not response.choices or not response.choices[0].message:
                 print(response)
@@ -1010,7 +1875,11 @@ class LLM:
                 response.usage.prompt_tokens, response.usage.completion_tokens
             )
 
-            return response.choices[0].message
+            message = response.choices[0].message
+            # Bedrock 返回的是兼容对象而非 ChatCompletionMessage，不缓存
+            if cache_key and isinstance(message, ChatCompletionMessage):
+                await self.response_cache.set(cache_key, message.model_dump_json())
+            return message
 
         except TokenLimitExceeded:
             # Re-raise token limit errors without logging
@@ -1023,10 +1892,238 @@ class LLM:
             if isinstance(oe, AuthenticationError):
                 logger.error("Authentication failed. Check API key.")
             elif isinstance(oe, RateLimitError):
-                logger.error("Rate limit exceeded. Consider increasing retry attempts.")
+                logger.error(
+                    "Rate limit exceeded. Consider lowering requests_per_minute."
+                )
             elif isinstance(oe, APIError):
                 logger.error(f"API error: {oe}")
             raise
         except Exception as e:
             logger.error(f"Unexpected error in ask_tool: {e}")
             raise
+
+    @llm_retry()  # 只重试 429 / 5xx / 超时 / 连接错误，受进程级重试预算约束
+    @track_llm_call("ask_tool_stream")  # 每次尝试记录一条遥测样本
+    async def ask_tool_stream(
+        self,
+        messages: Union[Memory, List[Union[dict, Message]]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        tools: Optional[List[dict]] = None,
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+        temperature: Optional[float] = None,
+        use_cache: bool = True,
+        **kwargs,
+    ) -> ToolCallStream:
+        """
+        流式工具调用：边生成边产出已完整的工具调用
+
+        参数与 ask_tool 相同。返回的 ToolCallStream 在迭代时按完成顺序产出工具调用，
+        调用方可以在模型继续生成后续工具调用时就开始执行第一个工具。
+        迭代结束后可通过 stream.message 获取完整消息，通过
+        stream.time_to_first_token 获取首 token 延迟（秒）。
+
+        重试只覆盖建立流式请求的阶段；流开始后的错误会在迭代时直接抛出。
+        不支持流式的后端（如 Bedrock）和缓存命中时，会退化为一次性返回。
+
+        Returns:
+            ToolCallStream: 流式工具调用组装器
+
+        使用示例：
+            stream = await llm.ask_tool_stream(messages, tools=tools)
+            async for tool_call in stream:
+                asyncio.create_task(run(tool_call))
+            response = stream.message
+        """
+        call = current_call()
+        if self.api_type == "aws":
+            # 不支持流式：在本次尝试中直接完成请求（重试和遥测由本方法的装饰器负责）
+            message = await self._ask_tool(
+                messages,
+                system_msgs=system_msgs,
+                timeout=timeout,
+                tools=tools,
+                tool_choice=tool_choice,
+                temperature=temperature,
+                use_cache=use_cache,
+                **kwargs,
+            )
+            return ToolCallStream.from_message(message)
+
+        try:
+            await self._downscale_images(messages, self.model in MULTIMODAL_MODELS)
+            params, input_tokens = self._prepare_tool_params(
+                messages,
+                system_msgs,
+                timeout,
+                tools,
+                tool_choice,
+                temperature,
+                **kwargs,
+            )
+
+            # Serve from the response cache when enabled (shared with ask_tool)
+            cache_key = self._cache_key("ask_tool", params) if use_cache else None
+            if cache_key:
+                cached = await self.response_cache.get(cache_key)
+                if cached is not None:
+                    logger.info("LLM 响应缓存命中 (ask_tool_stream)")
+                    current_call().cache_hit()
+                    return ToolCallStream.from_message(
+                        ChatCompletionMessage.model_validate_json(cached)
+                    )
+
+            # 并发槽位一直占用到流读取结束（由 ToolCallStream 在关闭时释放）
+            if self.rate_limiter is not None:
+                queued_at = time.perf_counter()
+                await self.rate_limiter.acquire(input_tokens)
+                call.add_queue_wait(time.perf_counter() - queued_at)
+            try:
+                response = await self._create_stream(params)
+            except BaseException:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.release()
+                raise
+        except TokenLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error in ask_tool_stream: {e}")
+            raise
+
+        async def on_complete(stream: ToolCallStream) -> None:
+            # 流结束后更新 token 计数（优先使用服务端返回的 usage）并写入缓存
+            message = stream.message
+            completion_text = (message.content or "") + "".join(
+                call.function.arguments for call in message.tool_calls or []
+            )
+            usage = self._streamed_usage(
+                stream.usage, input_tokens, None, completion_text
+            )
+            self.update_token_count(*usage)
+            call.set_tokens(*usage)
+            if stream.time_to_first_token is not None:
+                call.first_token(stream._started_at + stream.time_to_first_token)
+            logger.info(
+                f"流式工具调用完成：首 token 延迟 {stream.time_to_first_token or 0:.2f}s，"
+                f"总耗时 {stream.total_time:.2f}s"
+            )
+            if cache_key and (message.content or message.tool_calls):
+                await self.response_cache.set(cache_key, message.model_dump_json())
+
+        def on_close() -> None:
+            # 流读取结束后释放并发槽位并记录遥测样本
+            if self.rate_limiter is not None:
+                self.rate_limiter.release()
+            call.finish()
+
+        # 生成尚未结束，遥测样本在流关闭时记录
+        call.defer()
+        return ToolCallStream(response, on_complete=on_complete, on_close=on_close)
+
+    async def _fan_out(
+        self,
+        method: Callable[..., Awaitable[Any]],
+        requests: List[Dict[str, Any]],
+        max_concurrency: Optional[int],
+    ) -> BatchResult:
+        """
+        并发执行多个独立请求，保持结果顺序并收集每个请求的错误
+
+        Args:
+            method: 单个请求调用的方法（如 self.ask）
+            requests: 每个请求的关键字参数
+            max_concurrency: 本批最大并发数，None 表示不额外限制
+                （仍受 LLM 配置的限流器约束）
+
+        Returns:
+            BatchResult: 批量调用结果
+        """
+        usage = {"input_tokens": 0, "completion_tokens": 0}
+        token = _batch_usage.set(usage)
+        semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        start = time.perf_counter()
+
+        async def run_one(kwargs: Dict[str, Any]) -> Any:
+            if semaphore is None:
+                return await method(**kwargs)
+            async with semaphore:
+                return await method(**kwargs)
+
+        try:
+            outcomes = await asyncio.gather(
+                *(run_one(kwargs) for kwargs in requests), return_exceptions=True
+            )
+        finally:
+            _batch_usage.reset(token)
+
+        result = BatchResult(
+            input_tokens=usage["input_tokens"],
+            completion_tokens=usage["completion_tokens"],
+            elapsed=time.perf_counter() - start,
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                if not isinstance(outcome, Exception):
+                    # 取消等非普通异常不吞掉
+                    raise outcome
+                result.results.append(None)
+                result.errors.append(outcome)
+            else:
+                result.results.append(outcome)
+                result.errors.append(None)
+        logger.info(
+            f"Batch of {len(requests)} requests finished in {result.elapsed:.2f}s: "
+            f"failed={result.failed}, input_tokens={result.input_tokens}, "
+            f"completion_tokens={result.completion_tokens}"
+        )
+        return result
+
+    async def ask_many(
+        self,
+        requests: List[Dict[str, Any]],
+        max_concurrency: Optional[int] = None,
+    ) -> BatchResult:
+        """
+        并发发送多个独立的 ask 请求
+
+        N 个互相独立的提示词（如逐条评分、分块抽取）不必依次等待，
+        整批耗时约为一次往返时间。请求仍经过限流器和重试策略。
+
+        Args:
+            requests: 每个请求传给 ask() 的关键字参数（messages 必填）；
+                未指定 stream 时默认不流式输出，避免多路输出交错
+            max_concurrency: 本批最大并发数，None 表示不额外限制
+
+        Returns:
+            BatchResult: 按请求顺序排列的回复文本和错误，以及整批 token 用量
+
+        使用示例：
+            batch = await llm.ask_many(
+                [{"messages": [Message.user_message(p)]} for p in prompts],
+                max_concurrency=8,
+            )
+            for text, error in zip(batch.results, batch.errors):
+                ...
+        """
+        return await self._fan_out(
+            self.ask,
+            [{"stream": False, **kwargs} for kwargs in requests],
+            max_concurrency,
+        )
+
+    async def ask_tool_many(
+        self,
+        requests: List[Dict[str, Any]],
+        max_concurrency: Optional[int] = None,
+    ) -> BatchResult:
+        """
+        并发发送多个独立的 ask_tool 请求
+
+        Args:
+            requests: 每个请求传给 ask_tool() 的关键字参数（messages 必填）
+            max_concurrency: 本批最大并发数，None 表示不额外限制
+
+        Returns:
+            BatchResult: 按请求顺序排列的 ChatCompletionMessage 和错误，以及整批 token 用量
+        """
+        return await self._fan_out(self.ask_tool, requests, max_concurrency)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM 响应缓存模块
+
+本模块提供基于内容寻址的本地磁盘响应缓存，用于 LLM.ask / LLM.ask_tool：
+- 缓存键：对模型、格式化后的消息、工具、tool_choice、温度等请求参数做规范化 JSON 后取 SHA-256
+- 存储：本地 SQLite 文件（标准库，无额外依赖）
+- 过期：按 TTL 过期，读取时惰性删除
+- 淘汰：总大小超过上限时按最近访问时间（LRU）淘汰
+- 统计：命中、未命中、写入、淘汰次数
+
+缓存默认关闭，需要在 config.toml 的 [llm_cache] 中开启。
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config import PROJECT_ROOT, LLMCacheSettings
+from app.logger import logger
+
+
+class ResponseCache:
+    """
+    LLM 响应缓存类
+
+    使用 SQLite 保存请求键到响应内容（JSON 文本）的映射。
+    所有数据库操作都在线程池中执行，不会阻塞事件循环。
+
+    使用示例：
+        cache = ResponseCache(Path(".cache/llm.sqlite3"), ttl_seconds=3600)
+        key = ResponseCache.make_key({"model": "gpt-4o", "messages": [...]})
+        value = await cache.get(key)
+        if value is None:
+            await cache.set(key, '"answer"')
+    """
+
+    def __init__(
+        self, path: Path, ttl_seconds: Optional[int] = None, max_size_bytes: int = 0
+    ):
+        """
+        初始化响应缓存
+
+        Args:
+            path: SQLite 文件路径，父目录不存在时会自动创建
+            ttl_seconds: 缓存条目的有效期（秒），None 或 0 表示永不过期
+            max_size_bytes: 缓存总大小上限（字节），0 表示不限制
+        """
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds or None
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 连接在线程池中使用，由锁保证同一时间只有一个线程访问
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """
+        根据请求参数生成内容寻址的缓存键
+
+        使用排序键、紧凑分隔符的 JSON 作为规范形式，保证语义相同的请求得到相同的键。
+
+        Args:
+            payload: 请求参数字典（模型、消息、工具等）
+
+        Returns:
+            str: SHA-256 十六进制摘要
+        """
+        canonical = json.dumps(
+            payload,
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _get(self, key: str) -> Optional[str]:
+        """同步读取缓存条目（在线程池中执行）"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                # 已过期：惰性删除
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        """同步写入缓存条目并按需淘汰（在线程池中执行）"""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self.evictions += self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> int:
+        """
+        淘汰过期条目和超出大小上限的最久未访问条目（调用方需持有锁）
+
+        Returns:
+            int: 被淘汰的条目数量
+        """
+        evicted = 0
+        if self.ttl_seconds:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+            evicted += cursor.rowcount
+        if self.max_size_bytes:
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+            if total > self.max_size_bytes:
+                rows = self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                ).fetchall()
+                for key, size in rows:
+                    if total <= self.max_size_bytes:
+                        break
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+        return evicted
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存条目
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[str]: 缓存的响应内容，未命中或已过期时返回 None
+        """
+        value = await asyncio.to_thread(self._get, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        """
+        写入缓存条目
+
+        Args:
+            key: 缓存键
+            value: 响应内容（JSON 文本）
+        """
+        await asyncio.to_thread(self._set, key, value)
+        self.stores += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 包含 hits、misses、hit_rate、stores、evictions、
+                entries、size_bytes 的字典
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def clear(self) -> None:
+        """清空所有缓存条目（统计计数保留）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+# 进程级缓存实例：同一个文件路径只打开一个连接，所有 LLM 实例共享
+_caches: Dict[Path, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(settings: Optional[LLMCacheSettings]) -> Optional[ResponseCache]:
+    """
+    根据配置获取共享的响应缓存实例
+
+    Args:
+        settings: 缓存配置，None 或未启用时返回 None
+
+    Returns:
+        Optional[ResponseCache]: 响应缓存实例，未启用时返回 None
+    """
+    if settings is None or not settings.enabled:
+        return None
+    path = Path(settings.path)
+    if not path.is_absolute():
+        path = PROJECT_ROOT / path
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = ResponseCache(
+                path,
+                ttl_seconds=settings.ttl_seconds,
+                max_size_bytes=int(settings.max_size_mb * 1024 * 1024),
+            )
+            logger.info(f"LLM 响应缓存已启用: {path}")
+        return _caches[path]
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM 客户端限流模块
+
+本模块在本地对 LLM 请求做限流，避免大量并发智能体同时打到服务商的限额上：
+- 令牌桶：按每分钟请求数（RPM）和每分钟 token 数（TPM）限流，
+  token 数使用 ask / ask_tool 已经计算好的输入 token 估算值
+- 并发控制：每个 LLM 配置一个有界信号量，限制同时进行中的请求数
+
+等待中的请求按到达顺序（FIFO）依次放行，而不是各自失败后随机退避最长 60 秒。
+限额在 config.toml 的 [llm] / [llm.<name>] 中配置，未配置时不做任何限制。
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.config import LLMSettings
+from app.logger import logger
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    容量为每分钟的限额，按 容量 / 60 的速率匀速补充，允许不超过容量的突发。
+    """
+
+    def __init__(self, per_minute: int):
+        """
+        初始化令牌桶
+
+        Args:
+            per_minute: 每分钟允许的数量（同时也是桶的容量）
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        """按经过的时间补充令牌"""
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        计算取出指定数量令牌需要等待的时间
+
+        超过容量的请求按容量计算，避免永远无法满足。
+
+        Args:
+            amount: 需要的令牌数量
+
+        Returns:
+            float: 需要等待的秒数，0 表示可以立即取出
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        """
+        取出令牌（调用前应确认 wait_time 为 0）
+
+        Args:
+            amount: 取出的令牌数量
+        """
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    LLM 请求限流器
+
+    组合 RPM 令牌桶、TPM 令牌桶和并发信号量。
+    所有请求先在一把 FIFO 锁上排队等待令牌，再占用一个并发槽位。
+
+    使用示例：
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=90000, max_concurrency=8)
+        async with limiter.limit(input_tokens):
+            response = await client.chat.completions.create(...)
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        """
+        初始化限流器
+
+        Args:
+            requests_per_minute: 每分钟最大请求数，None 表示不限制
+            tokens_per_minute: 每分钟最大输入 token 数，None 表示不限制
+            max_concurrency: 同时进行中的最大请求数，None 表示不限制
+        """
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self._semaphore = (
+            asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        )
+        self._lock = asyncio.Lock()
+
+        # 统计信息
+        self.acquired = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: LLMSettings) -> Optional["RateLimiter"]:
+        """
+        根据 LLM 配置创建限流器
+
+        Args:
+            settings: LLM 配置
+
+        Returns:
+            Optional[RateLimiter]: 限流器，所有限额都未配置时返回 None
+        """
+        if not (
+            settings.requests_per_minute
+            or settings.tokens_per_minute
+            or settings.max_concurrency
+        ):
+            return None
+        return cls(
+            requests_per_minute=settings.requests_per_minute,
+            tokens_per_minute=settings.tokens_per_minute,
+            max_concurrency=settings.max_concurrency,
+        )
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        等待令牌和并发槽位（与 release 成对使用）
+
+        Args:
+            tokens: 本次请求的输入 token 估算值
+        """
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            # asyncio.Lock 按到达顺序唤醒等待者，保证排队公平
+            async with self._lock:
+                while True:
+                    delay = max(
+                        self.requests.wait_time(1) if self.requests else 0.0,
+                        self.tokens.wait_time(tokens) if self.tokens else 0.0,
+                    )
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                if self.requests:
+                    self.requests.consume(1)
+                if self.tokens:
+                    self.tokens.consume(tokens)
+            if self._semaphore is not None:
+                await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        waited = time.perf_counter() - start
+        self.acquired += 1
+        self.in_flight += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        if waited > 1:
+            logger.debug(f"LLM 请求在本地限流队列中等待 {waited:.2f}s")
+
+    def release(self) -> None:
+        """释放并发槽位"""
+        self.in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def limit(self, tokens: int = 0) -> AsyncIterator[None]:
+        """
+        限流上下文：进入时等待令牌和并发槽位，退出时释放槽位
+
+        Args:
+            tokens: 本次请求的输入 token 估算值
+        """
+        await self.acquire(tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取限流统计信息
+
+        Returns:
+            Dict[str, Any]: 包含 acquired、waiting、in_flight、avg_wait、max_wait（秒）的字典
+        """
+        return {
+            "acquired": self.acquired,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "avg_wait": self.total_wait / self.acquired if self.acquired else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+# 进程级注册表：LLM 配置名称 -> 限流器（同一配置的所有调用方共享限额）
+_limiters: Dict[str, Optional[RateLimiter]] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(config_name: str, settings: LLMSettings) -> Optional[RateLimiter]:
+    """
+    获取指定 LLM 配置共享的限流器
+
+    Args:
+        config_name: LLM 配置名称
+        settings: 该配置的 LLM 设置
+
+    Returns:
+        Optional[RateLimiter]: 限流器，未配置任何限额时返回 None
+    """
+    with _limiters_lock:
+        if config_name not in _limiters:
+            _limiters[config_name] = RateLimiter.from_settings(settings)
+        return _limiters[config_name]
+
+
+def get_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    获取所有限流器的统计信息
+
+    Returns:
+        Dict[str, Dict[str, Any]]: 以 LLM 配置名称为键的统计信息字典
+    """
+    with _limiters_lock:
+        return {
+            name: limiter.stats()
+            for name, limiter in _limiters.items()
+            if limiter is not None
+        }
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM 重试策略模块
+
+本模块为 LLM 调用提供按错误类型区分的重试策略（基于 tenacity）：
+- 错误分类：只有 429、5xx、超时、连接中断等瞬时错误才重试；
+  认证失败、参数错误、TokenLimitExceeded 等确定性错误立即抛出
+- Retry-After：服务端返回 Retry-After / retry-after-ms 时按其等待，
+  否则使用随机指数退避
+- 重试预算：进程级滑动窗口，窗口内重试次数不超过请求次数的一定比例，
+  服务故障时不会把 LLM 负载放大数倍
+- 统计：按错误类型统计重试次数、预算耗尽次数和不可重试错误次数
+
+策略参数来自 config.toml 的 [llm_retry]。
+"""
+
+import asyncio
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, Optional
+
+import httpx
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+from tenacity import retry, stop_after_attempt, wait_random_exponential
+from tenacity.wait import wait_base
+
+from app.config import RetrySettings, config
+from app.logger import logger
+
+# 当前 LLM 调用是第几次尝试（由重试装饰器在每次尝试前设置）
+_attempt: ContextVar[int] = ContextVar("llm_attempt", default=1)
+
+
+def current_attempt() -> int:
+    """
+    获取当前 LLM 调用的尝试次数
+
+    Returns:
+        int: 首次尝试为 1，第一次重试为 2，以此类推
+    """
+    return _attempt.get()
+
+
+# Bedrock（botocore ClientError）中可重试的错误码
+_BEDROCK_RETRYABLE = {
+    "ThrottlingException": "rate_limit",
+    "TooManyRequestsException": "rate_limit",
+    "ServiceUnavailableException": "server_error",
+    "InternalServerException": "server_error",
+    "ModelNotReadyException": "server_error",
+    "ModelTimeoutException": "timeout",
+}
+
+
+def classify_error(exc: BaseException) -> Optional[str]:
+    """
+    判断错误是否可重试，并返回错误类型
+
+    Args:
+        exc: 调用中抛出的异常
+
+    Returns:
+        Optional[str]: 可重试时返回错误类型（rate_limit、server_error、timeout、
+            connection），不可重试时返回 None
+    """
+    if isinstance(exc, RateLimitError):
+        return "rate_limit"
+    if isinstance(exc, APITimeoutError):
+        # APITimeoutError 是 APIConnectionError 的子类，需先判断
+        return "timeout"
+    if isinstance(exc, APIConnectionError):
+        return "connection"
+    if isinstance(exc, InternalServerError):
+        return "server_error"
+    if isinstance(exc, APIStatusError):
+        if exc.status_code == 429:
+            return "rate_limit"
+        if exc.status_code in (408, 409) or exc.status_code >= 500:
+            return "server_error"
+        return None
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(exc, (ConnectionError, httpx.TransportError)):
+        return "connection"
+
+    # Bedrock：botocore 的 ClientError 带有 response["Error"]["Code"]
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        code = response.get("Error", {}).get("Code")
+        return _BEDROCK_RETRYABLE.get(code)
+    return None
+
+
+def get_retry_after(exc: BaseException) -> Optional[float]:
+    """
+    从错误响应头中读取服务端建议的等待时间
+
+    支持 retry-after-ms（毫秒）、retry-after（秒数或 HTTP 日期）。
+
+    Args:
+        exc: 调用中抛出的异常
+
+    Returns:
+        Optional[float]: 建议等待的秒数，响应中没有时返回 None
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(float(retry_after_ms) / 1000, 0.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class RetryBudget:
+    """
+    进程级重试预算
+
+    在滑动时间窗口内，允许的重试次数为
+    max(min_retries, ratio * 窗口内请求次数)，超出后不再重试。
+    """
+
+    def __init__(self, ratio: float, min_retries: int, window: float):
+        """
+        初始化重试预算
+
+        Args:
+            ratio: 重试次数占请求次数的最大比例
+            min_retries: 窗口内始终允许的最少重试次数
+            window: 统计时间窗口（秒）
+        """
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        """移除窗口外的记录（调用方需持有锁）"""
+        cutoff = now - self.window
+        for events in (self._requests, self._retries):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+    def record_request(self) -> None:
+        """记录一次新请求（首次尝试）"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            self._requests.append(now)
+
+    def try_acquire(self) -> bool:
+        """
+        尝试消耗一次重试额度
+
+        Returns:
+            bool: 预算充足时返回 True 并记录本次重试，否则返回 False
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            allowed = max(self.min_retries, self.ratio * len(self._requests))
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class RetryPolicy:
+    """
+    LLM 重试策略
+
+    组合错误分类、重试预算和统计计数，生成 tenacity 的 retry 装饰器。
+
+    使用示例：
+        policy = RetryPolicy(config.llm_retry)
+
+        @policy.decorator()
+        async def call():
+            ...
+    """
+
+    def __init__(self, settings: RetrySettings):
+        """
+        初始化重试策略
+
+        Args:
+            settings: 重试策略配置
+        """
+        self.settings = settings
+        self.budget = RetryBudget(
+            ratio=settings.budget_ratio,
+            min_retries=settings.budget_min_retries,
+            window=settings.budget_window,
+        )
+        self.retries: Counter = Counter()
+        self.fatal = 0
+        self.budget_exhausted = 0
+
+    def should_retry(self, exc: BaseException) -> bool:
+        """
+        判断是否重试本次错误，并更新统计
+
+        Args:
+            exc: 调用中抛出的异常
+
+        Returns:
+            bool: 是否重试
+        """
+        error_class = classify_error(exc)
+        if error_class is None:
+            self.fatal += 1
+            return False
+        if not self.budget.try_acquire():
+            self.budget_exhausted += 1
+            logger.warning(f"LLM 重试预算已耗尽，不再重试 ({error_class}): {exc}")
+            return False
+        self.retries[error_class] += 1
+        logger.warning(f"LLM 调用失败，准备重试 ({error_class}): {exc}")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取重试统计信息
+
+        Returns:
+            Dict[str, Any]: 包含 retries（按错误类型）、fatal、budget_exhausted 的字典
+        """
+        return {
+            "retries": dict(self.retries),
+            "fatal": self.fatal,
+            "budget_exhausted": self.budget_exhausted,
+        }
+
+    def decorator(self) -> Callable:
+        """
+        生成 tenacity 重试装饰器
+
+        Returns:
+            Callable: 可直接用于 async 方法的装饰器；重试用尽后抛出最后一次的原始异常
+        """
+        policy = self
+
+        class _RetryIf:
+            def __call__(self, retry_state) -> bool:
+                outcome = retry_state.outcome
+                if not outcome.failed:
+                    return False
+                # tenacity 先判断是否重试、再判断是否停止：最后一次尝试失败后不会再重试，
+                # 不能计入重试次数，也不能消耗重试预算
+                if retry_state.attempt_number >= policy.settings.max_attempts:
+                    return False
+                return policy.should_retry(outcome.exception())
+
+        def _before(retry_state) -> None:
+            _attempt.set(retry_state.attempt_number)
+            if retry_state.attempt_number == 1:
+                policy.budget.record_request()
+
+        return retry(
+            retry=_RetryIf(),
+            wait=wait_retry_after(
+                fallback=wait_random_exponential(
+                    min=self.settings.min_wait, max=self.settings.max_wait
+                ),
+                max_wait=self.settings.max_retry_after,
+            ),
+            stop=stop_after_attempt(self.settings.max_attempts),
+            before=_before,
+            reraise=True,
+        )
+
+
+class wait_retry_after(wait_base):
+    """tenacity 等待策略：优先使用 Retry-After，否则使用回退策略"""
+
+    def __init__(self, fallback: wait_base, max_wait: float):
+        self.fallback = fallback
+        self.max_wait = max_wait
+
+    def __call__(self, retry_state) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        retry_after = get_retry_after(exc) if exc is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_wait)
+        return self.fallback(retry_state)
+
+
+# 进程级重试策略，所有 LLM 实例共享同一份预算和统计
+llm_retry_policy = RetryPolicy(config.llm_retry)
+
+
+def llm_retry() -> Callable:
+    """
+    获取 LLM 调用使用的重试装饰器
+
+    Returns:
+        Callable: 基于进程级重试策略的 tenacity 装饰器
+    """
+    return llm_retry_policy.decorator()
+
+
+def get_retry_stats() -> Dict[str, Any]:
+    """
+    获取进程级重试统计信息
+
+    Returns:
+        Dict[str, Any]: 按错误类型的重试次数等统计
+    """
+    return llm_retry_policy.stats()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM 路由模块
+
+本模块在多个 LLM 配置（config.toml 中的 [llm] / [llm.<name>]）之间路由请求：
+- 对冲请求：主端点在其 p95 延迟内没有返回时，向次优端点发出相同的请求，
+  采用先返回的结果并取消另一个
+- 延迟与错误率统计：每个端点维护滚动窗口内的延迟和错误记录
+- 自动避让：错误率超过阈值的端点被视为降级，排到健康端点之后
+
+LLMRouter 提供与 LLM 相同的常用方法（ask、ask_tool 等），
+其余属性（如 model、max_input_tokens）转发给当前的主端点，可以直接作为智能体的 llm。
+路由参数来自 config.toml 的 [llm_router]。
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from openai import APIStatusError
+
+from app.config import RouterSettings, config
+from app.llm import LLM, BatchResult, ToolCallStream
+from app.llm_retry import classify_error
+from app.logger import logger
+
+
+def is_endpoint_error(exc: BaseException) -> bool:
+    """
+    判断错误是否与端点有关
+
+    只有瞬时错误（限流、5xx、超时、连接中断）和端点自身的配置错误（认证失败、无权限、
+    模型不存在）计入端点统计并切换到其他端点；TokenLimitExceeded、参数错误等本地错误
+    在任何端点上都一样，切换只会让健康的端点显得不健康。
+
+    Args:
+        exc: 调用中抛出的异常
+
+    Returns:
+        bool: 是否计入端点错误并切换端点
+    """
+    if classify_error(exc) is not None:
+        return True
+    return isinstance(exc, APIStatusError) and exc.status_code in (401, 403, 404)
+
+
+class EndpointStats:
+    """
+    单个端点的滚动统计
+
+    记录最近 window 次成功调用的延迟和最近 window 次调用的成败。
+    """
+
+    def __init__(self, window: int):
+        """
+        初始化统计
+
+        Args:
+            window: 滚动窗口大小（调用次数）
+        """
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.hedges_won = 0
+
+    def record_success(self, latency: float) -> None:
+        """记录一次成功调用及其延迟（秒）"""
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+
+    def record_error(self) -> None:
+        """记录一次失败调用"""
+        self.outcomes.append(False)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        计算延迟分位数
+
+        Args:
+            q: 分位数（0-1），如 0.95
+
+        Returns:
+            Optional[float]: 延迟分位数（秒），没有记录时返回 None
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+    @property
+    def error_rate(self) -> float:
+        """滚动窗口内的错误率"""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取统计信息
+
+        Returns:
+            Dict[str, Any]: 包含 calls、error_rate、p50、p95、hedges_won 的字典
+        """
+        return {
+            "calls": len(self.outcomes),
+            "error_rate": self.error_rate,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "hedges_won": self.hedges_won,
+        }
+
+
+class LLMRouter:
+    """
+    LLM 路由器
+
+    在多个 LLM 配置之间做延迟感知的路由和对冲请求。
+
+    使用示例：
+        router = LLMRouter(["default", "backup"])
+        agent = Manus(llm=router)
+        # 或直接调用
+        response = await router.ask_tool(messages, tools=tools)
+    """
+
+    def __init__(
+        self,
+        config_names: Optional[List[str]] = None,
+        settings: Optional[RouterSettings] = None,
+        endpoints: Optional[Dict[str, LLM]] = None,
+    ):
+        """
+        初始化路由器
+
+        Args:
+            config_names: 参与路由的 LLM 配置名称（按优先级排列），
+                默认使用 [llm_router] 的 endpoints
+            settings: 路由配置，默认使用 config.llm_router
+            endpoints: 直接指定的端点（名称 -> LLM 实例），传入时忽略 config_names
+        """
+        self.settings = settings or config.llm_router or RouterSettings()
+        if endpoints is None:
+            names = config_names or self.settings.endpoints or ["default"]
+            endpoints = {name: LLM(config_name=name) for name in names}
+        self.endpoints: Dict[str, LLM] = dict(endpoints)
+        self._stats: Dict[str, EndpointStats] = {
+            name: EndpointStats(self.settings.window) for name in self.endpoints
+        }
+
+    def __getattr__(self, name: str) -> Any:
+        # 其余属性（model、max_input_tokens、estimate_input_tokens 等）转发给主端点
+        if name.startswith("_") or name in ("endpoints", "settings"):
+            raise AttributeError(name)
+        return getattr(self.primary, name)
+
+    def _is_healthy(self, name: str) -> bool:
+        """端点在样本足够时错误率低于阈值才算健康"""
+        stats = self._stats[name]
+        if len(stats.outcomes) < self.settings.min_samples:
+            return True
+        return stats.error_rate < self.settings.max_error_rate
+
+    def _expected_latency(self, name: str) -> float:
+        """用于排序的预期延迟：样本不足时使用默认对冲延迟"""
+        stats = self._stats[name]
+        if len(stats.latencies) < self.settings.min_samples:
+            return self.settings.default_hedge_delay
+        return stats.quantile(self.settings.hedge_quantile)
+
+    def ranked(self) -> List[str]:
+        """
+        按健康状况和预期延迟排列端点
+
+        Returns:
+            List[str]: 端点名称列表，健康且更快的在前，同等条件下保持配置顺序
+        """
+        order = list(self.endpoints)
+        return sorted(
+            order,
+            key=lambda name: (
+                not self._is_healthy(name),
+                self._expected_latency(name),
+                order.index(name),
+            ),
+        )
+
+    @property
+    def primary(self) -> LLM:
+        """当前排名第一的端点"""
+        return self.endpoints[self.ranked()[0]]
+
+    def hedge_delay(self, name: str) -> float:
+        """
+        计算向次优端点发出对冲请求前的等待时间
+
+        Args:
+            name: 主端点名称
+
+        Returns:
+            float: 等待秒数（主端点的 p95 延迟，不低于 min_hedge_delay）
+        """
+        stats = self._stats[name]
+        if len(stats.latencies) < self.settings.min_samples:
+            return self.settings.default_hedge_delay
+        p = stats.quantile(self.settings.hedge_quantile)
+        return max(p, self.settings.min_hedge_delay)
+
+    async def _call(self, name: str, method: str, kwargs: Dict[str, Any]) -> Any:
+        """调用单个端点并记录延迟或错误（被取消时不计入统计）"""
+        start = time.perf_counter()
+        try:
+            result = await getattr(self.endpoints[name], method)(**kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if is_endpoint_error(e):
+                self._stats[name].record_error()
+            raise
+        self._stats[name].record_success(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, method: str, kwargs: Dict[str, Any]) -> Any:
+        """
+        按排名调用端点，主端点超过对冲延迟未返回时并发请求次优端点
+
+        Args:
+            method: LLM 方法名
+            kwargs: 调用参数
+
+        Returns:
+            Any: 最先成功返回的结果
+
+        Raises:
+            Exception: 所有端点都失败时抛出最后一个错误；本地错误（见 is_endpoint_error）立即抛出
+        """
+        ranked = self.ranked()
+        pending: Dict[asyncio.Task, str] = {}
+        last_error: Optional[BaseException] = None
+        next_index = 0
+
+        def launch() -> None:
+            nonlocal next_index
+            name = ranked[next_index]
+            next_index += 1
+            pending[asyncio.create_task(self._call(name, method, kwargs))] = name
+
+        launch()
+        try:
+            while pending:
+                can_hedge = self.settings.hedge and next_index < len(ranked)
+                timeout = (
+                    self.hedge_delay(ranked[next_index - 1]) if can_hedge else None
+                )
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # 主端点超过 p95 仍未返回：发出对冲请求
+                    logger.info(
+                        f"LLM 请求超过 {timeout:.1f}s 未返回，向 '{ranked[next_index]}' 发出对冲请求"
+                    )
+                    launch()
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is None:
+                        if len(ranked) > 1 and name != ranked[0]:
+                            self._stats[name].hedges_won += 1
+                        return task.result()
+                    last_error = task.exception()
+                    if not is_endpoint_error(last_error):
+                        # 本地错误在任何端点上都一样，不切换端点，直接抛出
+                        raise last_error
+                    logger.warning(f"LLM 端点 '{name}' 调用失败: {last_error}")
+                # 失败的端点不再等待对冲延迟，直接切换到下一个
+                if not pending and next_index < len(ranked):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error
+
+    async def ask(self, messages, stream: bool = True, **kwargs) -> str:
+        """
+        路由 LLM.ask
+
+        流式输出无法对冲（两路输出会交错打印），只路由到排名第一的端点。
+        """
+        kwargs = {"messages": messages, "stream": stream, **kwargs}
+        if stream:
+            return await self._call(self.ranked()[0], "ask", kwargs)
+        return await self._hedged("ask", kwargs)
+
+    async def ask_tool(self, messages, **kwargs) -> Any:
+        """路由 LLM.ask_tool（支持对冲）"""
+        return await self._hedged("ask_tool", {"messages": messages, **kwargs})
+
+    async def ask_with_images(self, messages, images, **kwargs) -> str:
+        """路由 LLM.ask_with_images（支持对冲，流式时只路由不对冲）"""
+        kwargs = {"messages": messages, "images": images, **kwargs}
+        if kwargs.get("stream", False):
+            return await self._call(self.ranked()[0], "ask_with_images", kwargs)
+        return await self._hedged("ask_with_images", kwargs)
+
+    async def ask_tool_stream(self, messages, **kwargs) -> ToolCallStream:
+        """路由 LLM.ask_tool_stream（流式，只路由到排名第一的端点，不对冲）"""
+        return await self._call(
+            self.ranked()[0], "ask_tool_stream", {"messages": messages, **kwargs}
+        )
+
+    async def ask_many(
+        self, requests: List[Dict[str, Any]], max_concurrency: Optional[int] = None
+    ) -> BatchResult:
+        """路由 LLM.ask_many：每个请求单独路由和对冲"""
+        return await self.primary._fan_out(
+            self.ask,
+            [{"stream": False, **kwargs} for kwargs in requests],
+            max_concurrency,
+        )
+
+    async def ask_tool_many(
+        self, requests: List[Dict[str, Any]], max_concurrency: Optional[int] = None
+    ) -> BatchResult:
+        """路由 LLM.ask_tool_many：每个请求单独路由和对冲"""
+        return await self.primary._fan_out(self.ask_tool, requests, max_concurrency)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取所有端点的统计信息
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 以端点名称为键的统计信息，附带 healthy 标记
+        """
+        return {
+            name: {**stats.stats(), "healthy": self._is_healthy(name)}
+            for name, stats in self._stats.items()
+        }
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM 调用遥测模块
+
+每次 LLM 调用（每次尝试）记录一条结构化样本：
+- 配置名称、模型、调用方法
+- 排队等待（本地限流器）、首 token 延迟、总延迟
+- 输入 / 输出 token 数、输出速度（token/s）
+- 第几次重试、是否命中响应缓存、错误类型
+
+样本保存在进程内的环形缓冲区中，可以按配置名称 / 方法查询，
+计算 p50 / p95 / p99 分位数，或导出为 JSONL 文件离线分析。
+据此可以区分一次慢运行是服务端慢、本地限流排队，还是每步的本地开销。
+
+LLM 的 ask / ask_with_images / ask_tool / ask_tool_stream 会自动记录，
+启用 [tracing] 时每次尝试同时记录为一个 llm.<方法> span。
+配置来自 config.toml 的 [llm_telemetry]。
+"""
+
+import functools
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.config import TelemetrySettings, config
+from app.llm_retry import current_attempt
+from app.tracing import span
+
+
+class CallSample(BaseModel):
+    """单次 LLM 调用的遥测样本（时间单位：秒）"""
+
+    timestamp: float = Field(default_factory=time.time, description="调用开始的 Unix 时间")
+    config_name: str = Field(..., description="LLM 配置名称")
+    model: str = Field(..., description="模型名称")
+    method: str = Field(..., description="调用的方法，如 ask、ask_tool")
+    queue_wait: float = Field(0.0, description="在本地限流器中排队的时间")
+    time_to_first_token: Optional[float] = Field(None, description="首 token 延迟（仅流式调用）")
+    latency: float = Field(0.0, description="总延迟")
+    input_tokens: int = Field(0, description="输入 token 数")
+    output_tokens: int = Field(0, description="输出 token 数")
+    retries: int = Field(0, description="本次调用之前已重试的次数（首次尝试为 0）")
+    cache_hit: bool = Field(False, description="是否命中响应缓存")
+    error: Optional[str] = Field(None, description="失败时的异常类型")
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """输出速度（扣除排队时间），没有输出时返回 None"""
+        elapsed = self.latency - self.queue_wait
+        if not self.output_tokens or elapsed <= 0:
+            return None
+        return self.output_tokens / elapsed
+
+    def to_record(self) -> Dict[str, Any]:
+        """转换为包含 tokens_per_second 的字典（用于导出）"""
+        return {**self.model_dump(), "tokens_per_second": self.tokens_per_second}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """
+    计算分位数（最近秩法）
+
+    Args:
+        values: 样本值
+        q: 分位数（0-1）
+
+    Returns:
+        Optional[float]: 分位数，没有样本时返回 None
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    # round 消除浮点误差（如 0.95 * 100 = 95.00000000000001）
+    index = min(len(ordered) - 1, max(0, math.ceil(round(q * len(ordered), 9)) - 1))
+    return ordered[index]
+
+
+class TelemetryRecorder:
+    """
+    进程内的遥测样本环形缓冲区
+
+    使用示例：
+        recorder = get_telemetry()
+        recorder.summary()                     # 按配置名称汇总的分位数
+        recorder.percentiles("latency", config_name="default")
+        recorder.dump_jsonl("logs/llm_calls.jsonl")
+    """
+
+    FIELDS = ("queue_wait", "time_to_first_token", "latency", "tokens_per_second")
+
+    def __init__(self, capacity: int = 2000):
+        """
+        初始化缓冲区
+
+        Args:
+            capacity: 最多保留的样本数，超出后丢弃最早的样本
+        """
+        self._samples: Deque[CallSample] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def record(self, sample: CallSample) -> None:
+        """记录一条样本"""
+        with self._lock:
+            self._samples.append(sample)
+
+    def samples(
+        self, config_name: Optional[str] = None, method: Optional[str] = None
+    ) -> List[CallSample]:
+        """
+        查询样本
+
+        Args:
+            config_name: 只返回该配置的样本
+            method: 只返回该方法的样本
+
+        Returns:
+            List[CallSample]: 按记录顺序排列的样本
+        """
+        with self._lock:
+            samples = list(self._samples)
+        return [
+            s
+            for s in samples
+            if (config_name is None or s.config_name == config_name)
+            and (method is None or s.method == method)
+        ]
+
+    def percentiles(
+        self,
+        field: str,
+        config_name: Optional[str] = None,
+        method: Optional[str] = None,
+    ) -> Dict[str, Optional[float]]:
+        """
+        计算某个指标的 p50 / p95 / p99
+
+        失败的调用和缓存命中不计入延迟类指标。
+
+        Args:
+            field: 指标名称（queue_wait、time_to_first_token、latency、tokens_per_second）
+            config_name: 只统计该配置的样本
+            method: 只统计该方法的样本
+
+        Returns:
+            Dict[str, Optional[float]]: 包含 p50、p95、p99 的字典
+        """
+        values = [
+            getattr(s, field)
+            for s in self.samples(config_name, method)
+            if s.error is None and not s.cache_hit and getattr(s, field) is not None
+        ]
+        return {
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+        }
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        按配置名称汇总
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 以配置名称为键，包含调用数、错误数、缓存命中数、
+                重试数、token 总数以及各指标分位数
+        """
+        summary: Dict[str, Dict[str, Any]] = {}
+        for name in sorted({s.config_name for s in self.samples()}):
+            samples = self.samples(config_name=name)
+            summary[name] = {
+                "calls": len(samples),
+                "errors": sum(1 for s in samples if s.error),
+                "cache_hits": sum(1 for s in samples if s.cache_hit),
+                "retries": sum(1 for s in samples if s.retries),
+                "input_tokens": sum(s.input_tokens for s in samples),
+                "output_tokens": sum(s.output_tokens for s in samples),
+                **{f: self.percentiles(f, config_name=name) for f in self.FIELDS},
+            }
+        return summary
+
+    def dump_jsonl(self, path: str) -> int:
+        """
+        将缓冲区中的样本导出为 JSONL 文件（追加写入）
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            int: 导出的样本数
+        """
+        samples = self.samples()
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with target.open("a", encoding="utf-8") as f:
+            for sample in samples:
+                f.write(json.dumps(sample.to_record(), ensure_ascii=False) + "\n")
+        return len(samples)
+
+    def clear(self) -> None:
+        """清空缓冲区"""
+        with self._lock:
+            self._samples.clear()
+
+
+class CallTracker:
+    """
+    一次 LLM 调用的遥测上下文
+
+    由 track_llm_call 创建，调用过程中通过 current_call() 补充排队时间、
+    首 token 延迟、token 数和缓存命中等信息。
+    """
+
+    def __init__(self, config_name: str, model: str, method: str):
+        self.sample = CallSample(
+            config_name=config_name,
+            model=model,
+            method=method,
+            retries=max(current_attempt() - 1, 0),
+        )
+        self._start = time.perf_counter()
+        self._deferred = False
+        self._finished = False
+
+    def add_queue_wait(self, seconds: float) -> None:
+        """累加在本地限流器中排队的时间"""
+        self.sample.queue_wait += seconds
+
+    def first_token(self, at: Optional[float] = None) -> None:
+        """
+        记录首 token 时间（只记录第一次）
+
+        Args:
+            at: 首 token 到达时的 time.perf_counter() 值，默认为当前时间
+        """
+        if self.sample.time_to_first_token is None:
+            at = time.perf_counter() if at is None else at
+            self.sample.time_to_first_token = at - self._start
+
+    def set_tokens(self, input_tokens: int, output_tokens: int) -> None:
+        """记录本次调用的 token 数"""
+        self.sample.input_tokens = input_tokens
+        self.sample.output_tokens = output_tokens
+
+    def cache_hit(self) -> None:
+        """标记命中响应缓存"""
+        self.sample.cache_hit = True
+
+    def defer(self) -> None:
+        """
+        推迟到显式调用 finish() 时再记录
+
+        用于返回流对象的方法：方法返回时生成尚未结束。
+        """
+        self._deferred = True
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """结束本次调用并记录样本（重复调用无效）"""
+        if self._finished:
+            return
+        self._finished = True
+        self.sample.latency = time.perf_counter() - self._start
+        if error is not None:
+            self.sample.error = type(error).__name__
+        recorder = get_telemetry()
+        if recorder is not None:
+            recorder.record(self.sample)
+
+
+# 当前正在进行的 LLM 调用（asyncio 任务会继承创建时的上下文）
+_current_call: ContextVar[Optional[CallTracker]] = ContextVar(
+    "llm_current_call", default=None
+)
+
+
+def current_call() -> Optional[CallTracker]:
+    """
+    获取当前上下文中正在进行的 LLM 调用
+
+    Returns:
+        Optional[CallTracker]: 调用的遥测上下文，不在 LLM 调用中时返回 None
+    """
+    return _current_call.get()
+
+
+def track_llm_call(method: str) -> Callable:
+    """
+    为 LLM 的 async 方法记录遥测样本的装饰器
+
+    放在重试装饰器之内，每次尝试各记录一条样本。
+
+    Args:
+        method: 记录的方法名称
+
+    Returns:
+        Callable: 装饰器
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            call = CallTracker(
+                getattr(self, "config_name", "default"), self.model, method
+            )
+            token = _current_call.set(call)
+            # 每次尝试同时是一个追踪 span（未启用追踪时为空操作）
+            with span(f"llm.{method}", model=self.model) as llm_span:
+                try:
+                    result = await fn(self, *args, **kwargs)
+                except BaseException as e:
+                    call.finish(e)
+                    raise
+                finally:
+                    _current_call.reset(token)
+                    sample = call.sample
+                    llm_span.set(
+                        input_tokens=sample.input_tokens,
+                        output_tokens=sample.output_tokens,
+                        queue_wait=sample.queue_wait,
+                        retries=sample.retries,
+                        cache_hit=sample.cache_hit,
+                    )
+            if not call._deferred:
+                call.finish()
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+_telemetry: Optional[TelemetryRecorder] = None
+
+
+def get_telemetry() -> Optional[TelemetryRecorder]:
+    """
+    获取进程级的遥测缓冲区
+
+    Returns:
+        Optional[TelemetryRecorder]: 遥测缓冲区，[llm_telemetry] 未启用时返回 None
+    """
+    global _telemetry
+    settings = config.llm_telemetry or TelemetrySettings()
+    if not settings.enabled:
+        return None
+    if _telemetry is None:
+        _telemetry = TelemetryRecorder(settings.capacity)
+    return _telemetry
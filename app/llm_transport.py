@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM HTTP 连接池模块
+
+本模块维护进程级的 HTTP 传输注册表：同一个 API 源（scheme + host + port）
+只创建一个 httpx.AsyncClient，所有 LLM 配置（default、vision、manus 等）共享，
+并发的智能体可以复用已建立的 TLS 连接，而不必各自握手。
+
+连接池参数（最大连接数、keepalive、HTTP/2、超时）来自 config.toml 的 [http_pool]。
+每个连接池都带有统计信息：使用中 / 空闲连接数、请求数、等待连接的耗时。
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.config import HTTPPoolSettings, config
+from app.logger import logger
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    带统计的 HTTP 传输类
+
+    包装 httpx.AsyncHTTPTransport，利用 httpcore 的 trace 扩展记录每个请求
+    在连接池中排队等待的时间（从进入传输层到开始建立连接或发送请求头）。
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport):
+        """
+        初始化传输包装
+
+        Args:
+            transport: 实际发送请求的 httpx 传输
+        """
+        self._transport = transport
+        self.requests = 0
+        self.in_flight = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        """
+        处理请求并记录连接池等待时间
+
+        Args:
+            request: httpx 请求对象
+
+        Returns:
+            httpx.Response: 响应对象
+        """
+        start = time.perf_counter()
+        waited: Optional[float] = None
+        previous_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            nonlocal waited
+            # 新建连接（connect_tcp）或复用连接发送请求头时，排队结束
+            if waited is None and (
+                event_name == "connection.connect_tcp.started"
+                or event_name.endswith("send_request_headers.started")
+            ):
+                waited = time.perf_counter() - start
+            if previous_trace is not None:
+                await previous_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            return await self._transport.handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+            if waited is not None:
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    async def aclose(self) -> None:
+        """关闭底层传输及其所有连接"""
+        await self._transport.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取连接池统计信息
+
+        Returns:
+            Dict[str, Any]: 包含 connections、in_use、idle、in_flight、requests、
+                avg_wait、max_wait（秒）的字典
+        """
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "connections": len(connections),
+            "in_use": len(connections) - idle,
+            "idle": idle,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "avg_wait": self.total_wait / self.requests if self.requests else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+def _origin(base_url: str) -> str:
+    """
+    提取 URL 的源（scheme://host:port），作为连接池的注册键
+
+    Args:
+        base_url: API 基础 URL
+
+    Returns:
+        str: 规范化后的源字符串
+    """
+    url = httpx.URL(base_url)
+    port = url.port or (443 if url.scheme == "https" else 80)
+    return f"{url.scheme}://{url.host}:{port}"
+
+
+def _http2_available() -> bool:
+    """检查是否安装了 HTTP/2 所需的 h2 包"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# 进程级注册表：API 源 -> (共享客户端, 传输统计)
+_clients: Dict[str, httpx.AsyncClient] = {}
+_transports: Dict[str, InstrumentedTransport] = {}
+_registry_lock = threading.Lock()
+
+
+def get_http_client(
+    base_url: str, settings: Optional[HTTPPoolSettings] = None
+) -> httpx.AsyncClient:
+    """
+    获取指定 API 源的共享 httpx.AsyncClient
+
+    同一个源第一次调用时按配置创建客户端，之后的调用直接复用。
+
+    Args:
+        base_url: API 基础 URL
+        settings: 连接池配置，默认使用 config.http_pool
+
+    Returns:
+        httpx.AsyncClient: 共享的 HTTP 客户端
+    """
+    key = _origin(base_url)
+    with _registry_lock:
+        client = _clients.get(key)
+        if client is not None and not client.is_closed:
+            return client
+
+        settings = settings or config.http_pool
+        http2 = settings.http2
+        if http2 and not _http2_available():
+            logger.warning("未安装 h2 包，HTTP/2 不可用，回退到 HTTP/1.1（pip install httpx[http2]）")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry,
+        )
+        transport = InstrumentedTransport(
+            httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+        )
+        client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(
+                connect=settings.connect_timeout,
+                read=settings.read_timeout,
+                write=settings.write_timeout,
+                pool=settings.pool_timeout,
+            ),
+            follow_redirects=True,
+        )
+        _clients[key] = client
+        _transports[key] = transport
+        logger.debug(f"创建共享 HTTP 连接池: {key} (http2={http2})")
+        return client
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    获取所有共享连接池的统计信息
+
+    Returns:
+        Dict[str, Dict[str, Any]]: 以 API 源为键的统计信息字典
+    """
+    with _registry_lock:
+        return {key: transport.stats() for key, transport in _transports.items()}
+
+
+async def close_http_clients() -> None:
+    """关闭所有共享的 HTTP 客户端（通常在进程退出前调用）"""
+    with _registry_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        _transports.clear()
+    for client in clients:
+        await client.aclose()
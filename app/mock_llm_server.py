@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 Mock LLM 服务器
+
+一个兼容 OpenAI chat.completions 接口的本地替身服务，用于离线压测智能体循环：
+- 支持流式（SSE）和非流式响应，支持 stream_options.include_usage
+- 可编排：按对话步数（请求中 assistant 消息的数量）返回预设的文本或工具调用序列，
+  不依赖会话状态，数百个并发会话互不干扰
+- 可配置延迟分布（固定 / 均匀 / 对数正态），流式响应可单独配置首 token 延迟
+- 返回 token 用量（按字符数估算）
+- 可按比例注入 429（带 Retry-After）和 5xx 错误
+
+启动方式：
+    python -m app.mock_llm_server --port 8089 --scenario scenario.json
+
+然后在 config.toml 中把 base_url 指向 http://127.0.0.1:8089/v1 即可。
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+
+class LatencySpec(BaseModel):
+    """延迟分布配置（单位：秒）"""
+
+    distribution: Literal["fixed", "uniform", "lognormal"] = Field(
+        "fixed", description="分布类型"
+    )
+    mean: float = Field(0.0, description="fixed 的延迟值 / lognormal 的中位数")
+    low: float = Field(0.0, description="uniform 的下限")
+    high: float = Field(0.0, description="uniform 的上限")
+    sigma: float = Field(0.5, description="lognormal 的形状参数，越大长尾越明显")
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        按分布采样一次延迟
+
+        Args:
+            rng: 随机数生成器
+
+        Returns:
+            float: 延迟秒数
+        """
+        if self.distribution == "uniform":
+            return rng.uniform(self.low, self.high)
+        if self.distribution == "lognormal":
+            if self.mean <= 0:
+                return 0.0
+            return rng.lognormvariate(0, self.sigma) * self.mean
+        return self.mean
+
+
+class MockToolCall(BaseModel):
+    """预设的工具调用"""
+
+    name: str = Field(..., description="工具名称")
+    arguments: Dict[str, Any] = Field(default_factory=dict, description="工具参数")
+
+
+class MockStep(BaseModel):
+    """对话中某一步的预设响应"""
+
+    content: Optional[str] = Field(None, description="回复文本")
+    tool_calls: List[MockToolCall] = Field(default_factory=list, description="工具调用")
+
+
+class MockScenario(BaseModel):
+    """
+    Mock 服务器的场景配置
+
+    steps 按对话步数依次使用：第 N 次请求（请求中已有 N 条 assistant 消息）
+    返回 steps[N]。超出 steps 后，如果请求中带有 terminate 工具则调用它结束任务，
+    否则返回 final_content。
+    """
+
+    steps: List[MockStep] = Field(default_factory=list, description="按步数排列的预设响应")
+    final_content: str = Field("Task completed.", description="超出预设步数后的回复文本")
+    latency: LatencySpec = Field(
+        default_factory=LatencySpec, description="非流式响应的总延迟 / 流式响应的首 token 延迟"
+    )
+    chunk_delay: float = Field(0.0, description="流式响应相邻 chunk 之间的延迟（秒）")
+    rate_limit_rate: float = Field(0.0, description="返回 429 的概率（0-1）")
+    retry_after: float = Field(1.0, description="429 响应的 Retry-After（秒）")
+    server_error_rate: float = Field(0.0, description="返回 500 的概率（0-1）")
+    seed: Optional[int] = Field(None, description="随机种子，用于复现延迟和错误注入")
+
+
+def estimate_tokens(text: str) -> int:
+    """按约 4 个字符一个 token 粗略估算 token 数"""
+    return max(1, len(text) // 4) if text else 0
+
+
+class MockLLMServer:
+    """
+    Mock LLM 服务器
+
+    使用示例：
+        server = MockLLMServer(MockScenario(steps=[...]))
+        app = server.app  # FastAPI 应用，可交给 uvicorn 或 httpx.ASGITransport
+    """
+
+    def __init__(self, scenario: Optional[MockScenario] = None):
+        """
+        初始化服务器
+
+        Args:
+            scenario: 场景配置，默认为直接结束任务的空场景
+        """
+        self.scenario = scenario or MockScenario()
+        self.rng = random.Random(self.scenario.seed)
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "streaming": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+        }
+        self.app = FastAPI(title="Mock LLM Server")
+        self.app.post("/v1/chat/completions")(self.chat_completions)
+        self.app.post("/chat/completions")(self.chat_completions)
+        self.app.get("/v1/models")(self.models)
+        self.app.get("/stats")(self.get_stats)
+
+    def _pick_step(self, body: Dict[str, Any]) -> MockStep:
+        """根据请求中 assistant 消息的数量选择本步的预设响应"""
+        messages = body.get("messages", [])
+        step = sum(1 for m in messages if m.get("role") == "assistant")
+        if step < len(self.scenario.steps):
+            return self.scenario.steps[step]
+        tool_names = {
+            tool.get("function", {}).get("name") for tool in body.get("tools") or []
+        }
+        if "terminate" in tool_names:
+            return MockStep(
+                content=self.scenario.final_content,
+                tool_calls=[
+                    MockToolCall(name="terminate", arguments={"status": "success"})
+                ],
+            )
+        return MockStep(content=self.scenario.final_content)
+
+    def _usage(self, body: Dict[str, Any], step: MockStep) -> Dict[str, int]:
+        """估算本次请求的 token 用量"""
+        prompt = json.dumps(body.get("messages", []), ensure_ascii=False)
+        if body.get("tools"):
+            prompt += json.dumps(body["tools"], ensure_ascii=False)
+        completion = (step.content or "") + "".join(
+            json.dumps(call.arguments) for call in step.tool_calls
+        )
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(completion)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _injected_error(self) -> Optional[JSONResponse]:
+        """按配置的概率注入 429 / 500 错误"""
+        roll = self.rng.random()
+        if roll < self.scenario.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            return JSONResponse(
+                {
+                    "error": {
+                        "message": "Rate limit exceeded (mock)",
+                        "type": "rate_limit",
+                    }
+                },
+                status_code=429,
+                headers={"retry-after": str(self.scenario.retry_after)},
+            )
+        if roll < self.scenario.rate_limit_rate + self.scenario.server_error_rate:
+            self.stats["server_errors"] += 1
+            return JSONResponse(
+                {
+                    "error": {
+                        "message": "Internal server error (mock)",
+                        "type": "server",
+                    }
+                },
+                status_code=500,
+            )
+        return None
+
+    async def chat_completions(self, request: Request):
+        """处理 POST /v1/chat/completions"""
+        body = await request.json()
+        self.stats["requests"] += 1
+
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        step = self._pick_step(body)
+        usage = self._usage(body, step)
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "mock-model")
+        tool_calls = [
+            {
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {
+                    "name": call.name,
+                    "arguments": json.dumps(call.arguments),
+                },
+            }
+            for call in step.tool_calls
+        ]
+
+        delay = self.scenario.latency.sample(self.rng)
+        if body.get("stream"):
+            self.stats["streaming"] += 1
+            include_usage = bool(
+                (body.get("stream_options") or {}).get("include_usage")
+            )
+            return StreamingResponse(
+                self._stream(
+                    completion_id,
+                    model,
+                    step.content,
+                    tool_calls,
+                    usage,
+                    delay,
+                    include_usage,
+                ),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(delay)
+        message: Dict[str, Any] = {"role": "assistant", "content": step.content}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if tool_calls else "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    async def _stream(
+        self,
+        completion_id: str,
+        model: str,
+        content: Optional[str],
+        tool_calls: List[Dict[str, Any]],
+        usage: Dict[str, int],
+        first_token_delay: float,
+        include_usage: bool,
+    ) -> AsyncIterator[str]:
+        """生成 SSE 格式的流式响应"""
+        created = int(time.time())
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        await asyncio.sleep(first_token_delay)
+        yield chunk({"role": "assistant", "content": ""})
+
+        # 文本按词切分输出
+        for word in (content or "").split(" ") if content else []:
+            yield chunk({"content": word + " "})
+            await asyncio.sleep(self.scenario.chunk_delay)
+
+        # 工具调用：先输出 id 和名称，再把参数分两段输出
+        for index, call in enumerate(tool_calls):
+            arguments = call["function"]["arguments"]
+            middle = len(arguments) // 2
+            yield chunk(
+                {
+                    "tool_calls": [
+                        {
+                            "index": index,
+                            "id": call["id"],
+                            "type": "function",
+                            "function": {
+                                "name": call["function"]["name"],
+                                "arguments": "",
+                            },
+                        }
+                    ]
+                }
+            )
+            for part in (arguments[:middle], arguments[middle:]):
+                await asyncio.sleep(self.scenario.chunk_delay)
+                yield chunk(
+                    {"tool_calls": [{"index": index, "function": {"arguments": part}}]}
+                )
+
+        yield chunk({}, "tool_calls" if tool_calls else "stop")
+        if include_usage:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": usage,
+            }
+            yield f"data: {json.dumps(payload)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def models(self):
+        """处理 GET /v1/models"""
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model"}]}
+
+    async def get_stats(self):
+        """处理 GET /stats：返回请求和错误注入计数"""
+        return self.stats
+
+
+def load_scenario(path: Optional[str]) -> MockScenario:
+    """
+    从 JSON 文件加载场景配置
+
+    Args:
+        path: 场景文件路径，None 表示使用默认场景
+
+    Returns:
+        MockScenario: 场景配置
+    """
+    if not path:
+        return MockScenario()
+    return MockScenario.model_validate_json(Path(path).read_text(encoding="utf-8"))
+
+
+def main() -> None:
+    """命令行入口：启动 Mock LLM 服务器"""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地 Mock LLM 服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8089, help="监听端口")
+    parser.add_argument("--scenario", default=None, help="场景配置 JSON 文件路径")
+    args = parser.parse_args()
+
+    server = MockLLMServer(load_scenario(args.scenario))
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ from typing import Dict, Optional, Protocol
 
 from app.config import SandboxSettings
 from app.sandbox.core.sandbox import DockerSandbox
+from app.tracing import span
 
 
 class SandboxFileOperations(Protocol):
@@ -122,7 +123,10 @@ class LocalSandboxClient(BaseSandboxClient):
         """
         if not self.sandbox:
             raise RuntimeError("Sandbox not initialized")
-        return await self.sandbox.run_command(command, timeout)
+        with span("sandbox.run_command", command=command[:200]) as s:
+            output = await self.sandbox.run_command(command, timeout)
+            s.set(output_bytes=len(output))
+        return output
 
     async def copy_from(self, container_path: str, local_path: str) -> None:
         """Copies file from container to local.
@@ -136,7 +140,8 @@ class LocalSandboxClient(BaseSandboxClient):
         """
         if not self.sandbox:
             raise RuntimeError("Sandbox not initialized")
-        await self.sandbox.copy_from(container_path, local_path)
+        with span("sandbox.copy_from", path=container_path):
+            await self.sandbox.copy_from(container_path, local_path)
 
     async def copy_to(self, local_path: str, container_path: str) -> None:
         """Copies file from local to container.
@@ -150,7 +155,8 @@ class LocalSandboxClient(BaseSandboxClient):
         """
         if not self.sandbox:
             raise RuntimeError("Sandbox not initialized")
-        await self.sandbox.copy_to(local_path, container_path)
+        with span("sandbox.copy_to", path=container_path):
+            await self.sandbox.copy_to(local_path, container_path)
 
     async def read_file(self, path: str) -> str:
         """Reads file from container.
@@ -166,7 +172,10 @@ class LocalSandboxClient(BaseSandboxClient):
         """
         if not self.sandbox:
             raise RuntimeError("Sandbox not initialized")
-        return await self.sandbox.read_file(path)
+        with span("sandbox.read_file", path=path) as s:
+            content = await self.sandbox.read_file(path)
+            s.set(bytes=len(content))
+        return content
 
     async def write_file(self, path: str, content: str) -> None:
         """Writes file to container.
@@ -180,7 +189,8 @@ class LocalSandboxClient(BaseSandboxClient):
         """
         if not self.sandbox:
             raise RuntimeError("Sandbox not initialized")
-        await self.sandbox.write_file(path, content)
+        with span("sandbox.write_file", path=path, bytes=len(content)):
+            await self.sandbox.write_file(path, content)
 
     async def cleanup(self) -> None:
         """Cleans up resources."""
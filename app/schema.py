@@ -8,14 +8,20 @@
 - ToolChoice: 工具选择模式枚举
 - AgentState: 智能体状态枚举
 - Message: 消息模型
+- MessageBuffer: 记忆的消息存储（支持切片的双端队列）
 - Memory: 记忆模型
 - ToolCall: 工具调用模型
 """
 
+import hashlib
+import json
+import weakref
+from collections import deque
 from enum import Enum
-from typing import Any, List, Literal, Optional, Union
+from itertools import islice
+from typing import Any, Callable, Dict, Hashable, List, Literal, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, field_serializer
 
 
 class Role(str, Enum):
@@ -125,6 +131,154 @@ class Message(BaseModel):
     base64_image: Optional[str] = Field(
         default=None, description="base64 编码的图片数据，用于视觉输入"
     )
+    # 图片存储中的引用（启用图片存储时，base64_image 会被移入存储，只保留该引用）
+    image_ref: Optional[str] = Field(
+        default=None, description="图片存储中的图片引用（内容哈希）"
+    )
+
+    # token 数缓存：键由计数方决定（如 tokenizer 名称 + 是否支持图片），任何字段被修改时失效
+    _token_cache: Dict[Hashable, int] = PrivateAttr(default_factory=dict)
+    # 格式化结果缓存：键由格式化方决定（如是否支持图片），任何字段被修改时失效
+    _format_cache: Dict[Hashable, dict] = PrivateAttr(default_factory=dict)
+    # 图片存储中的固定：消息存活期间其图片不会被淘汰，消息被回收时自动解除
+    _image_pin: Optional[weakref.finalize] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        """创建后将图片移入图片存储（或固定已有的图片引用）"""
+        if self.base64_image:
+            self._store_image(self.base64_image)
+        elif self.image_ref:
+            from app.image_store import get_image_store
+
+            store = get_image_store()
+            if store is not None:
+                store.pin(self.image_ref)
+                self._pin_image(store, self.image_ref)
+
+    def _store_image(self, base64_image: str) -> None:
+        """将图片存入图片存储并改为保存引用（未启用图片存储时保持原样）"""
+        from app.image_store import get_image_store
+
+        store = get_image_store()
+        if store is None:
+            return
+        ref = store.put(base64_image, pin=True)
+        self._pin_image(store, ref)
+        super().__setattr__("image_ref", ref)
+        super().__setattr__("base64_image", None)
+
+    def _pin_image(self, store: Any, ref: str) -> None:
+        """登记消息被回收时解除固定（替换图片时先解除之前的固定）"""
+        if self._image_pin is not None:
+            self._image_pin()
+        self._image_pin = weakref.finalize(self, store.unpin, ref)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """
+        设置属性（魔术方法）
+
+        修改任意消息字段后清空 token 数缓存和格式化结果缓存，保证缓存只在内容未变时有效。
+        """
+        super().__setattr__(name, value)
+        if name == "base64_image" and value:
+            self._store_image(value)
+        if name in type(self).model_fields:
+            if self._token_cache:
+                self._token_cache = {}
+            if self._format_cache:
+                self._format_cache = {}
+
+    def get_image(self) -> Optional[str]:
+        """
+        获取消息附带的图片
+
+        Returns:
+            Optional[str]: base64 编码的图片，没有图片或图片已被存储淘汰时返回 None
+        """
+        if self.base64_image is not None:
+            return self.base64_image
+        if self.image_ref is None:
+            return None
+        from app.image_store import get_image_store
+
+        store = get_image_store()
+        return store.get(self.image_ref) if store is not None else None
+
+    def get_cached_tokens(self, key: Hashable) -> Optional[int]:
+        """
+        获取缓存的 token 数
+
+        Args:
+            key: 缓存键，由计数方决定（如 tokenizer 名称 + 是否支持图片）
+
+        Returns:
+            Optional[int]: 缓存的 token 数，未缓存或消息已被修改时返回 None
+        """
+        return self._token_cache.get(key)
+
+    def set_cached_tokens(self, key: Hashable, count: int) -> None:
+        """
+        缓存 token 数
+
+        Args:
+            key: 缓存键
+            count: 该消息在此键下的 token 数
+        """
+        self._token_cache[key] = count
+
+    def get_cached_format(self, key: Hashable) -> Optional[dict]:
+        """
+        获取缓存的格式化结果（发送给 LLM 的消息字典）
+
+        Args:
+            key: 缓存键，由格式化方决定（如是否支持图片）
+
+        Returns:
+            Optional[dict]: 缓存的消息字典，未缓存或消息已被修改时返回 None
+        """
+        # 格式化请求时每条历史消息都会调用，直接读取私有属性字典，
+        # 绕过 BaseModel.__getattr__ 的查找开销
+        return self.__pydantic_private__["_format_cache"].get(key)
+
+    def set_cached_format(self, key: Hashable, formatted: dict) -> None:
+        """
+        缓存格式化结果
+
+        缓存的字典会在之后的请求中直接复用，调用方不应修改它。
+
+        Args:
+            key: 缓存键
+            formatted: 该消息在此键下的格式化结果
+        """
+        self._format_cache[key] = formatted
+
+    def fingerprint(self) -> Optional[str]:
+        """
+        计算消息的内容指纹（用于检测重复响应）
+
+        有工具调用时只按工具名称和参数计算（参数按键排序），
+        思考文本不同但重复同一调用也视为重复；否则按规范化后的文本
+        （去除首尾空白、合并空白、忽略大小写）计算。
+
+        Returns:
+            Optional[str]: 指纹，消息既没有内容也没有工具调用时返回 None
+        """
+        if self.tool_calls:
+            parts = []
+            for call in self.tool_calls:
+                try:
+                    arguments = json.dumps(
+                        json.loads(call.function.arguments or "{}"), sort_keys=True
+                    )
+                except json.JSONDecodeError:
+                    arguments = call.function.arguments
+                parts.append(f"{call.function.name}:{arguments}")
+            key = "tool_calls\n" + "\n".join(parts)
+        elif self.content:
+            key = " ".join(self.content.split()).lower()
+        else:
+            return None
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
 
     def __add__(self, other) -> List["Message"]:
         """
@@ -219,6 +373,8 @@ class Message(BaseModel):
             message["tool_call_id"] = self.tool_call_id
         if self.base64_image is not None:
             message["base64_image"] = self.base64_image
+        if self.image_ref is not None:
+            message["image_ref"] = self.image_ref
         return message
 
     @classmethod
@@ -361,6 +517,41 @@ class Message(BaseModel):
         )
 
 
+class MessageBuffer(deque):
+    """
+    消息双端队列
+
+    Memory 的消息存储：两端追加和弹出都是常数时间，裁剪最旧消息时不必移动其余消息。
+    额外支持切片读取（返回列表）和与列表比较，调用方可以像使用列表一样使用它。
+    """
+
+    def __getitem__(self, index):
+        """
+        按下标或切片读取
+
+        切片从离它较近的一端遍历，读取最近的几条消息不必遍历整个队列。
+        """
+        if not isinstance(index, slice):
+            return super().__getitem__(index)
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            return list(self)[index]
+        if stop <= start:
+            return []
+        if start > len(self) - stop:
+            tail = list(islice(reversed(self), len(self) - stop, len(self) - start))
+            tail.reverse()
+            return tail
+        return list(islice(self, start, stop))
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, list):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return super().__eq__(other)
+
+    __hash__ = None
+
+
 class Memory(BaseModel):
     """
     记忆模型
@@ -369,7 +560,7 @@ class Memory(BaseModel):
     提供消息的添加、查询、清理等功能，并支持消息数量限制。
     """
 
-    # 消息列表，按时间顺序存储所有对话消息
+    # 消息列表，按时间顺序存储所有对话消息（创建和赋值后保存为 MessageBuffer）
     messages: List[Message] = Field(
         default_factory=list, description="存储的消息列表"
     )
@@ -378,6 +569,137 @@ class Memory(BaseModel):
         default=100, description="最大消息数量，用于限制记忆大小"
     )
 
+    # 增量 token 计数状态：当前计数键、累计 token 数、已计入总数的消息条数
+    _token_key: Optional[Hashable] = PrivateAttr(default=None)
+    _token_total: int = PrivateAttr(default=0)
+    _token_counted: int = PrivateAttr(default=0)
+
+    # 最近一条助手消息的指纹，以及它连续重复之前助手消息的次数，用于常数时间的重复检测
+    _last_fingerprint: Optional[str] = PrivateAttr(default=None)
+    _repeat_run: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context: Any) -> None:
+        """创建后将初始消息转为 MessageBuffer，并建立重复检测状态"""
+        self.messages = self.messages
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """
+        设置属性（魔术方法）
+
+        整体替换 messages 列表时，转为 MessageBuffer，重置增量 token 计数并重建重复检测状态。
+        """
+        if name == "messages" and not isinstance(value, MessageBuffer):
+            value = MessageBuffer(value)
+        super().__setattr__(name, value)
+        if name == "messages":
+            self._reset_token_count()
+            self._rebuild_fingerprints()
+
+    @field_serializer("messages")
+    def _serialize_messages(self, messages: MessageBuffer) -> List[Message]:
+        """序列化时按列表输出消息"""
+        return list(messages)
+
+    def _record_fingerprint(self, message: Message) -> None:
+        """记录助手消息的指纹：与上一条助手消息相同则延长连续重复次数，否则重新计数"""
+        if message.role != Role.ASSISTANT:
+            return
+        fingerprint = message.fingerprint()
+        if fingerprint is not None and fingerprint == self._last_fingerprint:
+            self._repeat_run += 1
+        else:
+            self._repeat_run = 0
+        self._last_fingerprint = fingerprint
+
+    def _rebuild_fingerprints(self) -> None:
+        """从消息列表末尾向前重建连续重复状态（整体替换 messages 时调用）"""
+        self._last_fingerprint = None
+        self._repeat_run = 0
+        assistant = (m for m in reversed(self.messages) if m.role == Role.ASSISTANT)
+        last = next(assistant, None)
+        if last is None:
+            return
+        self._last_fingerprint = last.fingerprint()
+        if self._last_fingerprint is None:
+            return
+        for message in assistant:
+            if message.fingerprint() != self._last_fingerprint:
+                break
+            self._repeat_run += 1
+
+    def repeat_count(self) -> int:
+        """
+        最近一条助手消息连续重复之前助手消息的次数
+
+        只比较相邻的助手消息（中间的用户消息和工具结果不打断连续），
+        交替出现的不同响应不算重复。
+
+        Returns:
+            int: 连续重复次数，0 表示没有重复（或还没有助手消息）
+        """
+        return self._repeat_run
+
+    def _reset_token_count(self) -> None:
+        """重置增量 token 计数状态"""
+        self._token_key = None
+        self._token_total = 0
+        self._token_counted = 0
+
+    def _trim(self) -> None:
+        """
+        裁剪超出 max_messages 的最旧消息
+
+        按组淘汰：带 tool_calls 的助手消息与其后的工具结果作为一个整体，
+        淘汰后队首仍是工具结果时继续弹出，不会留下没有对应调用的工具结果
+        （服务端会拒绝这样的请求）。因此实际保留的消息可能略少于 max_messages。
+
+        从队首逐条弹出，开销只与被淘汰的消息数有关；同时从累计 token 数中扣除
+        被淘汰消息的 token，避免因裁剪而重新计算整个历史。
+        """
+        excess = len(self.messages) - self.max_messages
+        if excess <= 0:
+            return
+        while self.messages and (excess > 0 or self.messages[0].role == Role.TOOL):
+            message = self.messages.popleft()
+            excess -= 1
+            if self._token_counted == 0:
+                continue
+            tokens = message.get_cached_tokens(self._token_key)
+            if tokens is None:
+                # 消息在计数后被修改过，无法增量扣除，下次重新计数
+                self._reset_token_count()
+                continue
+            self._token_total -= tokens
+            self._token_counted -= 1
+
+    def count_tokens(
+        self, count_fn: Callable[[Message], int], cache_key: Hashable
+    ) -> int:
+        """
+        增量计算记忆中所有消息的 token 总数
+
+        维护一个累计总数，每次调用只对上次计数之后新增的消息调用 count_fn，
+        因此每步的开销只与新增消息数量有关，而不是整个历史长度。
+
+        Args:
+            count_fn: 计算单条消息 token 数的函数（通常带有按消息的缓存）
+            cache_key: 计数键，不同的 tokenizer / 格式化方式应使用不同的键，
+                键变化时会重新计数
+
+        Returns:
+            int: 所有消息的 token 总数（不含消息列表的格式开销）
+
+        说明：
+            已加入记忆的消息应视为不可变；如需修改其内容，请整体重新赋值 messages。
+        """
+        if cache_key != self._token_key or self._token_counted > len(self.messages):
+            self._reset_token_count()
+            self._token_key = cache_key
+        for message in self.messages[self._token_counted :]:
+            self._token_total += count_fn(message)
+        self._token_counted = len(self.messages)
+        return self._token_total
+
     def add_message(self, message: Message) -> None:
         """
         添加一条消息到记忆
@@ -393,9 +715,9 @@ class Memory(BaseModel):
             memory.add_message(Message.user_message("Hello"))
         """
         self.messages.append(message)
+        self._record_fingerprint(message)
         # 如果超过最大消息数量，只保留最新的消息
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+        self._trim()
 
     def add_messages(self, messages: List[Message]) -> None:
         """
@@ -414,9 +736,10 @@ class Memory(BaseModel):
             ])
         """
         self.messages.extend(messages)
+        for message in messages:
+            self._record_fingerprint(message)
         # 如果超过最大消息数量，只保留最新的消息
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+        self._trim()
 
     def clear(self) -> None:
         """
@@ -428,6 +751,8 @@ class Memory(BaseModel):
             memory.clear()  # 清空所有消息
         """
         self.messages.clear()
+        self._reset_token_count()
+        self._rebuild_fingerprints()
 
     def get_recent_messages(self, n: int) -> List[Message]:
         """
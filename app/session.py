@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话上下文模块
+
+一个进程中同时运行多个用户的智能体时，每个用户的可变状态需要相互隔离：
+- token 用量计数和 max_input_tokens 限额（LLM 按配置名称是进程级单例，
+  不使用会话时所有智能体共享同一组计数）
+- 规划工具的计划存储和当前计划（PlanningTool.plans / current_plan_id）
+- MCP 服务器连接（MCPClients），会话结束时统一断开
+
+而创建开销大、且不可变的资源（LLM 客户端和 HTTP 连接池、tokenizer、限流器）
+仍由所有会话共享。
+
+会话通过 ContextVar 传递：在 `async with session:` 中运行的代码，
+以及其中创建的 asyncio 任务，都会使用该会话的状态。
+
+使用示例：
+    async with Session("user-42", max_input_tokens=200_000) as session:
+        agent = await Manus.create()
+        await agent.run(prompt)
+    print(session.usage)
+"""
+
+import asyncio
+import uuid
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.logger import logger
+
+
+class TokenUsage(BaseModel):
+    """某个 LLM 配置的累计 token 用量"""
+
+    input_tokens: int = Field(0, description="累计输入 token 数")
+    completion_tokens: int = Field(0, description="累计输出 token 数")
+
+
+class Session:
+    """
+    一个用户会话拥有的可变状态
+
+    同一个会话对象可以被多次、并发地进入（如同一用户的多轮或并发请求），
+    用量和计划在多次进入之间保留；最后一个进入者退出时断开会话中建立的 MCP 连接。
+    """
+
+    def __init__(
+        self, session_id: Optional[str] = None, max_input_tokens: Optional[int] = None
+    ):
+        """
+        初始化会话
+
+        Args:
+            session_id: 会话标识，默认随机生成
+            max_input_tokens: 本会话的累计输入 token 上限，
+                为 None 时沿用 LLM 配置中的 max_input_tokens
+        """
+        self.session_id = session_id or uuid.uuid4().hex
+        self.max_input_tokens = max_input_tokens
+        self.usage: Dict[str, TokenUsage] = {}
+        self.plans: Dict[str, Dict[str, Any]] = {}
+        self.current_plan_id: Optional[str] = None
+        self._mcp_clients: List[Any] = []
+        # 每个任务各自的 ContextVar 重置令牌（同一会话可在多个任务中并发进入）
+        self._tokens: Dict[Optional[asyncio.Task], List[Token]] = {}
+        self._active = 0
+
+    def usage_for(self, config_name: str) -> TokenUsage:
+        """
+        获取某个 LLM 配置在本会话中的用量（不存在时创建）
+
+        Args:
+            config_name: LLM 配置名称
+
+        Returns:
+            TokenUsage: 用量计数
+        """
+        usage = self.usage.get(config_name)
+        if usage is None:
+            usage = self.usage[config_name] = TokenUsage()
+        return usage
+
+    def track_mcp_clients(self, clients: Any) -> None:
+        """
+        登记本会话中创建的 MCP 客户端集合，会话退出时统一断开
+
+        Args:
+            clients: MCPClients 实例
+        """
+        self._mcp_clients.append(clients)
+
+    async def close(self) -> None:
+        """断开本会话登记的所有 MCP 连接"""
+        clients, self._mcp_clients = self._mcp_clients, []
+        for client in clients:
+            if not client.sessions:
+                continue
+            try:
+                await client.disconnect()
+            except Exception as e:
+                logger.warning(f"会话 {self.session_id} 断开 MCP 连接失败: {e}")
+
+    async def __aenter__(self) -> "Session":
+        """激活会话"""
+        task = asyncio.current_task()
+        self._tokens.setdefault(task, []).append(_current_session.set(self))
+        self._active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        """恢复之前的会话，最后一个进入者退出时断开 MCP 连接"""
+        task = asyncio.current_task()
+        tokens = self._tokens[task]
+        _current_session.reset(tokens.pop())
+        if not tokens:
+            del self._tokens[task]
+        self._active -= 1
+        if self._active == 0:
+            await self.close()
+
+
+# 当前会话（asyncio 任务会继承创建时的上下文）
+_current_session: ContextVar[Optional[Session]] = ContextVar(
+    "current_session", default=None
+)
+
+
+def current_session() -> Optional[Session]:
+    """
+    获取当前上下文中的会话
+
+    Returns:
+        Optional[Session]: 当前会话，不在任何会话中时返回 None
+    """
+    return _current_session.get()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式输出接收器模块
+
+LLM 流式响应的每个文本增量都交给一个 StreamSink 处理，而不是直接 print 到标准输出：
+- PrintSink：打印到标准输出（命令行下的默认行为）
+- QueueSink：放入 asyncio.Queue，供 A2A 服务、MCP 服务或 Web UI 并发消费
+- CallbackSink：调用同步或异步回调
+- NullSink：丢弃输出
+
+接收器可以按调用传入（LLM.ask(..., sink=...)），也可以用 use_stream_sink()
+为当前上下文（如一个会话对应的 asyncio 任务）设置，不必层层传参。
+按调用传入的接收器在调用结束时关闭；上下文接收器由设置它的一方关闭。
+"""
+
+import asyncio
+import inspect
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional, Union
+
+
+class StreamSink(ABC):
+    """
+    流式输出接收器基类
+
+    子类实现 send() 处理文本增量，按需实现 reset() 处理重试、close() 处理流结束。
+    按调用传入的接收器（以及默认的 PrintSink）在该次 LLM 调用结束时（包括失败和取消）
+    由 LLM 关闭一次；用 use_stream_sink() 设置的上下文接收器会被多次调用复用，
+    由设置它的一方负责关闭。
+    """
+
+    @abstractmethod
+    async def send(self, delta: str) -> None:
+        """
+        接收一段文本增量
+
+        Args:
+            delta: 文本增量
+        """
+
+    async def reset(self) -> None:
+        """
+        本次尝试中途失败时调用：之前发送的增量作废，随后的增量可能来自重试
+        （默认什么也不做）
+        """
+
+    async def close(self) -> None:
+        """流结束时调用（默认什么也不做）"""
+
+
+class PrintSink(StreamSink):
+    """打印到标准输出的接收器（保持原有的命令行输出效果）"""
+
+    async def send(self, delta: str) -> None:
+        print(delta, end="", flush=True)
+
+    async def reset(self) -> None:
+        print("\n[stream interrupted, retrying]", flush=True)
+
+    async def close(self) -> None:
+        print()  # Newline after streaming
+
+
+class NullSink(StreamSink):
+    """丢弃所有输出的接收器"""
+
+    async def send(self, delta: str) -> None:
+        return None
+
+
+class QueueSink(StreamSink):
+    """
+    放入 asyncio.Queue 的接收器
+
+    流结束时（包括失败和取消）放入 None 作为结束标记；
+    尝试中途失败时放入 QueueSink.RESET，表示之前的增量作废。
+
+    使用示例：
+        sink = QueueSink()
+        task = asyncio.create_task(llm.ask(messages, sink=sink))
+        while (delta := await sink.queue.get()) is not None:
+            if delta is QueueSink.RESET:
+                await websocket.send_text("\n[retrying]\n")
+                continue
+            await websocket.send_text(delta)
+    """
+
+    RESET = object()
+
+    def __init__(self, queue: Optional[asyncio.Queue] = None):
+        """
+        初始化接收器
+
+        Args:
+            queue: 目标队列，默认创建一个无界队列
+        """
+        self.queue: asyncio.Queue = queue if queue is not None else asyncio.Queue()
+
+    async def send(self, delta: str) -> None:
+        await self.queue.put(delta)
+
+    async def reset(self) -> None:
+        await self.queue.put(self.RESET)
+
+    async def close(self) -> None:
+        await self.queue.put(None)
+
+
+class CallbackSink(StreamSink):
+    """调用回调函数的接收器（回调可以是同步或异步函数）"""
+
+    def __init__(
+        self,
+        on_delta: Callable[[str], Union[None, Awaitable[None]]],
+        on_close: Optional[Callable[[], Union[None, Awaitable[None]]]] = None,
+        on_reset: Optional[Callable[[], Union[None, Awaitable[None]]]] = None,
+    ):
+        """
+        初始化接收器
+
+        Args:
+            on_delta: 每段文本增量调用的回调
+            on_close: 流结束时调用的回调
+            on_reset: 尝试中途失败、之前的增量作废时调用的回调
+        """
+        self.on_delta = on_delta
+        self.on_close = on_close
+        self.on_reset = on_reset
+
+    @staticmethod
+    async def _call(fn: Callable[..., Any], *args: Any) -> None:
+        result = fn(*args)
+        if inspect.isawaitable(result):
+            await result
+
+    async def send(self, delta: str) -> None:
+        await self._call(self.on_delta, delta)
+
+    async def reset(self) -> None:
+        if self.on_reset is not None:
+            await self._call(self.on_reset)
+
+    async def close(self) -> None:
+        if self.on_close is not None:
+            await self._call(self.on_close)
+
+
+# 当前上下文的默认接收器（asyncio 任务会继承创建时的上下文）
+_current_sink: ContextVar[Optional[StreamSink]] = ContextVar(
+    "stream_sink", default=None
+)
+
+
+def current_stream_sink() -> Optional[StreamSink]:
+    """
+    获取当前上下文的接收器
+
+    Returns:
+        Optional[StreamSink]: use_stream_sink() 设置的接收器，未设置时为 None
+    """
+    return _current_sink.get()
+
+
+def get_stream_sink(sink: Optional[StreamSink] = None) -> StreamSink:
+    """
+    获取本次调用使用的接收器
+
+    Args:
+        sink: 调用方显式传入的接收器
+
+    Returns:
+        StreamSink: 显式传入的接收器，其次是当前上下文的接收器，默认为 PrintSink
+    """
+    return sink or current_stream_sink() or PrintSink()
+
+
+@contextmanager
+def use_stream_sink(sink: StreamSink) -> Iterator[StreamSink]:
+    """
+    为当前上下文设置默认接收器
+
+    上下文内的多次 LLM 调用共用该接收器，调用结束时不会关闭它；
+    由调用方在全部调用完成后自行关闭。
+
+    Args:
+        sink: 接收器
+
+    使用示例：
+        sink = QueueSink(session_queue)
+        try:
+            with use_stream_sink(sink):
+                await agent.run(prompt)
+        finally:
+            await sink.close()
+    """
+    token = _current_sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _current_sink.reset(token)
@@ -1,5 +1,6 @@
 from app.tool.base import BaseTool
 from app.tool.bash import Bash
+from app.tool.blob_reader import BlobReader
 from app.tool.browser_use_tool import BrowserUseTool
 from app.tool.crawl4ai import Crawl4aiTool
 from app.tool.create_chat_completion import CreateChatCompletion
@@ -14,6 +15,7 @@ from app.tool.web_search import WebSearch
 __all__ = [
     "BaseTool",
     "Bash",
+    "BlobReader",
     "BrowserUseTool",
     "DatabaseTool",
     "Terminate",
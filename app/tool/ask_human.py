@@ -16,6 +16,7 @@ class AskHuman(BaseTool):
         },
         "required": ["inquire"],
     }
+    parallel_safe: bool = False  # 需要等待用户逐个回答
 
     async def execute(self, inquire: str) -> str:
         return input(f"""Bot: {inquire}\n\nYou: """).strip()
@@ -203,6 +203,10 @@ class BaseTool(ABC, BaseModel):
     parameters: Optional[dict] = Field(
         default=None, description="工具参数的 JSON Schema，定义参数类型和格式"
     )
+    # 是否可以与其他工具调用并发执行（共享会话、浏览器等状态的工具应设为 False）
+    parallel_safe: bool = Field(
+        default=True, description="同一步中的多个调用是否可以并发执行"
+    )
 
     class Config:
         """
@@ -271,6 +275,50 @@ class BaseTool(ABC, BaseModel):
                     return self.fail_response(f"写入失败: {str(e)}")
         """
 
+    def concurrency_key(self, **kwargs) -> Optional[str]:
+        """
+        获取本次调用的并发互斥键
+
+        同一步中互斥键相同的工具调用按原始顺序依次执行，其余调用并发执行。
+        默认：parallel_safe 为 False 时以工具名称为键（该工具的调用全部串行），
+        否则返回 None（不互斥）。子类可以按参数细分，如按文件路径互斥。
+
+        Args:
+            **kwargs: 本次调用的参数
+
+        Returns:
+            Optional[str]: 互斥键，None 表示可以与任何调用并发执行
+        """
+        return None if self.parallel_safe else self.name
+
+    def checkpoint_state(self) -> Optional[Dict[str, Any]]:
+        """
+        获取需要写入智能体检查点的工具状态
+
+        默认返回 None（无状态）。有跨步骤状态的工具（如编辑历史、计划存储）
+        返回可 JSON 序列化的字典，恢复时传给 restore_state。
+
+        Returns:
+            Optional[Dict[str, Any]]: 工具状态
+        """
+        return None
+
+    def restore_state(self, state: Dict[str, Any]) -> None:
+        """
+        从检查点恢复工具状态
+
+        Args:
+            state: checkpoint_state 返回的状态
+        """
+
+    async def reset(self) -> None:
+        """
+        清除跨请求的状态（智能体被放回智能体池、准备服务下一个请求时调用）
+
+        默认不做任何事。保存了用户数据的工具（编辑历史、浏览器页面等）需要覆盖此方法，
+        而可以复用的昂贵资源（连接、进程）应当保留。
+        """
+
     def to_param(self) -> Dict:
         """
         将工具转换为函数调用格式
@@ -129,6 +129,8 @@ class Bash(BaseTool):
         "required": ["command"],
     }
 
+    parallel_safe: bool = False  # 所有调用共享同一个 shell 会话
+
     _session: Optional[_BashSession] = None
 
     async def execute(
@@ -0,0 +1,72 @@
+import asyncio
+from typing import Optional
+
+from app.blob_store import get_blob_store
+from app.exceptions import ToolError
+from app.tool.base import BaseTool, ToolResult
+
+_BLOB_READER_DESCRIPTION = """Read a tool output that was too long to show in full.
+Long outputs are replaced by a head/tail preview that names a blob id. Use this tool to read
+any character range of the stored output, or to grep it for lines matching a regular expression.
+Grep results include each line's character offset, which can be passed to `read` as `offset`."""
+
+
+class BlobReader(BaseTool):
+    name: str = "read_blob"
+    description: str = _BLOB_READER_DESCRIPTION
+    parameters: dict = {
+        "type": "object",
+        "properties": {
+            "command": {
+                "type": "string",
+                "enum": ["read", "grep"],
+                "description": "`read` returns a character range, `grep` returns matching lines.",
+            },
+            "blob_id": {
+                "type": "string",
+                "description": "The blob id named in the truncated output.",
+            },
+            "offset": {
+                "type": "integer",
+                "description": "(read) Start character offset; negative values count from the end. Default 0.",
+            },
+            "length": {
+                "type": "integer",
+                "description": "(read) Number of characters to return. Defaults to the maximum allowed.",
+            },
+            "pattern": {
+                "type": "string",
+                "description": "(grep) Regular expression to search for.",
+            },
+            "context": {
+                "type": "integer",
+                "description": "(grep) Lines of context to show around each match. Default 0.",
+            },
+        },
+        "required": ["command", "blob_id"],
+    }
+
+    async def execute(
+        self,
+        command: str,
+        blob_id: str,
+        offset: int = 0,
+        length: Optional[int] = None,
+        pattern: Optional[str] = None,
+        context: int = 0,
+    ) -> ToolResult:
+        """Read a range of a stored output or grep it"""
+        store = get_blob_store()
+        if store is None:
+            raise ToolError("Blob store is disabled")
+        if command == "read":
+            output = await asyncio.to_thread(store.read, blob_id, offset, length)
+        elif command == "grep":
+            if not pattern:
+                raise ToolError("Parameter `pattern` is required for command: grep")
+            output = await asyncio.to_thread(store.grep, blob_id, pattern, context)
+        else:
+            raise ToolError(
+                f"Unrecognized command {command}. Allowed commands: read, grep"
+            )
+        return ToolResult(output=output)
@@ -14,6 +14,7 @@ from app.config import config
 from app.llm import LLM
 from app.tool.base import BaseTool, ToolResult
 from app.tool.web_search import WebSearch
+from app.tracing import span
 
 
 _BROWSER_DESCRIPTION = """\
@@ -120,6 +121,7 @@ class BrowserUseTool(BaseTool, Generic[Context]):
             "extract_content": ["goal"],
         },
     }
+    parallel_safe: bool = False  # 所有调用操作同一个浏览器页面
 
     lock: asyncio.Lock = Field(default_factory=asyncio.Lock)
     browser: Optional[BrowserUseBrowser] = Field(default=None, exclude=True)
@@ -220,6 +222,36 @@ class BrowserUseTool(BaseTool, Generic[Context]):
         Returns:
             ToolResult with the action's output or error
         """
+        with span(f"browser.{action}", url=url):
+            return await self._execute_action(
+                action,
+                url=url,
+                index=index,
+                text=text,
+                scroll_amount=scroll_amount,
+                tab_id=tab_id,
+                query=query,
+                goal=goal,
+                keys=keys,
+                seconds=seconds,
+                **kwargs,
+            )
+
+    async def _execute_action(
+        self,
+        action: str,
+        url: Optional[str] = None,
+        index: Optional[int] = None,
+        text: Optional[str] = None,
+        scroll_amount: Optional[int] = None,
+        tab_id: Optional[int] = None,
+        query: Optional[str] = None,
+        goal: Optional[str] = None,
+        keys: Optional[str] = None,
+        seconds: Optional[int] = None,
+        **kwargs,
+    ) -> ToolResult:
+        """Perform a browser action (called by execute inside its trace span)."""
         async with self.lock:
             try:
                 context = await self._ensure_browser_initialized()
@@ -549,6 +581,14 @@ Page content:
                 await self.browser.close()
                 self.browser = None
 
+    async def reset(self) -> None:
+        """Close the browser context (pages, cookies) but keep the browser process."""
+        async with self.lock:
+            if self.context is not None:
+                await self.context.close()
+                self.context = None
+                self.dom_service = None
+
     def __del__(self):
         """Ensure cleanup when object is destroyed."""
         if self.browser is not None or self.context is not None:
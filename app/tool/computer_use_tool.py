@@ -176,6 +176,7 @@ class ComputerUseTool(SandboxToolsBase):
             "screenshot": [],
         },
     }
+    parallel_safe: bool = False  # 所有调用操作同一个桌面
     session: Optional[aiohttp.ClientSession] = Field(default=None, exclude=True)
     mouse_x: int = Field(default=0, exclude=True)
     mouse_y: int = Field(default=0, exclude=True)
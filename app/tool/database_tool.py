@@ -17,6 +17,7 @@ import pymysql
 from pymysql.cursors import DictCursor
 
 from app.tool.base import BaseTool, ToolResult
+from app.tracing import span
 from app.utils.logger import logger
 
 
@@ -137,6 +138,15 @@ class DatabaseTool(BaseTool):
         Returns:
             ToolResult: 操作结果
         """
+        with span(f"db.{action}", table=kwargs.get("table")) as db_span:
+            result = await self._dispatch(action, **kwargs)
+            db_span.set(
+                result_chars=len(result.output or ""), error=result.error is not None
+            )
+        return result
+
+    async def _dispatch(self, action: str, **kwargs) -> ToolResult:
+        """按操作类型分派到具体的实现"""
         try:
             if action == "query":
                 return await self._query(**kwargs)
@@ -7,6 +7,7 @@ from mcp.client.stdio import stdio_client
 from mcp.types import ListToolsResult, TextContent
 
 from app.logger import logger
+from app.session import current_session
 from app.tool.base import BaseTool, ToolResult
 from app.tool.tool_collection import ToolCollection
 
@@ -39,13 +40,18 @@ class MCPClients(ToolCollection):
     A collection of tools that connects to multiple MCP servers and manages available tools through the Model Context Protocol.
     """
 
-    sessions: Dict[str, ClientSession] = {}
-    exit_stacks: Dict[str, AsyncExitStack] = {}
     description: str = "MCP client tools for server interaction"
 
     def __init__(self):
         super().__init__()  # Initialize with empty tools list
         self.name = "mcp"  # Keep name for backward compatibility
+        # Per-instance connection state, so concurrent agents never share sessions
+        self.sessions: Dict[str, ClientSession] = {}
+        self.exit_stacks: Dict[str, AsyncExitStack] = {}
+        # Connections left open are closed when the current session exits
+        session = current_session()
+        if session is not None:
+            session.track_mcp_clients(self)
 
     async def connect_sse(self, server_url: str, server_id: str = "") -> None:
         """Connect to an MCP server using SSE transport."""
@@ -1,7 +1,10 @@
 # tool/planning.py
 from typing import Dict, List, Literal, Optional
 
+from pydantic import PrivateAttr
+
 from app.exceptions import ToolError
+from app.session import current_session
 from app.tool.base import BaseTool, ToolResult
 
 
@@ -66,8 +69,30 @@ class PlanningTool(BaseTool):
         "additionalProperties": False,
     }
 
-    plans: dict = {}  # Dictionary to store plans by plan_id
-    _current_plan_id: Optional[str] = None  # Track the current active plan
+    # Plans by plan_id and the active plan id used outside sessions
+    # (inside a session the session owns them)
+    _plans: Dict[str, Dict] = PrivateAttr(default_factory=dict)
+    _current_plan_id: Optional[str] = PrivateAttr(default=None)
+
+    @property
+    def plans(self) -> Dict[str, Dict]:
+        """Plans by plan_id, resolved on each access so a reused tool follows the current session."""
+        session = current_session()
+        return session.plans if session is not None else self._plans
+
+    @property
+    def current_plan_id(self) -> Optional[str]:
+        """The active plan id, resolved the same way as plans."""
+        session = current_session()
+        return session.current_plan_id if session is not None else self._current_plan_id
+
+    @current_plan_id.setter
+    def current_plan_id(self, plan_id: Optional[str]) -> None:
+        session = current_session()
+        if session is not None:
+            session.current_plan_id = plan_id
+        else:
+            self._current_plan_id = plan_id
 
     async def execute(
         self,
@@ -151,7 +176,7 @@ class PlanningTool(BaseTool):
         }
 
         self.plans[plan_id] = plan
-        self._current_plan_id = plan_id  # Set as active plan
+        self.current_plan_id = plan_id  # Set as active plan
 
         return ToolResult(
             output=f"Plan created successfully with ID: {plan_id}\n\n{self._format_plan(plan)}"
@@ -215,7 +240,7 @@ class PlanningTool(BaseTool):
 
         output = "Available plans:\n"
         for plan_id, plan in self.plans.items():
-            current_marker = " (active)" if plan_id == self._current_plan_id else ""
+            current_marker = " (active)" if plan_id == self.current_plan_id else ""
             completed = sum(
                 1 for status in plan["step_statuses"] if status == "completed"
             )
@@ -229,11 +254,11 @@ class PlanningTool(BaseTool):
         """Get details of a specific plan."""
         if not plan_id:
             # If no plan_id is provided, use the current active plan
-            if not self._current_plan_id:
+            if not self.current_plan_id:
                 raise ToolError(
                     "No active plan. Please specify a plan_id or set an active plan."
                 )
-            plan_id = self._current_plan_id
+            plan_id = self.current_plan_id
 
         if plan_id not in self.plans:
             raise ToolError(f"No plan found with ID: {plan_id}")
@@ -249,7 +274,7 @@ class PlanningTool(BaseTool):
         if plan_id not in self.plans:
             raise ToolError(f"No plan found with ID: {plan_id}")
 
-        self._current_plan_id = plan_id
+        self.current_plan_id = plan_id
         return ToolResult(
             output=f"Plan '{plan_id}' is now the active plan.\n\n{self._format_plan(self.plans[plan_id])}"
         )
@@ -264,11 +289,11 @@ class PlanningTool(BaseTool):
         """Mark a step with a specific status and optional notes."""
         if not plan_id:
             # If no plan_id is provided, use the current active plan
-            if not self._current_plan_id:
+            if not self.current_plan_id:
                 raise ToolError(
                     "No active plan. Please specify a plan_id or set an active plan."
                 )
-            plan_id = self._current_plan_id
+            plan_id = self.current_plan_id
 
         if plan_id not in self.plans:
             raise ToolError(f"No plan found with ID: {plan_id}")
@@ -314,11 +339,28 @@ class PlanningTool(BaseTool):
         del self.plans[plan_id]
 
         # If the deleted plan was the active plan, clear the active plan
-        if self._current_plan_id == plan_id:
-            self._current_plan_id = None
+        if self.current_plan_id == plan_id:
+            self.current_plan_id = None
 
         return ToolResult(output=f"Plan '{plan_id}' has been deleted.")
 
+    def checkpoint_state(self) -> Optional[Dict]:
+        """Plans and the active plan id, restored when an agent resumes."""
+        if not self.plans:
+            return None
+        return {"plans": self.plans, "current_plan_id": self.current_plan_id}
+
+    def restore_state(self, state: Dict) -> None:
+        """Restore the plans saved by checkpoint_state."""
+        self.plans.clear()
+        self.plans.update(state.get("plans", {}))
+        self.current_plan_id = state.get("current_plan_id")
+
+    async def reset(self) -> None:
+        """Drop all plans of the previous request."""
+        self.plans.clear()
+        self.current_plan_id = None
+
     def _format_plan(self, plan: Dict) -> str:
         """Format a plan for display."""
         output = f"Plan: {plan['title']} (ID: {plan['plan_id']})\n"
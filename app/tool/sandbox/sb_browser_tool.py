@@ -125,6 +125,7 @@ class SandboxBrowserTool(SandboxToolsBase):
             "wait": ["seconds"],
         },
     }
+    parallel_safe: bool = False  # 所有调用操作同一个沙箱浏览器
     browser_message: Optional[ThreadMessage] = Field(default=None, exclude=True)
 
     def __init__(
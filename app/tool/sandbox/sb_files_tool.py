@@ -134,6 +134,12 @@ class SandboxFilesTool(SandboxToolsBase):
             print(f"Error getting workspace state: {str(e)}")
             return {}
 
+    def concurrency_key(
+        self, file_path: Optional[str] = None, **kwargs
+    ) -> Optional[str]:
+        """Calls on the same file run in order; different files may run concurrently."""
+        return f"{self.name}:{file_path}"
+
     async def execute(
         self,
         action: str,
@@ -80,6 +80,7 @@ class SandboxShellTool(SandboxToolsBase):
             "list_commands": [],
         },
     }
+    parallel_safe: bool = False  # 命令之间可能依赖同一个 tmux 会话的状态
 
     def __init__(
         self, sandbox: Optional[Sandbox] = None, thread_id: Optional[str] = None, **data
@@ -2,7 +2,7 @@
 
 from collections import defaultdict
 from pathlib import Path
-from typing import Any, DefaultDict, List, Literal, Optional, get_args
+from typing import Any, DefaultDict, Dict, List, Literal, Optional, get_args
 
 from app.config import config
 from app.exceptions import ToolError
@@ -111,6 +111,31 @@ class StrReplaceEditor(BaseTool):
             else self._local_operator
         )
 
+    def concurrency_key(self, path: str = "", **kwargs) -> Optional[str]:
+        """Calls on the same path run in order; different paths may run concurrently."""
+        return f"{self.name}:{path}"
+
+    def checkpoint_state(self) -> Optional[Dict[str, Any]]:
+        """Edit history per file, so undo_edit keeps working after a resume."""
+        history = {
+            str(path): texts for path, texts in self._file_history.items() if texts
+        }
+        return {"file_history": history} if history else None
+
+    def restore_state(self, state: Dict[str, Any]) -> None:
+        """Restore the edit history saved by checkpoint_state."""
+        self._file_history = defaultdict(
+            list,
+            {
+                path: list(texts)
+                for path, texts in state.get("file_history", {}).items()
+            },
+        )
+
+    async def reset(self) -> None:
+        """Forget the edit history of the previous request."""
+        self._file_history = defaultdict(list)
+
     async def execute(
         self,
         *,
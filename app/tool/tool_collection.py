@@ -7,13 +7,48 @@
 工具集合可以添加、查找、执行工具，并将工具转换为 LLM 可理解的格式。
 """
 
-from typing import Any, Dict, List
+from typing import Any, Dict, Hashable, List, Optional, Tuple
 
 from app.exceptions import ToolError
 from app.logger import logger
 from app.tool.base import BaseTool, ToolFailure, ToolResult
 
 
+class ToolParamList(list):
+    """
+    工具参数列表
+
+    ToolCollection.to_params() 的返回值。除了是普通的工具参数列表外，
+    还缓存了该列表的 token 数，LLM 每次调用时不必重新序列化和计数所有工具。
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._token_cache: Dict[Hashable, int] = {}
+
+    def get_cached_tokens(self, key: Hashable) -> Optional[int]:
+        """
+        获取缓存的 token 数
+
+        Args:
+            key: 缓存键（通常包含 tokenizer 名称）
+
+        Returns:
+            Optional[int]: 缓存的 token 数，未缓存时返回 None
+        """
+        return self._token_cache.get(key)
+
+    def set_cached_tokens(self, key: Hashable, count: int) -> None:
+        """
+        缓存 token 数
+
+        Args:
+            key: 缓存键
+            count: token 数量
+        """
+        self._token_cache[key] = count
+
+
 class ToolCollection:
     """
     工具集合类
@@ -49,6 +84,8 @@ class ToolCollection:
         self.tools = tools
         # 工具映射：以工具名称为键，工具实例为值的字典，用于快速查找
         self.tool_map = {tool.name: tool for tool in tools}
+        # to_params() 的缓存：(生成时的 tools 元组, 参数列表)
+        self._params_cache: Optional[Tuple[Tuple[BaseTool, ...], ToolParamList]] = None
 
     def __iter__(self):
         """
@@ -72,6 +109,11 @@ class ToolCollection:
         将集合中的所有工具转换为 OpenAI 函数调用格式的列表。
         这个列表可以直接传递给 LLM 的 ask_tool 方法。
 
+        结果会被缓存：工具不变时每次返回同一个列表对象，保证每一步请求中的
+        工具部分完全一致（便于服务端前缀缓存），其 token 数也只计算一次。
+        add_tool / add_tools 或直接替换 tools 元组（如 MCP 重连）后缓存自动失效；
+        工具自身的参数被原地修改时，需要调用 invalidate_params()。
+
         Returns:
             List[Dict[str, Any]]: 工具参数列表，每个元素是一个工具的 to_param() 结果
 
@@ -79,7 +121,17 @@ class ToolCollection:
             tool_params = collection.to_params()
             response = await llm.ask_tool(messages, tools=tool_params)
         """
-        return [tool.to_param() for tool in self.tools]
+        # 以 tools 元组的身份判断是否变化：添加工具或重新赋值都会生成新元组
+        if self._params_cache is None or self._params_cache[0] is not self.tools:
+            self._params_cache = (
+                self.tools,
+                ToolParamList(tool.to_param() for tool in self.tools),
+            )
+        return self._params_cache[1]
+
+    def invalidate_params(self) -> None:
+        """清除 to_params() 的缓存（工具参数被原地修改时调用）"""
+        self._params_cache = None
 
     async def execute(
         self, *, name: str, tool_input: Dict[str, Any] = None
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结构化追踪模块
+
+日志只能告诉我们执行到了第几步，却看不出时间花在了哪里。本模块提供轻量的嵌套 span：
+run → step → think（LLM 调用）→ act → 每个工具的执行 → 沙箱 / 浏览器 / 数据库子操作，
+每个 span 记录耗时和属性（token 数、字节数、结果大小等）。
+
+span 通过 ContextVar 嵌套，并发执行的工具调用（各自的 asyncio 任务）会正确地挂在
+同一个父 span 下。最外层的 span 结束时，整条追踪导出到 output_dir：
+- <名称>.jsonl：每行一个 span
+- <名称>.trace.json：Chrome trace-event 格式，可以在 chrome://tracing 或 Perfetto 中
+  以火焰图查看（每个 asyncio 任务一条轨道）
+
+未启用时 span() 直接返回共享的空操作对象，开销接近于零。
+配置来自 config.toml 的 [tracing]（默认关闭）。
+
+使用示例：
+    with span("tool.execute", tool=name) as s:
+        result = await tool(**args)
+        s.set(result_chars=len(str(result)))
+
+    @traced("llm.ask")
+    async def ask(...): ...
+"""
+
+import asyncio
+import functools
+import json
+import time
+import uuid
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import TracingSettings, config
+from app.logger import logger
+
+
+class Span:
+    """一个计时区间（作为上下文管理器使用）"""
+
+    __slots__ = (
+        "name",
+        "span_id",
+        "parent_id",
+        "trace_id",
+        "attributes",
+        "error",
+        "start",
+        "duration",
+        "task_id",
+        "_tracer",
+        "_trace",
+        "_t0",
+        "_token",
+    )
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        parent = _current_span.get()
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start = 0.0
+        self.duration = 0.0
+        try:
+            self.task_id = id(asyncio.current_task())
+        except RuntimeError:
+            self.task_id = 0
+        self._tracer = tracer
+        # 同一条追踪的所有 span 共享一个列表，最外层 span 结束时导出
+        self._trace: List["Span"] = parent._trace if parent is not None else []
+        self._t0 = 0.0
+        self._token: Optional[Token] = None
+
+    def set(self, **attributes: Any) -> "Span":
+        """补充属性（如结果大小、token 数）"""
+        self.attributes.update(attributes)
+        return self
+
+    def __enter__(self) -> "Span":
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self._t0
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _current_span.reset(self._token)
+        self._trace.append(self)
+        if self.parent_id is None:
+            self._tracer.export(self, self._trace)
+
+    def to_record(self) -> Dict[str, Any]:
+        """转换为 JSONL 记录（时间单位：秒）"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """未启用追踪时使用的空操作 span"""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> "_NoopSpan":
+        return self
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+# 当前所在的 span（asyncio 任务会继承创建时的上下文）
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    span 的创建和导出
+
+    导出在线程池中进行，不阻塞事件循环；flush() 等待尚未完成的导出。
+    """
+
+    def __init__(self, settings: TracingSettings):
+        """
+        初始化追踪器
+
+        Args:
+            settings: 追踪配置
+        """
+        self.settings = settings
+        self._pending: List[asyncio.Future] = []
+
+    def span(self, name: str, attributes: Dict[str, Any]) -> Span:
+        """创建一个 span"""
+        return Span(self, name, attributes)
+
+    def export(self, root: Span, spans: List[Span]) -> None:
+        """
+        导出一条追踪
+
+        Args:
+            root: 最外层的 span
+            spans: 该追踪的所有 span（按结束顺序）
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(root, spans)
+            return
+        future = loop.run_in_executor(None, self._write, root, spans)
+        self._pending = [f for f in self._pending if not f.done()] + [future]
+
+    async def flush(self) -> None:
+        """等待尚未完成的导出"""
+        pending, self._pending = self._pending, []
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def _write(self, root: Span, spans: List[Span]) -> None:
+        """将追踪写入 JSONL 和 Chrome trace-event 文件"""
+        directory = Path(self.settings.output_dir)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(root.start))
+        base = directory / f"{root.name}-{stamp}-{root.trace_id[:8]}"
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            if self.settings.jsonl:
+                with open(f"{base}.jsonl", "w", encoding="utf-8") as f:
+                    for s in spans:
+                        f.write(
+                            json.dumps(s.to_record(), ensure_ascii=False, default=str)
+                            + "\n"
+                        )
+            if self.settings.chrome:
+                with open(f"{base}.trace.json", "w", encoding="utf-8") as f:
+                    json.dump(chrome_trace(spans), f, ensure_ascii=False, default=str)
+        except OSError as e:
+            logger.warning(f"导出追踪失败: {e}")
+
+
+def chrome_trace(spans: List[Span]) -> Dict[str, Any]:
+    """
+    转换为 Chrome trace-event 格式
+
+    每个 span 是一个完整事件（ph = "X"），时间单位为微秒；
+    每个 asyncio 任务一条轨道（tid），并发的工具调用不会相互重叠。
+
+    Args:
+        spans: 一条追踪的所有 span
+
+    Returns:
+        Dict[str, Any]: 可以直接 json.dump 的 trace 对象
+    """
+    if not spans:
+        return {"traceEvents": []}
+    origin = min(s.start for s in spans)
+    tids: Dict[int, int] = {}
+    events = []
+    for s in sorted(spans, key=lambda s: s.start):
+        tid = tids.setdefault(s.task_id, len(tids) + 1)
+        events.append(
+            {
+                "name": s.name,
+                "cat": s.name.split(".", 1)[0],
+                "ph": "X",
+                "ts": round((s.start - origin) * 1e6, 3),
+                "dur": round(s.duration * 1e6, 3),
+                "pid": 1,
+                "tid": tid,
+                "args": {**s.attributes, **({"error": s.error} if s.error else {})},
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+_tracer: Optional[Tracer] = None
+_tracer_loaded = False
+
+
+def get_tracer() -> Optional[Tracer]:
+    """
+    获取进程级的追踪器
+
+    Returns:
+        Optional[Tracer]: 追踪器，[tracing] 未启用时返回 None
+    """
+    global _tracer, _tracer_loaded
+    if not _tracer_loaded:
+        settings = config.tracing or TracingSettings()
+        _tracer = Tracer(settings) if settings.enabled else None
+        _tracer_loaded = True
+    return _tracer
+
+
+def span(name: str, **attributes: Any):
+    """
+    创建一个 span（未启用追踪时返回空操作对象）
+
+    Args:
+        name: span 名称，按 "类别.操作" 命名，如 agent.step、llm.ask_tool、tool.bash
+        **attributes: 初始属性
+
+    Returns:
+        可用于 with 语句的 span
+    """
+    tracer = _tracer if _tracer_loaded else get_tracer()
+    if tracer is None:
+        return _NOOP_SPAN
+    return tracer.span(name, attributes)
+
+
+def current_span() -> Optional[Span]:
+    """
+    获取当前所在的 span
+
+    Returns:
+        Optional[Span]: 当前 span，未启用追踪或不在任何 span 中时返回 None
+    """
+    return _current_span.get()
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """
+    为 async 函数创建 span 的装饰器
+
+    Args:
+        name: span 名称，默认为函数的限定名
+
+    Returns:
+        Callable: 装饰器
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(span_name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+智能体循环压测（基于本地 Mock LLM 服务器）
+
+在进程内启动 Mock LLM 服务器（通过 httpx.ASGITransport，不占用端口），
+并发运行 N 个 ToolCallAgent 会话，每个会话按预设场景调用几次工具后结束。
+报告总耗时、吞吐量，以及扣除模拟延迟后每一步的本地开销。
+
+运行方式：
+- 在 OpenManus 项目根目录下执行：`python -m benchmarks.benchmark_mock_load --sessions 200`
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.agent.toolcall import ToolCallAgent
+from app.llm import LLM
+from app.mock_llm_server import (
+    LatencySpec,
+    MockLLMServer,
+    MockScenario,
+    MockStep,
+    MockToolCall,
+)
+
+
+def _scenario(steps: int, latency: float) -> MockScenario:
+    return MockScenario(
+        steps=[
+            MockStep(
+                content=f"step {i}",
+                tool_calls=[
+                    MockToolCall(
+                        name="create_chat_completion",
+                        arguments={"response": f"partial {i}"},
+                    )
+                ],
+            )
+            for i in range(steps)
+        ],
+        latency=LatencySpec(mean=latency),
+        seed=0,
+    )
+
+
+async def _run(sessions: int, steps: int, latency: float) -> None:
+    server = MockLLMServer(_scenario(steps, latency))
+    llm = LLM()
+    llm.client = AsyncOpenAI(
+        base_url="http://mock/v1",
+        api_key="mock",
+        http_client=httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server.app),
+            limits=httpx.Limits(max_connections=sessions),
+        ),
+    )
+    llm.response_cache = None
+
+    async def session(i: int) -> int:
+        agent = ToolCallAgent(llm=llm, max_steps=steps + 5)
+        await agent.run(f"load test session {i}")
+        return agent.current_step
+
+    start = time.perf_counter()
+    step_counts = await asyncio.gather(*(session(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    total_steps = sum(step_counts)
+    # 会话并发执行，单个会话的耗时约等于总耗时
+    overhead = (elapsed - latency * (steps + 1)) / (steps + 1)
+    print(
+        f"sessions={sessions} steps/session={steps + 1} requests={server.stats['requests']}"
+    )
+    print(f"wall time: {elapsed:.2f}s, throughput: {total_steps / elapsed:.1f} steps/s")
+    print(
+        f"local overhead per step (wall minus simulated latency): {overhead * 1000:.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock LLM 智能体循环压测")
+    parser.add_argument("--sessions", type=int, default=100, help="并发会话数")
+    parser.add_argument("--steps", type=int, default=3, help="每个会话的工具调用步数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟的 LLM 延迟（秒）")
+    args = parser.parse_args()
+    asyncio.run(_run(args.sessions, args.steps, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+token 计数微基准
+
+模拟 ToolCallAgent 每一步的 token 预检：向 Memory 追加一轮消息后调用
+LLM.estimate_input_tokens，并与旧实现（每步格式化并重新编码整个历史）对比。
+增量计数的单步耗时应随历史长度基本保持不变。
+
+另外测量 ToolCallAgent.think() 的本地开销（LLM 客户端立即返回，不含网络时间），
+对比每步重新格式化整个历史（禁用 Message 上的格式化缓存）和只格式化新消息。
+
+运行方式：
+- 在 OpenManus 项目根目录下执行：`python -m benchmarks.benchmark_token_count`
+- 需要按 config/config.toml 创建 LLM，并下载 tiktoken 编码文件（需要联网），
+  因此放在 tests/ 之外，不会被 pytest 收集
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletion
+
+from app.agent.toolcall import ToolCallAgent
+from app.llm import LLM
+from app.schema import Memory, Message
+
+STEP_SIZES = [25, 50, 100, 200, 400]
+THINK_SIZES = [50, 100, 200]
+THINK_REPEATS = 20
+TOOL_OUTPUT = "Observed output of cmd `python_execute` executed:\n" + "data " * 400
+
+
+def _add_round(memory: Memory, i: int) -> None:
+    memory.add_message(Message.user_message(f"next step prompt {i}"))
+    memory.add_message(Message.assistant_message(f"thinking about step {i}"))
+    memory.add_message(
+        Message.tool_message(
+            TOOL_OUTPUT, name="python_execute", tool_call_id=f"call_{i}"
+        )
+    )
+
+
+def main():
+    llm = LLM()
+    print(f"{'messages':>10} {'full recount (ms)':>20} {'incremental (ms)':>20}")
+    for size in STEP_SIZES:
+        memory = Memory(max_messages=size * 2)
+        while len(memory.messages) < size:
+            _add_round(memory, len(memory.messages))
+        llm.estimate_input_tokens(memory)
+
+        _add_round(memory, size)
+        start = time.perf_counter()
+        llm.count_message_tokens(llm.format_messages(memory.messages))
+        full = (time.perf_counter() - start) * 1000
+
+        _add_round(memory, size + 1)
+        start = time.perf_counter()
+        llm.estimate_input_tokens(memory)
+        incremental = (time.perf_counter() - start) * 1000
+
+        print(f"{len(memory.messages):>10} {full:>20.3f} {incremental:>20.3f}")
+
+
+def _completion() -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "bench",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "bench",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "done"},
+                }
+            ],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+    )
+
+
+async def _think_ms(agent: ToolCallAgent, size: int) -> float:
+    """历史为 size 条消息时，单次 think() 的平均耗时（毫秒）"""
+    agent.memory = Memory(max_messages=size * 2)
+    while len(agent.memory.messages) < size:
+        _add_round(agent.memory, len(agent.memory.messages))
+    await agent.think()
+
+    total = 0.0
+    for _ in range(THINK_REPEATS):
+        # 每次 think() 追加一条提示词和一条回复，历史长度基本不变
+        start = time.perf_counter()
+        await agent.think()
+        total += time.perf_counter() - start
+    return total / THINK_REPEATS * 1000
+
+
+async def think_overhead():
+    llm = LLM()
+    llm.response_cache = None
+
+    async def create(**kwargs):
+        return _completion()
+
+    llm.client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    agent = ToolCallAgent(llm=llm, stream_tool_calls=False)
+
+    cached_format = Message.get_cached_format
+    print(f"\n{'messages':>10} {'think full (ms)':>20} {'think cached (ms)':>20}")
+    for size in THINK_SIZES:
+        Message.get_cached_format = lambda self, key: None
+        try:
+            full = await _think_ms(agent, size)
+        finally:
+            Message.get_cached_format = cached_format
+        cached = await _think_ms(agent, size)
+        print(f"{size:>10} {full:>20.3f} {cached:>20.3f}")
+
+
+if __name__ == "__main__":
+    main()
+    asyncio.run(think_overhead())
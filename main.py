@@ -5,14 +5,34 @@ import asyncio  # 用于异步编程支持
 
 from app.agent.manus import Manus
 from app.logger import logger
+from app.schema import AgentState
 
 async def main():
     parser = argparse.ArgumentParser(description="使用提示运行Manus智能体")
     parser.add_argument( "--prompt",type=str,required=False,help="智能体的输入提示")
+    parser.add_argument(
+        "--checkpoint", type=str, required=False, help="每步结束时把检查点写入该文件"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="从 --checkpoint 指定的文件中最后一个完整的步骤继续"
+    )
     args = parser.parse_args()
-    agent = await Manus.create()
+    if args.resume and not args.checkpoint:
+        parser.error("--resume 需要同时指定 --checkpoint")
+    agent = await Manus.create(checkpoint_path=args.checkpoint)
 
     try:
+        if args.resume:
+            checkpoint = await agent.resume()
+            if checkpoint is not None:
+                if checkpoint.state == AgentState.FINISHED:
+                    logger.info("检查点中的任务已经完成，无需继续。")
+                    return
+                logger.warning("正在从检查点继续处理请求...")
+                await agent.run()
+                logger.info("请求处理完成。")
+                return
+
         prompt = args.prompt if args.prompt else input("请输入您的提示: ")
         if not prompt.strip():
             logger.warning("提供的提示为空，程序退出。")
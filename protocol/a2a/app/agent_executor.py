@@ -1,5 +1,5 @@
 import logging
-from typing import Awaitable, Callable
+from typing import Awaitable, Callable, Optional
 
 from a2a.server.agent_execution import AgentExecutor, RequestContext
 from a2a.server.events import EventQueue
@@ -13,6 +13,9 @@ from a2a.types import (
 from a2a.utils import completed_task, new_artifact
 from a2a.utils.errors import ServerError
 
+from app.agent_pool import AgentPool
+from app.session import Session
+
 from .agent import A2AManus
 
 
@@ -23,8 +26,14 @@ logger = logging.getLogger(__name__)
 class ManusExecutor(AgentExecutor):
     """Currency Conversion AgentExecutor Example."""
 
-    def __init__(self, agent_factory: Callable[[], Awaitable[A2AManus]]):
+    def __init__(
+        self,
+        agent_factory: Callable[[], Awaitable[A2AManus]],
+        pool: Optional[AgentPool] = None,
+    ):
         self.agent_factory = agent_factory
+        # Pre-initialized agents; without a pool every task creates a new agent
+        self.pool = pool
 
     async def execute(
         self,
@@ -37,8 +46,15 @@ class ManusExecutor(AgentExecutor):
 
         query = context.get_user_input()
         try:
-            self.agent = await self.agent_factory()
-            result = await self.agent.invoke(query, context.context_id)
+            # Each request gets its own session: usage counters, plans and MCP
+            # connections stay isolated from requests served concurrently
+            async with Session(context.context_id):
+                if self.pool is not None:
+                    async with self.pool.lease() as agent:
+                        result = await agent.invoke(query, context.context_id)
+                else:
+                    agent = await self.agent_factory()
+                    result = await agent.invoke(query, context.context_id)
             print(f"Final Result ===> {result}")
         except Exception as e:
             print("Error invoking agent: %s", e)
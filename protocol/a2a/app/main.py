@@ -10,6 +10,7 @@ from a2a.server.tasks import InMemoryPushNotifier, InMemoryTaskStore
 from a2a.types import AgentCapabilities, AgentCard, AgentSkill
 from dotenv import load_dotenv
 
+from app.agent_pool import AgentPool
 from app.tool.browser_use_tool import _BROWSER_DESCRIPTION
 from app.tool.str_replace_editor import _STR_REPLACE_EDITOR_DESCRIPTION
 from app.tool.terminate import _TERMINATE_DESCRIPTION
@@ -81,9 +82,12 @@ async def main(host: str = "localhost", port: int = 10000):
         )
 
         httpx_client = httpx.AsyncClient()
+        # Pooled agents keep their MCP sessions and browser between tasks;
+        # the pool fills lazily on the first request, inside the server's loop
+        pool = AgentPool(lambda: A2AManus.create(max_steps=3, cleanup_after_run=False))
         request_handler = DefaultRequestHandler(
             agent_executor=ManusExecutor(
-                agent_factory=lambda: A2AManus.create(max_steps=3)
+                agent_factory=lambda: A2AManus.create(max_steps=3), pool=pool
             ),
             task_store=InMemoryTaskStore(),
             push_notifier=InMemoryPushNotifier(httpx_client),
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from app.agent.base import BaseAgent
+from app.agent_pool import AgentPool
+from app.config import AgentPoolSettings, LLMSettings
+from app.llm import LLM
+from app.schema import AgentState, Message
+from app.session import Session
+from app.tool.mcp import MCPClients
+
+
+class PooledAgent(BaseAgent):
+    name: str = "pooled"
+    healthy: bool = True
+    cleaned: bool = False
+
+    async def step(self) -> str:
+        self.memory.add_message(Message.assistant_message("done"))
+        self.state = AgentState.FINISHED
+        return "done"
+
+    async def health_check(self) -> bool:
+        return self.healthy
+
+    async def cleanup(self) -> None:
+        self.cleaned = True
+
+
+@pytest.fixture
+def factory(monkeypatch):
+    class Tokenizer:
+        name = "whitespace"
+
+        def encode(self, text):
+            return text.split()
+
+    monkeypatch.setattr(
+        "app.llm.tiktoken.encoding_for_model", lambda model: Tokenizer()
+    )
+    settings = LLMSettings(
+        model="test-model",
+        base_url="http://127.0.0.1:1/v1",
+        api_key="test",
+        max_tokens=16,
+        temperature=0.0,
+        api_type="openai",
+        api_version="",
+    )
+    llm = LLM(config_name="pytest-pool", llm_config={"default": settings})
+    created = []
+
+    async def create():
+        await asyncio.sleep(0.01)
+        agent = PooledAgent(llm=llm)
+        agent.mcp_clients = MCPClients()
+        created.append(agent)
+        return agent
+
+    create.created = created
+    yield create
+    LLM._instances.pop("pytest-pool", None)
+
+
+async def _settle(pool: AgentPool):
+    while pool._tasks:
+        await asyncio.gather(*list(pool._tasks))
+
+
+@pytest.mark.asyncio
+async def test_agents_are_reset_and_reused(factory):
+    pool = AgentPool(factory, AgentPoolSettings(size=2))
+    async with pool.lease() as first:
+        await first.run("hello")
+    await _settle(pool)
+
+    async with pool.lease() as agent:
+        assert agent.memory.messages == []
+        assert agent.state == AgentState.IDLE and agent.current_step == 0
+    await _settle(pool)
+    # 第一次租用时池为空，临时新建的智能体超出 size，归还时被销毁
+    assert pool.stats()["live"] == 2 and len(factory.created) == 3
+    await pool.close()
+    assert all(agent.cleaned for agent in factory.created)
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_and_failed_agents_are_recycled(factory):
+    pool = AgentPool(factory, AgentPoolSettings(size=1, health_check_interval=0))
+    async with pool.lease():
+        pass
+    await _settle(pool)
+    (idle,) = pool._idle
+    idle.agent.healthy = False
+
+    with pytest.raises(RuntimeError):
+        async with pool.lease() as agent:
+            assert agent is not idle.agent and idle.agent.cleaned
+            raise RuntimeError("boom")
+    await _settle(pool)
+    assert agent.cleaned
+    assert pool.stats()["live"] == 1 and pool.stats()["idle"] == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_agents_outlive_request_sessions(factory):
+    pool = AgentPool(factory, AgentPoolSettings(size=1))
+    async with Session() as session:
+        async with pool.lease():
+            pass
+    await _settle(pool)
+    # 池的后台任务不继承请求的会话
+    assert session._mcp_clients == []
+    await pool.close()
@@ -0,0 +1,97 @@
+import pytest
+
+from app.agent.base import BaseAgent
+from app.checkpoint import load_checkpoint
+from app.config import LLMSettings
+from app.llm import LLM
+from app.schema import AgentState, Memory, Message
+from app.tool import PlanningTool
+
+
+class ScriptedAgent(BaseAgent):
+    name: str = "scripted"
+    crash_at: int = 0
+    tool: PlanningTool
+
+    def checkpoint_tools(self):
+        return {self.tool.name: self.tool}
+
+    async def step(self) -> str:
+        if self.current_step == self.crash_at:
+            raise RuntimeError("boom")
+        self.memory.add_message(Message.user_message(f"prompt {self.current_step}"))
+        self.memory.add_message(Message.assistant_message(f"reply {self.current_step}"))
+        self.llm.update_token_count(10, 1)
+        if self.current_step == 2:
+            await self.tool.execute(
+                command="create", plan_id="p", title="t", steps=["a"]
+            )
+        if self.current_step == 3:
+            # 模拟压缩：整体替换历史
+            self.memory.messages = [
+                Message.user_message("summary")
+            ] + self.memory.messages[-2:]
+        return "ok"
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    class Tokenizer:
+        name = "whitespace"
+
+        def encode(self, text):
+            return text.split()
+
+    monkeypatch.setattr(
+        "app.llm.tiktoken.encoding_for_model", lambda model: Tokenizer()
+    )
+    settings = LLMSettings(
+        model="test-model",
+        base_url="http://127.0.0.1:1/v1",
+        api_key="test",
+        max_tokens=16,
+        temperature=0.0,
+        api_type="openai",
+        api_version="",
+    )
+    yield LLM(config_name="pytest-checkpoint", llm_config={"default": settings})
+    LLM._instances.pop("pytest-checkpoint", None)
+
+
+@pytest.mark.asyncio
+async def test_resume_continues_from_last_good_step(llm, tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    agent = ScriptedAgent(
+        llm=llm,
+        tool=PlanningTool(),
+        max_steps=6,
+        crash_at=5,
+        memory=Memory(max_messages=5),
+        checkpoint_path=path,
+    )
+    with pytest.raises(RuntimeError):
+        await agent.run("task")
+    # 模拟崩溃时写了一半的记录
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "messa')
+
+    checkpoint = load_checkpoint(path)
+    assert checkpoint.step == 4
+    assert checkpoint.messages == [m.to_dict() for m in agent.memory.messages]
+
+    resumed = ScriptedAgent(
+        llm=llm, tool=PlanningTool(), max_steps=6, memory=Memory(max_messages=5)
+    )
+    await resumed.resume(path)
+    assert [m.content for m in resumed.memory.messages] == [
+        m.content for m in agent.memory.messages
+    ]
+    assert resumed.current_step == 4
+    assert "p" in resumed.tool.plans
+    assert llm.total_input_tokens == checkpoint.input_tokens
+
+    await resumed.run()
+    final = load_checkpoint(path)
+    assert final.step == 6
+    assert final.state == AgentState.RUNNING
+    assert [m["content"] for m in final.messages][-2:] == ["prompt 6", "reply 6"]
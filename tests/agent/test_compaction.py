@@ -0,0 +1,100 @@
+import pytest
+
+from app.compaction import SUMMARY_PREFIX, ContextCompactor
+from app.config import CompactionSettings, LLMSettings
+from app.llm import LLM
+from app.schema import Memory, Message, ToolCall, ToolChoice
+from app.tool import Terminate, ToolCollection
+
+
+def _tool_turn(i: int):
+    call = ToolCall(id=f"call_{i}", function={"name": "bash", "arguments": "{}"})
+    return [
+        Message.from_tool_calls(tool_calls=[call], content=f"step {i}"),
+        Message.tool_message(
+            f"output {i} " * 20, name="bash", tool_call_id=f"call_{i}"
+        ),
+    ]
+
+
+class FakeLLM:
+    max_input_tokens = 1000
+
+    def estimate_tool_request_tokens(self, memory, system_msgs=None, tools=None):
+        return sum(len((m.content or "").split()) for m in memory.messages)
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_pinned_and_tool_pairs(monkeypatch):
+    memory = Memory()
+    memory.add_message(Message.system_message("notice"))
+    memory.add_message(Message.user_message("original request"))
+    for i in range(10):
+        memory.add_messages(_tool_turn(i))
+
+    compactor = ContextCompactor(
+        CompactionSettings(enabled=True, context_window=300, keep_recent=3)
+    )
+
+    async def summarize(messages):
+        return f"{len(messages)} messages summarized"
+
+    monkeypatch.setattr(compactor, "summarize", summarize)
+
+    assert await compactor.maybe_compact(memory, FakeLLM())
+
+    messages = memory.messages
+    assert [m.content for m in messages[:2]] == ["notice", "original request"]
+    assert messages[2].content.startswith(SUMMARY_PREFIX)
+    # keep_recent=3 会落在工具结果上，切分点前移到对应的 tool_calls 消息
+    assert messages[3].tool_calls and messages[3].tool_calls[0].id == "call_8"
+    assert len(messages) == 3 + 4
+    call_ids = {c.id for m in messages if m.tool_calls for c in m.tool_calls}
+    assert all(m.tool_call_id in call_ids for m in messages if m.role == "tool")
+
+    # 低于阈值时不压缩
+    assert not await compactor.maybe_compact(memory, FakeLLM())
+
+
+@pytest.mark.asyncio
+async def test_threshold_matches_ask_tool_count(monkeypatch):
+    class Tokenizer:
+        name = "whitespace"
+
+        def encode(self, text):
+            return text.split()
+
+    monkeypatch.setattr(
+        "app.llm.tiktoken.encoding_for_model", lambda model: Tokenizer()
+    )
+    settings = LLMSettings(
+        model="gpt-4o",
+        base_url="http://127.0.0.1:1/v1",
+        api_key="test",
+        max_tokens=16,
+        temperature=0.0,
+        api_type="openai",
+        api_version="",
+    )
+    llm = LLM(config_name="pytest-compaction", llm_config={"default": settings})
+    try:
+        memory = Memory()
+        memory.add_message(Message.user_message("original request"))
+        for i in range(3):
+            memory.add_messages(_tool_turn(i))
+        tools = ToolCollection(Terminate()).to_params()
+        compactor = ContextCompactor(
+            CompactionSettings(enabled=True, context_window=10**6)
+        )
+
+        assert not await compactor.maybe_compact(memory, llm, None, tools)
+        key = memory._token_key
+        _, input_tokens = llm._prepare_tool_params(
+            memory, None, 300, tools, ToolChoice.AUTO, None
+        )
+        # 多模态模型上与 ask_tool 使用同一个增量计数，且阈值包含工具定义
+        assert memory._token_key == key
+        assert input_tokens == llm.estimate_tool_request_tokens(memory, None, tools)
+        assert input_tokens > llm.estimate_input_tokens(memory, None, True)
+    finally:
+        LLM._instances.pop("pytest-compaction", None)
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.agent.toolcall import ToolCallAgent
+from app.config import LLMSettings
+from app.llm import LLM
+from app.schema import ToolCall
+from app.tool import ToolCollection
+from app.tool.base import BaseTool, ToolResult
+
+EVENTS = []
+
+
+class SleepTool(BaseTool):
+    name: str = "sleep"
+    description: str = "sleep for a while"
+    parameters: dict = {"type": "object", "properties": {"seconds": {"type": "number"}}}
+
+    async def execute(self, seconds: float, tag: str = "") -> ToolResult:
+        EVENTS.append(("start", tag))
+        await asyncio.sleep(seconds)
+        EVENTS.append(("end", tag))
+        return ToolResult(output=f"slept {tag}", base64_image=f"img-{tag}")
+
+
+class SerialSleepTool(SleepTool):
+    name: str = "serial_sleep"
+    parallel_safe: bool = False
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    class Tokenizer:
+        name = "whitespace"
+
+        def encode(self, text):
+            return text.split()
+
+    monkeypatch.setattr(
+        "app.llm.tiktoken.encoding_for_model", lambda model: Tokenizer()
+    )
+    settings = LLMSettings(
+        model="test-model",
+        base_url="http://127.0.0.1:1/v1",
+        api_key="test",
+        max_tokens=16,
+        temperature=0.0,
+        api_type="openai",
+        api_version="",
+    )
+    llm = LLM(config_name="pytest-tools", llm_config={"default": settings})
+    yield ToolCallAgent(
+        llm=llm, available_tools=ToolCollection(SleepTool(), SerialSleepTool())
+    )
+    LLM._instances.pop("pytest-tools", None)
+
+
+def _call(i, name, seconds):
+    arguments = json.dumps({"seconds": seconds, "tag": str(i)})
+    return ToolCall(id=f"call_{i}", function={"name": name, "arguments": arguments})
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_run_concurrently_and_keep_order(agent):
+    agent.tool_calls = [_call(i, "sleep", 0.2 - i * 0.05) for i in range(3)]
+
+    start = time.perf_counter()
+    await agent.act()
+    assert time.perf_counter() - start < 0.35
+
+    tool_msgs = [m for m in agent.memory.messages if m.role == "tool"]
+    assert [m.tool_call_id for m in tool_msgs] == ["call_0", "call_1", "call_2"]
+    assert [m.content.endswith(f"slept {i}") for i, m in enumerate(tool_msgs)] == [
+        True
+    ] * 3
+    # 每个结果带回自己的图片
+    assert [m.get_image() for m in tool_msgs] == ["img-0", "img-1", "img-2"]
+
+
+@pytest.mark.asyncio
+async def test_unsafe_tools_serialize_and_budget_cancels(agent):
+    EVENTS.clear()
+    agent.tool_calls = [_call(0, "serial_sleep", 0.05), _call(1, "serial_sleep", 0.05)]
+    await agent.act()
+    assert EVENTS == [("start", "0"), ("end", "0"), ("start", "1"), ("end", "1")]
+
+    agent.tool_step_timeout = 0.1
+    agent.tool_calls = [_call(2, "sleep", 0.01), _call(3, "sleep", 5)]
+    start = time.perf_counter()
+    await agent.act()
+    assert time.perf_counter() - start < 1
+
+    fast, slow = [m for m in agent.memory.messages if m.role == "tool"][-2:]
+    assert fast.content.endswith("slept 2")
+    assert "step time budget" in slow.content
+
+
+class FakeToolCallStream:
+    def __init__(self, calls):
+        self.calls = calls
+        self.message = "assembled"
+
+    async def __aiter__(self):
+        for call in self.calls:
+            yield call
+
+
+@pytest.mark.asyncio
+async def test_early_dispatched_calls_share_limits_and_budget(agent, monkeypatch):
+    EVENTS.clear()
+    calls = [
+        _call(0, "serial_sleep", 0.05),
+        _call(1, "sleep", 0.2),
+        _call(2, "sleep", 0.2),
+        _call(3, "serial_sleep", 0.05),
+    ]
+
+    # 流中只完整输出了前两个调用，其余的在 act() 中调度
+    streamed = calls[:2]
+
+    async def ask_tool_stream(**request):
+        return FakeToolCallStream(streamed)
+
+    monkeypatch.setattr(agent.llm, "ask_tool_stream", ask_tool_stream)
+    start = time.perf_counter()
+    await agent._ask_tool_with_dispatch()
+    agent.tool_calls = calls
+    await agent.act()
+    assert time.perf_counter() - start < 0.35
+    serial = [e for e in EVENTS if e[1] in ("0", "3")]
+    assert serial == [("start", "0"), ("end", "0"), ("start", "3"), ("end", "3")]
+
+    # 提前调度的调用同样受每步时间预算约束
+    agent.tool_step_timeout = 0.1
+    hung = _call(4, "sleep", 5)
+    streamed = [hung]
+    await agent._ask_tool_with_dispatch()
+    agent.tool_calls = [hung]
+    start = time.perf_counter()
+    await agent.act()
+    assert time.perf_counter() - start < 1
+    assert "step time budget" in agent.memory.messages[-1].content
@@ -0,0 +1,88 @@
+from app.schema import Memory, Message, ToolCall
+
+
+def _search(query: str, thought: str) -> Message:
+    call = ToolCall(
+        id=f"call_{thought}",
+        function={
+            "name": "web_search",
+            "arguments": '{"query": "%s", "num_results": 5}' % query,
+        },
+    )
+    return Message.from_tool_calls(tool_calls=[call], content=thought)
+
+
+def test_repeated_tool_call_with_different_thoughts_is_a_repeat():
+    memory = Memory()
+    memory.add_message(Message.user_message("find it"))
+    memory.add_message(_search("openmanus", "Let me search"))
+    memory.add_message(
+        Message.tool_message("no results", name="web_search", tool_call_id="x")
+    )
+    assert memory.repeat_count() == 0
+
+    # 参数键顺序不同、思考文本不同，仍是同一次调用
+    call = ToolCall(
+        id="call_b",
+        function={
+            "name": "web_search",
+            "arguments": '{"num_results": 5, "query": "openmanus"}',
+        },
+    )
+    memory.add_message(
+        Message.from_tool_calls(tool_calls=[call], content="Searching again")
+    )
+    memory.add_message(_search("openmanus", "One more try"))
+    assert memory.repeat_count() == 2
+
+    memory.add_message(_search("open manus github", "Different query"))
+    assert memory.repeat_count() == 0
+
+
+def _call(name: str, arguments: str) -> Message:
+    call = ToolCall(id=f"call_{name}", function={"name": name, "arguments": arguments})
+    return Message.from_tool_calls(tool_calls=[call])
+
+
+def test_interleaved_calls_are_not_repeats():
+    memory = Memory()
+    memory.add_message(Message.user_message("read the page"))
+    for _ in range(4):
+        memory.add_message(_call("browser_use", '{"action": "scroll_down"}'))
+        memory.add_message(
+            Message.tool_message("scrolled", name="browser_use", tool_call_id="x")
+        )
+        memory.add_message(_call("browser_use", '{"action": "extract_content"}'))
+        memory.add_message(
+            Message.tool_message("content", name="browser_use", tool_call_id="y")
+        )
+        # 每一步都和上一条助手消息不同，不算卡住
+        assert memory.repeat_count() == 0
+
+
+def test_repeats_are_consecutive_and_rebuilt_on_reassignment():
+    memory = Memory()
+    memory.add_messages(
+        [
+            Message.assistant_message("Same  answer"),
+            Message.user_message("continue"),
+            Message.assistant_message("same answer"),
+        ]
+    )
+    assert memory.repeat_count() == 1
+
+    # 中间出现不同的回复后重新计数
+    memory.add_messages(
+        [Message.assistant_message("other"), Message.assistant_message("same answer")]
+    )
+    assert memory.repeat_count() == 0
+
+    memory.messages = [
+        Message.assistant_message("y"),
+        Message.assistant_message("x"),
+        Message.user_message("again"),
+        Message.assistant_message("x"),
+    ]
+    assert memory.repeat_count() == 1
+    memory.clear()
+    assert memory.repeat_count() == 0
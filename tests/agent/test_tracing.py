@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from app import tracing
+from app.agent.toolcall import ToolCallAgent
+from app.config import LLMSettings, TracingSettings
+from app.llm import LLM
+from app.mock_llm_server import MockLLMServer, MockScenario, MockStep, MockToolCall
+from app.tool import Terminate, ToolCollection
+from app.tool.base import BaseTool, ToolResult
+
+
+class SleepTool(BaseTool):
+    name: str = "sleep"
+    description: str = "sleep for a while"
+    parameters: dict = {"type": "object", "properties": {"seconds": {"type": "number"}}}
+
+    async def execute(self, seconds: float) -> ToolResult:
+        with tracing.span("sandbox.run_command", command="sleep") as s:
+            await asyncio.sleep(seconds)
+            s.set(output_bytes=0)
+        return ToolResult(output="slept")
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    class Tokenizer:
+        name = "whitespace"
+
+        def encode(self, text):
+            return text.split()
+
+    monkeypatch.setattr(
+        "app.llm.tiktoken.encoding_for_model", lambda model: Tokenizer()
+    )
+    settings = LLMSettings(
+        model="test-model",
+        base_url="http://127.0.0.1:1/v1",
+        api_key="test",
+        max_tokens=16,
+        temperature=0.0,
+        api_type="openai",
+        api_version="",
+    )
+    llm = LLM(config_name="pytest-tracing", llm_config={"default": settings})
+    sleep = MockToolCall(name="sleep", arguments={"seconds": 0.05})
+    server = MockLLMServer(
+        MockScenario(
+            steps=[
+                MockStep(tool_calls=[sleep, sleep]),
+                MockStep(
+                    tool_calls=[
+                        MockToolCall(name="terminate", arguments={"status": "success"})
+                    ]
+                ),
+            ]
+        )
+    )
+    monkeypatch.setattr(llm, "response_cache", None)
+    monkeypatch.setattr(
+        llm,
+        "client",
+        AsyncOpenAI(
+            base_url="http://mock/v1",
+            api_key="mock",
+            http_client=httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=server.app)
+            ),
+        ),
+    )
+    yield ToolCallAgent(
+        llm=llm,
+        available_tools=ToolCollection(SleepTool(), Terminate()),
+        stream_tool_calls=False,
+        max_steps=3,
+    )
+    LLM._instances.pop("pytest-tracing", None)
+
+
+@pytest.fixture
+def tracer(monkeypatch, tmp_path):
+    instance = tracing.Tracer(TracingSettings(enabled=True, output_dir=str(tmp_path)))
+    monkeypatch.setattr(tracing, "_tracer", instance)
+    monkeypatch.setattr(tracing, "_tracer_loaded", True)
+    return instance
+
+
+@pytest.mark.asyncio
+async def test_run_exports_nested_spans(agent, tracer, tmp_path):
+    await agent.run("go")
+    await tracer.flush()
+
+    (jsonl,) = tmp_path.glob("agent.run-*.jsonl")
+    spans = [
+        json.loads(line) for line in jsonl.read_text(encoding="utf-8").splitlines()
+    ]
+    by_id = {s["span_id"]: s for s in spans}
+
+    def path(s):
+        names = []
+        while s is not None:
+            names.append(s["name"])
+            s = by_id.get(s["parent_id"])
+        return "/".join(reversed(names))
+
+    paths = [path(s) for s in spans]
+    assert paths.count("agent.run/agent.step/agent.think/llm.ask_tool") == 2
+    assert (
+        paths.count("agent.run/agent.step/agent.act/tool.sleep/sandbox.run_command")
+        == 2
+    )
+    assert "agent.run/agent.step/agent.act/tool.terminate" in paths
+
+    llm_span = next(s for s in spans if s["name"] == "llm.ask_tool")
+    assert llm_span["attributes"]["input_tokens"] > 0
+    assert all(s["trace_id"] == spans[0]["trace_id"] for s in spans)
+
+    (chrome,) = tmp_path.glob("agent.run-*.trace.json")
+    events = json.loads(chrome.read_text(encoding="utf-8"))["traceEvents"]
+    assert len(events) == len(spans) and all(e["ph"] == "X" for e in events)
+    # 并发执行的两个工具调用在各自的轨道上，时间相互重叠
+    first, second = [e for e in events if e["name"] == "tool.sleep"]
+    assert first["tid"] != second["tid"]
+    assert second["ts"] < first["ts"] + first["dur"]
+
+
+def test_disabled_tracing_is_a_noop(monkeypatch):
+    monkeypatch.setattr(tracing, "_tracer", None)
+    monkeypatch.setattr(tracing, "_tracer_loaded", True)
+    with tracing.span("agent.run", agent="x") as s:
+        s.set(steps=1)
+        assert tracing.current_span() is None
+    assert s is tracing.span("agent.step")
@@ -0,0 +1,33 @@
+import pytest
+
+from app.config import LLMSettings
+from app.llm import LLM
+
+
+class WhitespaceTokenizer:
+    """离线测试用的 tokenizer：按空白切分，避免下载 tiktoken 编码文件"""
+
+    name = "whitespace"
+
+    def encode(self, text: str):
+        return text.split()
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """创建一个使用离线 tokenizer 的 LLM 实例，测试结束后从单例字典中移除"""
+    monkeypatch.setattr(
+        "app.llm.tiktoken.encoding_for_model", lambda model: WhitespaceTokenizer()
+    )
+    settings = LLMSettings(
+        model="test-model",
+        base_url="http://127.0.0.1:1/v1",
+        api_key="test",
+        max_tokens=256,
+        temperature=0.0,
+        api_type="openai",
+        api_version="",
+    )
+    instance = LLM(config_name="pytest", llm_config={"default": settings})
+    yield instance
+    LLM._instances.pop("pytest", None)
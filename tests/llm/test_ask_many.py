@@ -0,0 +1,62 @@
+import asyncio
+import gc
+import time
+from types import SimpleNamespace
+
+import pytest
+from openai.types.chat import ChatCompletion
+
+from app.schema import Message
+
+
+def _completion(content: str) -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "test-model",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13},
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_ask_many_runs_concurrently_and_keeps_order(llm, monkeypatch):
+    async def create(**params):
+        prompt = params["messages"][-1]["content"]
+        # 先发出的请求更晚返回，验证结果仍按请求顺序排列
+        await asyncio.sleep(0.1 - int(prompt) * 0.02)
+        if prompt == "2":
+            raise ValueError("bad request")
+        return _completion(f"answer {prompt}")
+
+    monkeypatch.setattr(
+        llm,
+        "client",
+        SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+        ),
+    )
+    monkeypatch.setattr(llm, "response_cache", None)
+
+    # 先回收之前测试留下的对象，避免计时区间内发生完整的垃圾回收
+    gc.collect()
+    start = time.perf_counter()
+    batch = await llm.ask_many(
+        [{"messages": [Message.user_message(str(i))]} for i in range(4)]
+    )
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.2
+    assert batch.results == ["answer 0", "answer 1", None, "answer 3"]
+    assert isinstance(batch.errors[2], ValueError)
+    assert batch.failed == 1 and not batch.ok
+    assert (batch.input_tokens, batch.completion_tokens) == (30, 9)
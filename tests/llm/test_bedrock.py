@@ -0,0 +1,112 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.bedrock import ChatCompletions
+from app.stream_sink import NullSink, use_stream_sink
+
+
+def _tool_call(call_id, name, arguments):
+    return {
+        "id": call_id,
+        "type": "function",
+        "function": {"name": name, "arguments": arguments},
+    }
+
+
+def test_parallel_tool_calls_keep_their_own_ids():
+    completions = ChatCompletions(client=None)
+    system, messages = completions._convert_openai_messages_to_bedrock_format(
+        [
+            {"role": "system", "content": "be brief"},
+            {"role": "user", "content": "go"},
+            {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    _tool_call("a", "bash", '{"command": "ls"}'),
+                    _tool_call("b", "bash", '{"command": "pwd"}'),
+                ],
+            },
+            {"role": "tool", "content": "file.txt", "tool_call_id": "a"},
+            {"role": "tool", "content": "/root", "tool_call_id": "b"},
+        ]
+    )
+
+    assert system == [{"text": "be brief"}]
+    assert [m["role"] for m in messages] == ["user", "assistant", "user"]
+    assert [b["toolUse"]["toolUseId"] for b in messages[1]["content"]] == ["a", "b"]
+    assert [b["toolResult"]["toolUseId"] for b in messages[2]["content"]] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_stream_returns_every_tool_use_block():
+    events = [
+        {"messageStart": {"role": "assistant"}},
+        {"contentBlockDelta": {"contentBlockIndex": 0, "delta": {"text": "Checking"}}},
+        {"contentBlockStop": {"contentBlockIndex": 0}},
+    ]
+    for index, (call_id, command) in enumerate([("a", "ls"), ("b", "pwd")], start=1):
+        events += [
+            {
+                "contentBlockStart": {
+                    "contentBlockIndex": index,
+                    "start": {"toolUse": {"toolUseId": call_id, "name": "bash"}},
+                }
+            },
+            {
+                "contentBlockDelta": {
+                    "contentBlockIndex": index,
+                    "delta": {"toolUse": {"input": '{"command": "%s"}' % command}},
+                }
+            },
+            {"contentBlockStop": {"contentBlockIndex": index}},
+        ]
+    events += [
+        {"messageStop": {"stopReason": "tool_use"}},
+        {
+            "metadata": {
+                "usage": {"inputTokens": 10, "outputTokens": 5, "totalTokens": 15}
+            }
+        },
+    ]
+    client = SimpleNamespace(converse_stream=lambda **params: {"stream": iter(events)})
+
+    with use_stream_sink(NullSink()):
+        response = await ChatCompletions(client).create(
+            model="m",
+            messages=[{"role": "user", "content": "go"}],
+            max_tokens=10,
+            temperature=0,
+        )
+
+    message = response.choices[0].message
+    assert message.content == "Checking"
+    assert [(c.id, c.function.arguments) for c in message.tool_calls] == [
+        ("a", '{"command": "ls"}'),
+        ("b", '{"command": "pwd"}'),
+    ]
+    assert response.usage.completion_tokens == 5
+
+
+@pytest.mark.asyncio
+async def test_blocking_calls_do_not_block_the_event_loop():
+    def converse(**params):
+        time.sleep(0.2)
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": "ok"}]}}
+        }
+
+    completions = ChatCompletions(SimpleNamespace(converse=converse))
+    request = dict(
+        messages=[{"role": "user", "content": "hi"}], max_tokens=10, temperature=0
+    )
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(
+        *(completions.create(model="m", stream=False, **request) for _ in range(4))
+    )
+    assert time.perf_counter() - start < 0.6
+    assert all(r.choices[0].message.content == "ok" for r in responses)
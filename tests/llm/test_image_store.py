@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from app import image_store
+from app.config import ImageStoreSettings, config
+from app.image_store import ImageStore
+from app.llm import LLM
+from app.schema import Message
+
+
+def _use_store(monkeypatch, **settings):
+    settings = ImageStoreSettings(enabled=True, **settings)
+    instance = ImageStore(settings)
+    monkeypatch.setattr(config._config, "image_store", settings)
+    monkeypatch.setattr(image_store, "_image_store", instance)
+    return instance
+
+
+@pytest.fixture
+def store(monkeypatch):
+    return _use_store(monkeypatch, keep_last=1)
+
+
+def test_disabled_by_default():
+    assert not ImageStoreSettings().enabled
+
+
+def test_messages_keep_only_a_reference_and_share_duplicates(store):
+    first = Message.tool_message(
+        "shot", name="browser", tool_call_id="1", base64_image="QUJD"
+    )
+    second = Message.user_message("again", base64_image="QUJD")
+
+    assert first.base64_image is None and second.base64_image is None
+    assert first.image_ref == second.image_ref
+    assert first.get_image() == "QUJD"
+    assert store.stats()["images"] == 1 and store.stats()["hits"] == 1
+
+
+def test_only_latest_images_are_inlined(store):
+    messages = [
+        Message.user_message("old", base64_image="T0xE"),
+        Message.assistant_message("ok"),
+        Message.user_message("new", base64_image="TkVX"),
+    ]
+
+    formatted = LLM.format_messages(messages, supports_images=True)
+
+    old_parts, new_parts = formatted[0]["content"], formatted[2]["content"]
+    assert old_parts[0] == {"type": "text", "text": "old"}
+    assert old_parts[1]["type"] == "text" and "omitted" in old_parts[1]["text"]
+    assert new_parts[1]["image_url"]["url"] == "data:image/jpeg;base64,TkVX"
+    assert all("image_ref" not in message for message in formatted)
+
+    # 不支持图片的模型只保留文本
+    plain = LLM.format_messages(messages, supports_images=False)
+    assert plain[0] == {"role": "user", "content": "old"}
+
+
+def test_referenced_images_survive_eviction(monkeypatch):
+    store = _use_store(monkeypatch, max_entries=1)
+
+    kept = Message.user_message("session a", base64_image="QUFB")
+    Message.user_message("session b", base64_image="QkJC")
+    Message.user_message("session c", base64_image="Q0ND")
+
+    # 其他会话的图片超出容量，但仍被引用的图片不会被淘汰
+    assert kept.get_image() == "QUFB"
+    assert store.stats()["images"] == 1 and store.stats()["pinned"] == 1
+
+    ref = kept.image_ref
+    del kept
+    Message.user_message("session d", base64_image="RERE")
+    assert store.stats()["pinned"] == 0
+
+    # 引用缺失时以占位文本代替，只警告一次
+    warnings = []
+    monkeypatch.setattr(image_store.logger, "warning", warnings.append)
+    restored = Message(role="user", content="resumed", image_ref=ref)
+    assert restored.get_image() is None
+    assert restored.get_image() is None
+    formatted = LLM.format_messages([restored], supports_images=True)
+    assert "omitted" in formatted[0]["content"][1]["text"]
+    assert len(warnings) == 1
+
+
+@pytest.mark.asyncio
+async def test_images_are_downscaled_off_the_event_loop(store, monkeypatch):
+    threads = []
+
+    def downscale(image):
+        threads.append(threading.current_thread())
+        return image.lower()
+
+    monkeypatch.setattr(store, "_downscale", downscale)
+    messages = [
+        Message.user_message("old", base64_image="T0xE"),
+        Message.user_message("new", base64_image="TkVX"),
+    ]
+    # 入库时不缩放
+    assert threads == []
+
+    await LLM._downscale_images(messages, supports_images=True)
+    await LLM._downscale_images(messages, supports_images=True)
+
+    # 只缩放将要内联的最近一张，且只缩放一次，在线程池中进行
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+    assert messages[1].get_image() == "tkvx"
+    assert messages[0].get_image() == "T0xE"
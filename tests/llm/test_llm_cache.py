@@ -0,0 +1,96 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from openai.types.chat import ChatCompletion
+
+from app.llm_cache import ResponseCache
+from app.schema import Message
+
+
+def _completion(content: str) -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "test-model",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "tool_calls",
+                    "message": {
+                        "role": "assistant",
+                        "content": content,
+                        "tool_calls": [
+                            {
+                                "id": "call_1",
+                                "type": "function",
+                                "function": {"name": "terminate", "arguments": "{}"},
+                            }
+                        ],
+                    },
+                }
+            ],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_hit_miss_and_ttl(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite3", ttl_seconds=1)
+    key = ResponseCache.make_key({"model": "m", "messages": [{"role": "user"}]})
+    assert key == ResponseCache.make_key({"messages": [{"role": "user"}], "model": "m"})
+
+    assert await cache.get(key) is None
+    await cache.set(key, '"hello"')
+    assert await cache.get(key) == '"hello"'
+
+    cache.ttl_seconds = 0.01
+    time.sleep(0.02)
+    assert await cache.get(key) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 0)
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_by_size(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite3", max_size_bytes=25)
+    await cache.set("a", "x" * 10)
+    await cache.set("b", "x" * 10)
+    time.sleep(0.01)
+    assert await cache.get("a") is not None  # a 变为最近访问
+    await cache.set("c", "x" * 10)
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_ask_tool_served_from_cache(llm, tmp_path, monkeypatch):
+    calls = []
+
+    async def create(**params):
+        calls.append(params)
+        return _completion("done")
+
+    monkeypatch.setattr(
+        llm,
+        "client",
+        SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+        ),
+    )
+    monkeypatch.setattr(llm, "response_cache", ResponseCache(tmp_path / "c.sqlite3"))
+    messages = [Message.user_message("finish the task")]
+    tools = [{"type": "function", "function": {"name": "terminate", "parameters": {}}}]
+
+    live = await llm.ask_tool(messages, tools=tools)
+    cached = await llm.ask_tool(messages, tools=tools)
+    await llm.ask_tool(messages, tools=tools, use_cache=False)
+
+    assert cached == live
+    assert len(calls) == 2
+    assert llm.response_cache.stats()["hits"] == 1
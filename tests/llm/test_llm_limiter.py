@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import pytest
+
+from app.llm_limiter import RateLimiter
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded_and_fifo():
+    limiter = RateLimiter(max_concurrency=2)
+    running = 0
+    peak = 0
+    order = []
+
+    async def call(i):
+        nonlocal running, peak
+        async with limiter.limit():
+            order.append(i)
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(call(i) for i in range(6)))
+
+    assert peak == 2
+    assert order == list(range(6))
+    assert limiter.stats()["acquired"] == 6
+    assert limiter.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_delays_instead_of_failing():
+    # 60000 TPM = 1000 token/s；先耗尽桶，再请求 100 token 需要约 0.1s
+    limiter = RateLimiter(tokens_per_minute=60000)
+    async with limiter.limit(60000):
+        pass
+
+    start = time.perf_counter()
+    async with limiter.limit(100):
+        pass
+    waited = time.perf_counter() - start
+
+    assert 0.05 < waited < 1
+    assert limiter.stats()["max_wait"] >= 0.05
@@ -0,0 +1,86 @@
+import httpx
+import pytest
+from openai import AuthenticationError, InternalServerError, RateLimitError
+
+from app.config import RetrySettings
+from app.exceptions import TokenLimitExceeded
+from app.llm_retry import RetryPolicy, classify_error, get_retry_after
+
+
+def _status_error(cls, status, headers=None):
+    request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+    response = httpx.Response(status, request=request, headers=headers or {})
+    return cls("error", response=response, body=None)
+
+
+def _policy(**overrides):
+    settings = RetrySettings(min_wait=0, max_wait=0, **overrides)
+    return RetryPolicy(settings)
+
+
+def test_classification_and_retry_after():
+    rate_limited = _status_error(RateLimitError, 429, {"retry-after-ms": "1500"})
+    assert classify_error(rate_limited) == "rate_limit"
+    assert get_retry_after(rate_limited) == 1.5
+    assert classify_error(httpx.ReadTimeout("slow")) == "timeout"
+    assert classify_error(ConnectionResetError()) == "connection"
+    assert classify_error(_status_error(AuthenticationError, 401)) is None
+    assert classify_error(TokenLimitExceeded("too long")) is None
+    assert classify_error(ValueError("bad tool schema")) is None
+
+
+@pytest.mark.asyncio
+async def test_fatal_errors_are_not_retried():
+    policy = _policy()
+    calls = 0
+
+    @policy.decorator()
+    async def call():
+        nonlocal calls
+        calls += 1
+        raise TokenLimitExceeded("too long")
+
+    with pytest.raises(TokenLimitExceeded):
+        await call()
+    assert calls == 1
+    assert policy.stats()["fatal"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_caps_retries():
+    policy = _policy(max_attempts=6, budget_ratio=0, budget_min_retries=2)
+    calls = 0
+
+    @policy.decorator()
+    async def call():
+        nonlocal calls
+        calls += 1
+        raise _status_error(RateLimitError, 429, {"retry-after": "0"})
+
+    with pytest.raises(RateLimitError):
+        await call()
+    # 首次调用 + 预算内的 2 次重试
+    assert calls == 3
+    assert policy.stats() == {
+        "retries": {"rate_limit": 2},
+        "fatal": 0,
+        "budget_exhausted": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_final_attempt_is_not_counted_as_a_retry():
+    policy = _policy(max_attempts=3)
+    calls = 0
+
+    @policy.decorator()
+    async def call():
+        nonlocal calls
+        calls += 1
+        raise _status_error(InternalServerError, 500)
+
+    with pytest.raises(InternalServerError):
+        await call()
+    assert calls == 3
+    assert policy.stats()["retries"] == {"server_error": 2}
+    assert len(policy.budget._retries) == 2
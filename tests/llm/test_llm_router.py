@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import APIConnectionError
+
+from app.config import RouterSettings
+from app.exceptions import TokenLimitExceeded
+from app.llm_router import LLMRouter
+
+
+class FakeEndpoint:
+    def __init__(self, delay: float, fail: bool = False, error: Exception = None):
+        self.delay = delay
+        self.fail = fail
+        self.error = error or APIConnectionError(
+            request=httpx.Request("POST", "http://llm")
+        )
+        self.calls = 0
+        self.cancelled = 0
+
+    async def ask_tool(self, messages, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise self.error
+        return f"answer after {self.delay}"
+
+
+def _router(**endpoints) -> LLMRouter:
+    settings = RouterSettings(default_hedge_delay=0.05, min_samples=2)
+    return LLMRouter(settings=settings, endpoints=endpoints)
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_and_loser_is_cancelled():
+    slow, fast = FakeEndpoint(1.0), FakeEndpoint(0.01)
+    router = _router(primary=slow, backup=fast)
+
+    result = await router.ask_tool([])
+    await asyncio.sleep(0)
+
+    assert result == "answer after 0.01"
+    assert slow.cancelled == 1
+    assert router.stats()["backup"]["hedges_won"] == 1
+
+
+@pytest.mark.asyncio
+async def test_degraded_endpoint_is_routed_around():
+    broken, healthy = FakeEndpoint(0.0, fail=True), FakeEndpoint(0.0)
+    router = _router(primary=broken, backup=healthy)
+
+    for _ in range(2):
+        assert await router.ask_tool([]) == "answer after 0.0"
+
+    assert router.ranked() == ["backup", "primary"]
+    assert router.stats()["primary"]["healthy"] is False
+    calls = broken.calls
+    await router.ask_tool([])
+    assert broken.calls == calls
+
+
+@pytest.mark.asyncio
+async def test_local_errors_do_not_fail_over():
+    primary = FakeEndpoint(0.0, fail=True, error=TokenLimitExceeded("too long"))
+    backup = FakeEndpoint(0.0)
+    router = _router(primary=primary, backup=backup)
+
+    for _ in range(3):
+        with pytest.raises(TokenLimitExceeded):
+            await router.ask_tool([])
+
+    assert backup.calls == 0
+    assert router.stats()["primary"]["healthy"] is True
+    assert router.ranked() == ["primary", "backup"]
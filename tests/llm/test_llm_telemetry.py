@@ -0,0 +1,85 @@
+import json
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from app import llm_telemetry
+from app.llm_telemetry import CallSample, TelemetryRecorder
+from app.mock_llm_server import MockLLMServer, MockScenario, MockStep, MockToolCall
+from app.schema import Message
+from app.tool import ToolCollection
+from app.tool.terminate import Terminate
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    instance = TelemetryRecorder(capacity=1000)
+    monkeypatch.setattr(llm_telemetry, "_telemetry", instance)
+    return instance
+
+
+@pytest.mark.asyncio
+async def test_each_call_records_a_sample(llm, recorder, monkeypatch):
+    server = MockLLMServer(
+        MockScenario(
+            steps=[
+                MockStep(
+                    content="ls",
+                    tool_calls=[MockToolCall(name="bash", arguments={"command": "ls"})],
+                )
+            ]
+        )
+    )
+    client = AsyncOpenAI(
+        base_url="http://mock/v1",
+        api_key="mock",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app)),
+    )
+    monkeypatch.setattr(llm, "client", client)
+    monkeypatch.setattr(llm, "response_cache", None)
+    tools = ToolCollection(Terminate()).to_params()
+
+    await llm.ask_tool([Message.user_message("go")], tools=tools)
+    stream = await llm.ask_tool_stream([Message.user_message("go")], tools=tools)
+    assert recorder.samples(method="ask_tool_stream") == []  # 流未读完时不记录
+    async for _ in stream:
+        pass
+
+    plain, streamed = recorder.samples(config_name="pytest")
+    assert (plain.method, streamed.method) == ("ask_tool", "ask_tool_stream")
+    assert plain.input_tokens > 0 and plain.output_tokens > 0
+    assert plain.time_to_first_token is None and plain.retries == 0
+    assert streamed.output_tokens > 0
+    assert 0 < streamed.time_to_first_token <= streamed.latency
+
+
+def test_percentiles_summary_and_dump(recorder, tmp_path):
+    for latency in range(1, 101):
+        recorder.record(
+            CallSample(
+                config_name="default",
+                model="m",
+                method="ask",
+                latency=latency,
+                output_tokens=10,
+            )
+        )
+    recorder.record(
+        CallSample(
+            config_name="default",
+            model="m",
+            method="ask",
+            latency=999,
+            error="APITimeoutError",
+        )
+    )
+
+    assert recorder.percentiles("latency") == {"p50": 50, "p95": 95, "p99": 99}
+    summary = recorder.summary()["default"]
+    assert summary["calls"] == 101 and summary["errors"] == 1
+
+    path = tmp_path / "calls.jsonl"
+    assert recorder.dump_jsonl(str(path)) == 101
+    first = json.loads(path.read_text(encoding="utf-8").splitlines()[0])
+    assert first["latency"] == 1 and first["tokens_per_second"] == 10
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from app.config import HTTPPoolSettings
+from app.llm_transport import close_http_clients, get_http_client, get_pool_stats
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    while True:
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            break
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            b"Content-Length: 2\r\n\r\n{}"
+        )
+        await writer.drain()
+
+
+@pytest.mark.asyncio
+async def test_clients_shared_per_origin():
+    a = get_http_client("https://api.example.com/v1")
+    b = get_http_client("https://api.example.com:443/other")
+    c = get_http_client("https://api.other.com/v1")
+    assert a is b
+    assert a is not c
+    await close_http_clients()
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_track_requests():
+    server = await asyncio.start_server(_serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/v1"
+    client = get_http_client(base_url, HTTPPoolSettings(max_connections=2))
+
+    responses = await asyncio.gather(*(client.get(base_url) for _ in range(4)))
+    stats = get_pool_stats()[f"http://127.0.0.1:{port}"]
+
+    assert all(r.status_code == 200 for r in responses)
+    assert stats["requests"] == 4
+    assert stats["connections"] <= 2
+    assert stats["in_flight"] == 0
+    assert stats["idle"] == stats["connections"]
+    await close_http_clients()
+    server.close()
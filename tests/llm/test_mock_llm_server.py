@@ -0,0 +1,57 @@
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from app.mock_llm_server import MockLLMServer, MockScenario, MockStep, MockToolCall
+from app.schema import Message
+from app.tool import ToolCollection
+from app.tool.terminate import Terminate
+
+
+def _client(server: MockLLMServer) -> AsyncOpenAI:
+    transport = httpx.ASGITransport(app=server.app)
+    return AsyncOpenAI(
+        base_url="http://mock/v1",
+        api_key="mock",
+        http_client=httpx.AsyncClient(transport=transport),
+    )
+
+
+@pytest.mark.asyncio
+async def test_scripted_tool_calls_streaming_and_not(llm, monkeypatch):
+    server = MockLLMServer(
+        MockScenario(
+            steps=[
+                MockStep(
+                    content="Listing files",
+                    tool_calls=[MockToolCall(name="bash", arguments={"command": "ls"})],
+                )
+            ]
+        )
+    )
+    monkeypatch.setattr(llm, "client", _client(server))
+    monkeypatch.setattr(llm, "response_cache", None)
+    tools = ToolCollection(Terminate()).to_params()
+
+    first = await llm.ask_tool([Message.user_message("go")], tools=tools)
+    assert first.tool_calls[0].function.name == "bash"
+    assert first.tool_calls[0].function.arguments == '{"command": "ls"}'
+
+    history = [Message.user_message("go"), Message.assistant_message("Listing files")]
+    stream = await llm.ask_tool_stream(history, tools=tools)
+    calls = [call async for call in stream]
+    assert [c.function.name for c in calls] == ["terminate"]
+    assert stream.message.content.strip() == "Task completed."
+    assert server.stats["requests"] == 2 and server.stats["streaming"] == 1
+
+
+@pytest.mark.asyncio
+async def test_injected_rate_limit_has_retry_after():
+    server = MockLLMServer(MockScenario(rate_limit_rate=1.0, retry_after=2))
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://mock") as client:
+        response = await client.post(
+            "/v1/chat/completions", json={"model": "m", "messages": []}
+        )
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "2.0"
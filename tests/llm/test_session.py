@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from app.exceptions import ToolError
+from app.session import Session, current_session
+from app.tool import PlanningTool
+from app.tool.mcp import MCPClients
+
+
+@pytest.mark.asyncio
+async def test_usage_and_limit_isolated_per_session(llm):
+    before = llm.total_input_tokens
+
+    async def run(session: Session, tokens: int):
+        async with session:
+            for _ in range(3):
+                llm.update_token_count(tokens, 1)
+                await asyncio.sleep(0)
+            return llm.check_token_limit(tokens)
+
+    small, large = Session("a", max_input_tokens=100), Session("b")
+    results = await asyncio.gather(run(small, 40), run(large, 1000))
+
+    assert small.usage["pytest"].input_tokens == 120
+    assert large.usage["pytest"].completion_tokens == 3
+    assert results == [False, True]  # 只有设置了上限的会话超限
+    assert llm.total_input_tokens == before  # 进程级计数不受影响
+    assert current_session() is None
+
+
+@pytest.mark.asyncio
+async def test_plans_and_mcp_clients_owned_by_session():
+    async with Session() as session:
+        tool = PlanningTool()
+        await tool.execute(command="create", plan_id="p1", title="t", steps=["s"])
+        clients = MCPClients()
+    assert "p1" in session.plans
+    assert "p1" not in PlanningTool().plans
+    assert clients.sessions is not MCPClients().sessions
+
+
+@pytest.mark.asyncio
+async def test_reused_planning_tool_follows_current_session():
+    # 智能体池中的工具在会话之外创建，之后被不同会话复用
+    tool = PlanningTool()
+    first, second = Session("a"), Session("b")
+    async with first:
+        await tool.execute(command="create", plan_id="p1", title="t", steps=["s"])
+    async with second:
+        await tool.execute(command="create", plan_id="p2", title="t", steps=["s"])
+        plans = second.plans
+        await tool.reset()
+    assert list(first.plans) == ["p1"]
+    assert second.plans is plans and not plans
+    assert not tool.plans
+
+
+@pytest.mark.asyncio
+async def test_active_plan_is_owned_by_session():
+    tool = PlanningTool()
+    first, second = Session("a"), Session("b")
+    async with first:
+        await tool.execute(command="create", plan_id="p1", title="t", steps=["s"])
+    async with second:
+        # 另一个会话没有活动计划，不会读到上一个会话的 p1
+        with pytest.raises(ToolError):
+            await tool.execute(command="get")
+    assert first.current_plan_id == "p1"
+    assert second.current_plan_id is None
+    assert tool.current_plan_id is None
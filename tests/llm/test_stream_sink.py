@@ -0,0 +1,153 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import AsyncOpenAI, RateLimitError
+
+from app.bedrock import Chat
+from app.mock_llm_server import MockLLMServer, MockScenario
+from app.schema import Message
+from app.stream_sink import CallbackSink, QueueSink, use_stream_sink
+
+
+@pytest.fixture
+def mock_llm(llm, monkeypatch):
+    server = MockLLMServer(
+        MockScenario(final_content="streamed tokens arrive in order")
+    )
+    client = AsyncOpenAI(
+        base_url="http://mock/v1",
+        api_key="mock",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app)),
+    )
+    monkeypatch.setattr(llm, "client", client)
+    monkeypatch.setattr(llm, "response_cache", None)
+    return llm
+
+
+@pytest.mark.asyncio
+async def test_ask_streams_into_queue_sink(mock_llm, capsys):
+    sink = QueueSink()
+    text = await mock_llm.ask([Message.user_message("hi")], sink=sink)
+
+    deltas = []
+    while (delta := sink.queue.get_nowait()) is not None:
+        deltas.append(delta)
+
+    assert text == "streamed tokens arrive in order"
+    assert "".join(deltas).strip() == text
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.asyncio
+async def test_context_sink_applies_without_passing_it(mock_llm):
+    received = []
+    with use_stream_sink(CallbackSink(received.append)):
+        await mock_llm.ask([Message.user_message("hi")])
+    assert "".join(received).strip() == "streamed tokens arrive in order"
+
+
+def _chunk(text):
+    return SimpleNamespace(
+        usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))]
+    )
+
+
+def _rate_limited():
+    request = httpx.Request("POST", "http://mock/v1/chat/completions")
+    response = httpx.Response(429, request=request, headers={"retry-after": "0"})
+    return RateLimitError("slow down", response=response, body=None)
+
+
+def _drain(sink):
+    items = []
+    while not sink.queue.empty():
+        items.append(sink.queue.get_nowait())
+    return items
+
+
+@pytest.mark.asyncio
+async def test_retry_resets_sink_and_closes_once(llm, monkeypatch):
+    attempts = []
+
+    async def create_stream(params):
+        attempts.append(params)
+
+        async def chunks():
+            if len(attempts) == 1:
+                yield _chunk("partial ")
+                raise _rate_limited()
+            yield _chunk("full answer")
+
+        return chunks()
+
+    monkeypatch.setattr(llm, "_create_stream", create_stream)
+    monkeypatch.setattr(llm, "response_cache", None)
+    sink = QueueSink()
+    text = await llm.ask([Message.user_message("hi")], sink=sink)
+
+    assert text == "full answer" and len(attempts) == 2
+    assert _drain(sink) == ["partial ", QueueSink.RESET, "full answer", None]
+
+
+@pytest.mark.asyncio
+async def test_failed_stream_still_closes_sink(llm, monkeypatch):
+    async def create_stream(params):
+        async def chunks():
+            yield _chunk("partial ")
+            raise ValueError("malformed chunk")
+
+        return chunks()
+
+    monkeypatch.setattr(llm, "_create_stream", create_stream)
+    monkeypatch.setattr(llm, "response_cache", None)
+    sink = QueueSink()
+    with pytest.raises(ValueError):
+        await llm.ask([Message.user_message("hi")], sink=sink)
+
+    # 消费者收到结束标记，不会一直等待
+    assert _drain(sink) == ["partial ", QueueSink.RESET, None]
+
+
+@pytest.mark.asyncio
+async def test_context_sink_is_left_open_for_the_installer(mock_llm):
+    sink = QueueSink()
+    with use_stream_sink(sink):
+        await mock_llm.ask([Message.user_message("hi")])
+        await mock_llm.ask([Message.user_message("again")])
+
+    # 两次调用都不关闭上下文接收器，结束标记由设置它的一方放入
+    assert None not in _drain(sink)
+
+
+@pytest.mark.asyncio
+async def test_explicit_sink_is_closed_inside_a_context_sink(mock_llm):
+    context_sink, sink = QueueSink(), QueueSink()
+    with use_stream_sink(context_sink):
+        await mock_llm.ask([Message.user_message("hi")], sink=sink)
+
+    assert _drain(sink)[-1] is None
+    assert _drain(context_sink) == []
+
+
+@pytest.mark.asyncio
+async def test_bedrock_streams_into_the_sink_passed_to_ask(llm, monkeypatch):
+    events = [
+        {"messageStart": {"role": "assistant"}},
+        {"contentBlockDelta": {"contentBlockIndex": 0, "delta": {"text": "from "}}},
+        {"contentBlockDelta": {"contentBlockIndex": 0, "delta": {"text": "bedrock"}}},
+        {"messageStop": {"stopReason": "end_turn"}},
+        {"metadata": {"usage": {"inputTokens": 3, "outputTokens": 2}}},
+    ]
+    client = SimpleNamespace(converse_stream=lambda **params: {"stream": iter(events)})
+    monkeypatch.setattr(llm, "client", SimpleNamespace(chat=Chat(client)))
+    monkeypatch.setattr(llm, "api_type", "aws")
+    monkeypatch.setattr(llm, "response_cache", None)
+
+    context_sink, sink = QueueSink(), QueueSink()
+    with use_stream_sink(context_sink):
+        text = await llm.ask([Message.user_message("hi")], sink=sink)
+
+    assert text == "from bedrock"
+    assert _drain(sink) == ["from ", "bedrock", None]
+    assert _drain(context_sink) == []
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import AsyncOpenAI, BadRequestError
+
+from app.mock_llm_server import MockLLMServer, MockScenario, MockStep
+from app.schema import Message
+from app.stream_sink import NullSink
+
+
+def _mock_client(server: MockLLMServer) -> AsyncOpenAI:
+    transport = httpx.ASGITransport(app=server.app)
+    return AsyncOpenAI(
+        base_url="http://mock/v1",
+        api_key="mock",
+        http_client=httpx.AsyncClient(transport=transport),
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_uses_provider_usage(llm, monkeypatch):
+    server = MockLLMServer(MockScenario(steps=[MockStep(content="one two three four")]))
+    monkeypatch.setattr(llm, "client", _mock_client(server))
+    monkeypatch.setattr(llm, "response_cache", None)
+    messages = [Message.user_message("hello")]
+    expected = server._usage(
+        {"messages": llm.format_messages(messages)}, server.scenario.steps[0]
+    )
+
+    counted = []
+    monkeypatch.setattr(llm, "count_tokens", lambda text: counted.append(text) or 0)
+    before_in, before_out = llm.total_input_tokens, llm.total_completion_tokens
+
+    reply = await llm.ask(messages, sink=NullSink())
+
+    assert reply == "one two three four"
+    assert counted == []  # 回复文本没有在本地重新编码
+    assert llm.total_input_tokens - before_in == expected["prompt_tokens"]
+    assert llm.total_completion_tokens - before_out == expected["completion_tokens"]
+
+
+@pytest.mark.asyncio
+async def test_stream_falls_back_when_stream_options_rejected(llm, monkeypatch):
+    calls = []
+
+    async def chunks():
+        for text in ("alpha beta ", "gamma"):
+            delta = SimpleNamespace(content=text)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+    async def create(**params):
+        calls.append(params)
+        if "stream_options" in params:
+            request = httpx.Request("POST", "http://test/v1/chat/completions")
+            raise BadRequestError(
+                "Unrecognized request argument supplied: stream_options",
+                response=httpx.Response(400, request=request),
+                body=None,
+            )
+        return chunks()
+
+    fake = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    monkeypatch.setattr(llm, "client", fake)
+    monkeypatch.setattr(llm, "response_cache", None)
+    before_out = llm.total_completion_tokens
+
+    reply = await llm.ask([Message.user_message("hi")], sink=NullSink())
+
+    assert reply == "alpha beta gamma"
+    assert llm.stream_usage is False
+    assert [("stream_options" in c) for c in calls] == [True, False]
+    # 回退为逐 chunk 计数（whitespace tokenizer：2 + 1）
+    assert llm.total_completion_tokens - before_out == 3
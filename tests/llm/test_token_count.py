@@ -0,0 +1,113 @@
+from app.schema import Memory, Message, Role, ToolCall
+from app.tool import ToolCollection
+from app.tool.create_chat_completion import CreateChatCompletion
+from app.tool.terminate import Terminate
+
+
+def _history(n: int):
+    messages = []
+    for i in range(n):
+        messages.append(Message.user_message(f"question number {i} about something"))
+        messages.append(Message.assistant_message(f"answer number {i}"))
+    return messages
+
+
+def test_estimate_matches_full_count(llm):
+    messages = _history(5)
+    system = [Message.system_message("you are a helpful agent")]
+    formatted = llm.format_messages(system) + llm.format_messages(messages)
+    assert llm.estimate_input_tokens(messages, system) == llm.count_message_tokens(
+        formatted
+    )
+
+
+def test_message_cache_invalidated_on_change(llm):
+    message = Message.user_message("one two three")
+    before = llm.count_message_cached(message)
+    message.content = "one two three four five"
+    assert llm.count_message_cached(message) == before + 2
+
+
+def test_formatted_message_reused_until_changed(llm):
+    message = Message.user_message("hello")
+    first = llm.format_messages([message])[0]
+    assert llm.format_messages([message])[0] is first
+
+    message.content = "hello again"
+    assert llm.format_messages([message]) == [
+        {"role": "user", "content": "hello again"}
+    ]
+
+
+def test_memory_counts_only_new_messages(llm):
+    memory = Memory()
+    memory.add_messages(_history(3))
+    first = llm.estimate_input_tokens(memory)
+
+    calls = []
+    original = llm.token_counter.count_message
+    llm.token_counter.count_message = lambda m: calls.append(m) or original(m)
+    memory.add_message(Message.user_message("a new question"))
+    second = llm.estimate_input_tokens(memory)
+
+    assert len(calls) == 1
+    assert second == first + original({"role": "user", "content": "a new question"})
+
+
+def test_memory_total_follows_eviction(llm):
+    memory = Memory(max_messages=4)
+    memory.add_messages(_history(2))
+    llm.estimate_input_tokens(memory)
+    memory.add_messages(_history(3)[4:])
+    expected = llm.count_message_tokens(llm.format_messages(memory.messages))
+    assert len(memory.messages) == 4
+    assert llm.estimate_input_tokens(memory) == expected
+
+
+def test_eviction_keeps_tool_groups_whole(llm):
+    call = ToolCall(id="c1", function={"name": "bash", "arguments": "{}"})
+    memory = Memory(max_messages=3)
+    memory.add_messages(
+        [
+            Message.user_message("run it"),
+            Message.from_tool_calls([call], content="running"),
+            Message.tool_message("ok", name="bash", tool_call_id="c1"),
+        ]
+    )
+    llm.estimate_input_tokens(memory)
+    # 切分点落在工具结果上，整个调用组一起淘汰
+    memory.add_messages(_history(1))
+    assert [m.role for m in memory.messages] == [Role.USER, Role.ASSISTANT]
+    expected = llm.count_message_tokens(llm.format_messages(memory.messages))
+    assert llm.estimate_input_tokens(memory) == expected
+
+
+def test_memory_messages_keep_the_list_api():
+    memory = Memory(max_messages=4)
+    memory.add_messages(_history(3))
+    retained = list(memory.messages)
+
+    assert len(retained) == 4
+    assert memory.messages == retained
+    assert memory.messages[-3:] == retained[-3:]
+    assert memory.messages[1:3] == retained[1:3]
+    assert memory.get_recent_messages(2) == retained[-2:]
+    assert memory.model_dump()["messages"] == [m.model_dump() for m in retained]
+
+    # 整体赋值列表后仍按队列裁剪
+    memory.messages = _history(2)
+    memory.add_message(Message.user_message("one more"))
+    assert [m.content for m in memory.messages][0] == "answer number 0"
+
+
+def test_tool_tokens_counted_once(llm, monkeypatch):
+    params = ToolCollection(Terminate(), CreateChatCompletion()).to_params()
+    calls = []
+    original = llm.count_tokens
+    monkeypatch.setattr(
+        llm, "count_tokens", lambda text: calls.append(text) or original(text)
+    )
+
+    first = llm.count_tools_cached(params)
+    assert llm.count_tools_cached(params) == first
+    assert len(calls) == 2  # 每个工具只编码一次
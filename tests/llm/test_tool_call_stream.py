@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from openai.types.chat import ChatCompletionChunk
+
+from app.llm import ToolCallStream
+
+
+def _chunk(content=None, tool_calls=None) -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "chatcmpl-test",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "test-model",
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {"content": content, "tool_calls": tool_calls},
+                    "finish_reason": None,
+                }
+            ],
+        }
+    )
+
+
+def _tool_delta(index, arguments, call_id=None, name=None):
+    delta = {"index": index, "function": {"arguments": arguments}}
+    if call_id:
+        delta["id"] = call_id
+        delta["type"] = "function"
+        delta["function"]["name"] = name
+    return [delta]
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_are_yielded_as_soon_as_arguments_complete():
+    consumed = []
+
+    async def chunks():
+        for chunk in [
+            _chunk(content="Thinking"),
+            _chunk(tool_calls=_tool_delta(0, '{"path": ', "call_a", "read")),
+            _chunk(tool_calls=_tool_delta(0, '"a.txt"}')),
+            _chunk(tool_calls=_tool_delta(1, "", "call_b", "bash")),
+            _chunk(tool_calls=_tool_delta(1, '{"cmd": "ls"')),
+            _chunk(tool_calls=_tool_delta(1, "}")),
+        ]:
+            consumed.append(chunk)
+            await asyncio.sleep(0)
+            yield chunk
+
+    completed = []
+
+    async def on_complete(stream):
+        completed.append(stream.message)
+
+    stream = ToolCallStream(chunks(), on_complete=on_complete)
+    yielded = []
+    async for tool_call in stream:
+        # 第一个调用在其参数完整时产出，此时第二个调用尚未开始传输
+        yielded.append((tool_call.id, len(consumed)))
+
+    assert yielded == [("call_a", 3), ("call_b", 6)]
+    assert stream.message.content == "Thinking"
+    assert [c.function.arguments for c in stream.message.tool_calls] == [
+        '{"path": "a.txt"}',
+        '{"cmd": "ls"}',
+    ]
+    assert completed == [stream.message]
+    assert stream.time_to_first_token is not None
+
+
+@pytest.mark.asyncio
+async def test_on_close_runs_once_even_if_stream_is_never_read():
+    closed = []
+
+    async def chunks():
+        yield _chunk(content="never read")
+
+    stream = ToolCallStream(chunks(), on_close=lambda: closed.append(1))
+    await stream.close()
+    await stream.close()
+    assert closed == [1]
+
+    # 没有迭代也没有关闭就被丢弃
+    ToolCallStream(chunks(), on_close=lambda: closed.append(2))
+    assert closed == [1, 2]
@@ -0,0 +1,134 @@
+import os
+import time
+
+import pytest
+
+from app import blob_store
+from app.agent.toolcall import ToolCallAgent
+from app.blob_store import BlobStore
+from app.config import BlobStoreSettings, LLMSettings, config
+from app.exceptions import ToolError
+from app.llm import LLM
+from app.schema import ToolCall
+from app.tool import ToolCollection
+from app.tool.base import BaseTool
+from app.tool.blob_reader import BlobReader
+
+LINES = [f"row {i}: {'error' if i % 100 == 7 else 'ok'}" for i in range(1000)]
+TEXT = "\n".join(LINES)
+
+
+class DumpTool(BaseTool):
+    name: str = "dump"
+    description: str = "print a long table"
+    parameters: dict = {"type": "object", "properties": {}}
+
+    async def execute(self) -> str:
+        return TEXT
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    settings = BlobStoreSettings(
+        enabled=True,
+        spill_threshold=1000,
+        head_chars=100,
+        tail_chars=50,
+        max_read_chars=500,
+    )
+    instance = BlobStore(tmp_path / "blobs", settings)
+    monkeypatch.setattr(config._config, "blob_store", settings)
+    monkeypatch.setattr(blob_store, "_blob_store", instance)
+    return instance
+
+
+@pytest.mark.asyncio
+async def test_store_and_reader(store):
+    blob_id = store.put(TEXT)
+    assert store.put(TEXT) == blob_id
+    assert len(list(store.root.iterdir())) == 1
+
+    preview = store.preview(TEXT, blob_id)
+    assert preview.startswith(TEXT[:100]) and preview.endswith(TEXT[-50:])
+    assert blob_id in preview
+
+    reader = BlobReader()
+    tail = await reader.execute(command="read", blob_id=blob_id, offset=-20)
+    assert tail.output.endswith(TEXT[-20:])
+    capped = await reader.execute(command="read", blob_id=blob_id, length=10_000)
+    assert len(capped.output.split("\n", 1)[1]) == 500
+
+    found = await reader.execute(command="grep", blob_id=blob_id, pattern="error")
+    assert found.output.startswith("10 matching line(s)")
+    offset = int(found.output.splitlines()[1].split("@", 1)[1].split(":", 1)[0])
+    assert TEXT[offset:].startswith("row 7: error")
+
+    result = await ToolCollection(reader).execute(
+        name="read_blob", tool_input={"command": "read", "blob_id": "../../etc/passwd"}
+    )
+    assert "Invalid blob id" in result.error
+
+
+@pytest.mark.asyncio
+async def test_long_observations_are_spilled(store, monkeypatch):
+    class Tokenizer:
+        name = "whitespace"
+
+        def encode(self, text):
+            return text.split()
+
+    monkeypatch.setattr(
+        "app.llm.tiktoken.encoding_for_model", lambda model: Tokenizer()
+    )
+    settings = LLMSettings(
+        model="test-model",
+        base_url="http://127.0.0.1:1/v1",
+        api_key="test",
+        max_tokens=16,
+        temperature=0.0,
+        api_type="openai",
+        api_version="",
+    )
+    llm = LLM(config_name="pytest-blobs", llm_config={"default": settings})
+    try:
+        agent = ToolCallAgent(llm=llm, available_tools=ToolCollection(DumpTool()))
+        agent.tool_calls = [
+            ToolCall(id="call_0", function={"name": "dump", "arguments": "{}"})
+        ]
+        await agent.act()
+    finally:
+        LLM._instances.pop("pytest-blobs", None)
+
+    (message,) = [m for m in agent.memory.messages if m.role == "tool"]
+    assert len(message.content) < 400 and "read_blob" in message.content
+    assert "read_blob" in agent.available_tools.tool_map
+
+    (path,) = store.root.iterdir()
+    blob_id = path.stem
+    read = await agent.available_tools.execute(
+        name="read_blob",
+        tool_input={"command": "read", "blob_id": blob_id, "offset": -30},
+    )
+    assert read.output.endswith(TEXT[-30:])
+    # 存入的是完整的观察结果，结尾没有丢失
+    assert store.get(blob_id).endswith(LINES[-1])
+
+
+def test_expired_and_least_recently_used_blobs_are_evicted(tmp_path):
+    assert not BlobStoreSettings().enabled
+    store = BlobStore(tmp_path, BlobStoreSettings(ttl_seconds=3600, max_size_mb=0))
+    old, fresh, used = (store.put(c * 1000) for c in "abc")
+    now = time.time()
+    os.utime(store._path(old), (now - 7200, now - 7200))
+    os.utime(store._path(fresh), (now - 100, now - 100))
+    os.utime(store._path(used), (now - 200, now - 200))
+    store.get(used)  # 读取会刷新访问时间
+
+    # 过期的 blob 被删除；超出大小上限时删除最久未访问的，刚写入的保留
+    store.settings.max_size_mb = 2500 / 1024 / 1024
+    newest = store.put("d" * 1000)
+    remaining = {path.stem for path in tmp_path.glob("*.txt")}
+    assert remaining == {used, newest}
+    assert store.evictions == 2
+    with pytest.raises(ToolError):
+        store.get(fresh)
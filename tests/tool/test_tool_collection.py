@@ -0,0 +1,38 @@
+from app.llm import LLM
+from app.tool import ToolCollection
+from app.tool.create_chat_completion import CreateChatCompletion
+from app.tool.terminate import Terminate
+
+
+def test_to_params_is_memoized_until_tools_change():
+    collection = ToolCollection(Terminate())
+    params = collection.to_params()
+    assert collection.to_params() is params
+
+    collection.add_tool(CreateChatCompletion())
+    updated = collection.to_params()
+    assert updated is not params
+    assert [p["function"]["name"] for p in updated] == [
+        "terminate",
+        "create_chat_completion",
+    ]
+
+    # 直接替换 tools 元组（MCP 重连时的做法）同样会使缓存失效
+    collection.tools = collection.tools[:1]
+    assert len(collection.to_params()) == 1
+
+
+def test_cache_control_marks_prefix_without_mutating_inputs():
+    messages = [
+        {"role": "system", "content": "You are an agent."},
+        {"role": "user", "content": "hi"},
+    ]
+    tools = ToolCollection(Terminate()).to_params()
+
+    marked_messages, marked_tools = LLM.apply_cache_control(messages, tools)
+
+    assert marked_messages[0]["content"][0]["cache_control"] == {"type": "ephemeral"}
+    assert marked_messages[1] is messages[1]
+    assert marked_tools[-1]["cache_control"] == {"type": "ephemeral"}
+    assert messages[0]["content"] == "You are an agent."
+    assert "cache_control" not in tools[-1]